@@ -0,0 +1,279 @@
+# Benchmarks for the render pipeline
+"""
+Reproducible benchmarks for the ffmpeg pipeline. Synthetic sources are generated locally
+with lavfi testsrc2/sine, then every case runs in a fresh Python subprocess so CPU time
+and peak RSS (of the process and its ffmpeg children) are measured per case.
+
+Run from the reel_maker folder:
+    python -m benchmarks.pipeline_bench --out bench.json
+    python -m benchmarks.pipeline_bench --out new.json --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+from editor.ffmpeg_wrapper import FFmpegWrapper
+from utils.file_utils import ensure_folder
+
+# name -> (seconds, width, height, container)
+SOURCES = {
+    "720p_30s_mp4": (30, 1280, 720, "mp4"),
+    "1080p_120s_mp4": (120, 1920, 1080, "mp4"),
+    "vertical_30s_mp4": (30, 1080, 1920, "mp4"),
+    "720p_30s_mkv": (30, 1280, 720, "mkv"),
+    "360p_20s_webm": (20, 640, 360, "webm"),
+}
+QUICK_SOURCES = {
+    "720p_10s_mp4": (10, 1280, 720, "mp4"),
+    "vertical_10s_mp4": (10, 1080, 1920, "mp4"),
+    "720p_10s_mkv": (10, 1280, 720, "mkv"),
+}
+
+# case name -> (operation, source kind); source kind picks sources by container/shape.
+# Reel cases render with the "final" profile, as every reel did before draft previews;
+# the *_draft cases time the preview profile that drafts now use by default.
+CASES = {
+    "probe_cold": ("probe_cold", "mp4"),
+    "probe_cached": ("probe_cached", "mp4"),
+    "create_thumbnail": ("create_thumbnail", "mp4"),
+    "single_reel": ("single_reel", "mp4"),
+    "single_reel_overlay": ("single_reel_overlay", "mp4"),
+    "single_reel_music": ("single_reel_music", "mp4"),
+    "split": ("split", "mp4"),
+    "split_single_pass": ("split_single_pass", "mp4"),
+    "single_reel_draft": ("single_reel_draft", "mp4"),
+    "split_single_pass_draft": ("split_single_pass_draft", "mp4"),
+    "convert_to_mp4": ("convert_to_mp4", "other"),
+}
+
+
+def generate_source(folder: str, name: str, seconds: int, width: int, height: int, container: str) -> str:
+    path = os.path.join(folder, f"{name}.{container}")
+    if os.path.exists(path):
+        return path
+    lavfi = ["-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=30:duration={seconds}",
+             "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={seconds}"]
+    if container == "webm":
+        codecs = ["-c:v", "libvpx-vp9", "-deadline", "realtime", "-cpu-used", "8", "-b:v", "1M", "-c:a", "libopus"]
+    elif container == "mkv":
+        codecs = ["-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-c:a", "libopus"]
+    else:
+        codecs = ["-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-g", "60", "-c:a", "aac"]
+    FFmpegWrapper.run(["-y"] + lavfi + codecs + ["-shortest", path], capture_output=True)
+    return path
+
+
+def generate_music(folder: str, seconds: int = 60) -> str:
+    path = os.path.join(folder, "music.m4a")
+    if not os.path.exists(path):
+        FFmpegWrapper.run(["-y", "-f", "lavfi", "-i", f"sine=frequency=220:sample_rate=44100:duration={seconds}",
+                           "-c:a", "aac", path], capture_output=True)
+    return path
+
+
+def run_operation(op: str, src: str, music: str, work: str, duration: float) -> float:
+    """
+    Execute one benchmark operation; returns the seconds of media it processed.
+    """
+    from editor.reel_editor import ReelEditor
+
+    if op == "probe_cold":
+        FFmpegWrapper.probe_cache = None
+        FFmpegWrapper.probe(src)
+        return 0.0
+    if op == "probe_cached":
+        FFmpegWrapper.probe(src)
+        return 0.0
+    if op == "create_thumbnail":
+        FFmpegWrapper.create_thumbnail(src, os.path.join(work, "thumb.jpg"), time=duration / 2, width=360)
+        return 0.0
+
+    editor = ReelEditor(base_output=os.path.join(work, "output"), temp_root=os.path.join(work, "temp"))
+    quality = "final"
+    if op.endswith("_draft"):
+        op, quality = op[:-len("_draft")], "draft"
+    if op == "single_reel":
+        return editor.create_single_reel(src, start=0.0, duration=min(15.0, duration), quality=quality)["duration"]
+    if op == "single_reel_overlay":
+        return editor.create_single_reel(src, start=0.0, duration=min(15.0, duration),
+                                         overlay_text="Benchmark", quality=quality)["duration"]
+    if op == "single_reel_music":
+        return editor.create_single_reel(src, start=0.0, duration=min(15.0, duration), bg_music=music,
+                                         quality=quality)["duration"]
+    if op in ("split", "split_single_pass"):
+        metas = editor.split_into_reels(src, reel_duration=10, single_pass=(op == "split_single_pass"),
+                                        quality=quality)
+        return sum(m["duration"] for m in metas)
+    if op == "convert_to_mp4":
+        FFmpegWrapper.convert_to_mp4(src, os.path.join(work, "converted.mp4"))
+        return duration
+    raise ValueError(f"unknown operation {op}")
+
+
+def _usage() -> Dict[str, float]:
+    if resource is None:
+        return {"cpu": time.process_time(), "rss_kb": 0.0}
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is KB on linux, bytes on macOS
+    scale = 1024.0 if sys.platform == "darwin" else 1.0
+    return {
+        "cpu": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        "rss_kb": max(own.ru_maxrss, children.ru_maxrss) / scale,
+    }
+
+
+def measure_case(op: str, src: str, music: str, work: str) -> Dict[str, Any]:
+    """
+    Run inside the per-case subprocess. The source is probed before timing, which also
+    warms the cache for probe_cached.
+    """
+    duration = FFmpegWrapper.get_duration(src)
+    before = _usage()
+    t0 = time.perf_counter()
+    media = run_operation(op, src, music, work, duration)
+    wall = time.perf_counter() - t0
+    after = _usage()
+    return {
+        "wall_s": wall,
+        "cpu_s": after["cpu"] - before["cpu"],
+        "peak_rss_mb": after["rss_kb"] / 1024.0,
+        "media_s": media,
+        "realtime_factor": (media / wall) if media and wall else None,
+    }
+
+
+def run_isolated(op: str, src: str, music: str, work: str) -> Dict[str, Any]:
+    ensure_folder(work)
+    cmd = [sys.executable, "-m", "benchmarks.pipeline_bench", "--run-case", op, "--src", src,
+           "--music", music, "--work-dir", work]
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=here)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1:] or ["failed"]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def ffmpeg_version() -> str:
+    try:
+        out = subprocess.run([FFmpegWrapper.FFMPEG, "-version"], capture_output=True, text=True).stdout
+        return out.splitlines()[0] if out else ""
+    except OSError:
+        return ""
+
+
+def run_suite(work_dir: str, quick: bool = False, repeat: int = 3,
+              only: Optional[List[str]] = None) -> Dict[str, Any]:
+    sources_dir = os.path.join(work_dir, "sources")
+    ensure_folder(sources_dir)
+    sources = {name: generate_source(sources_dir, name, *spec)
+               for name, spec in (QUICK_SOURCES if quick else SOURCES).items()}
+    music = generate_music(sources_dir)
+
+    results: Dict[str, Any] = {}
+    for case, (op, kind) in CASES.items():
+        if only and case not in only:
+            continue
+        for src_name, src in sources.items():
+            is_mp4 = src.endswith(".mp4")
+            if (kind == "mp4") != is_mp4:
+                continue
+            runs = []
+            for i in range(repeat):
+                work = tempfile.mkdtemp(prefix=f"{case}_", dir=work_dir)
+                runs.append(run_isolated(op, src, music, work))
+            ok = [r for r in runs if "error" not in r]
+            if not ok:
+                results[f"{case}/{src_name}"] = runs[0]
+                continue
+            median = {key: statistics.median(r[key] for r in ok)
+                      for key in ("wall_s", "cpu_s", "peak_rss_mb")}
+            median["media_s"] = ok[0]["media_s"]
+            median["realtime_factor"] = (median["media_s"] / median["wall_s"]
+                                         if median["media_s"] and median["wall_s"] else None)
+            median["runs"] = len(ok)
+            results[f"{case}/{src_name}"] = median
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "ffmpeg": ffmpeg_version(),
+            "quick": quick,
+            "repeat": repeat,
+        },
+        "cases": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.10) -> List[str]:
+    """
+    Print wall/cpu ratios against a baseline report; returns the cases that got slower
+    than the threshold (fractional).
+    """
+    regressions = []
+    print(f"{'case':48} {'wall':>9} {'base':>9} {'ratio':>7} {'cpu ratio':>10}")
+    for case, cur in current["cases"].items():
+        base = baseline.get("cases", {}).get(case)
+        if not base or "wall_s" not in cur or "wall_s" not in base:
+            print(f"{case:48} {cur.get('wall_s', float('nan')):9.3f} {'-':>9}")
+            continue
+        ratio = cur["wall_s"] / base["wall_s"] if base["wall_s"] else float("inf")
+        cpu_ratio = cur["cpu_s"] / base["cpu_s"] if base.get("cpu_s") else float("nan")
+        flag = "  SLOWER" if ratio > 1 + threshold else ("  faster" if ratio < 1 - threshold else "")
+        print(f"{case:48} {cur['wall_s']:9.3f} {base['wall_s']:9.3f} {ratio:7.2f} {cpu_ratio:10.2f}{flag}")
+        if ratio > 1 + threshold:
+            regressions.append(case)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the ReelShortMaker render pipeline")
+    parser.add_argument("--out", default="bench_results.json", help="where to write the JSON report")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown counted as regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "reel_bench"))
+    parser.add_argument("--quick", action="store_true", help="short sources only")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--case", action="append", help="only run these cases (repeatable)")
+    # internal: run one measurement in this process
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--src", help=argparse.SUPPRESS)
+    parser.add_argument("--music", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        print(json.dumps(measure_case(args.run_case, args.src, args.music, args.work_dir)))
+        return 0
+
+    report = run_suite(args.work_dir, quick=args.quick, repeat=args.repeat, only=args.case)
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+# Headless batch runner (no Tk, no PIL)
+"""
+Render reels from a JSON job spec without the UI, e.g. on render servers.
+
+Run from the reel_maker folder:
+    python cli.py jobs.json --manifest results.json --sources-parallel 2
+
+Job spec:
+    {
+      "base_folder": "~/ReelShortMaker",          # downloads/, output/, temp/, cache/ live here
+      "parallel": {"sources": 2, "render_workers": 4, "downloads": 4},
+      "defaults": {"mode": "split", "reel_duration": 15, "overlap": 0.0, "export": true},
+      "sources": [
+        {"src": "https://youtu.be/...", "max_reels": 5, "overlay_text": "Part"},
+        {"src": "https://youtu.be/...", "sections": [[3600, 3780]]},
+        {"src": "/data/talk.mp4", "mode": "single", "start": 30, "duration": 20,
+         "bg_music": "/data/music.mp3", "export": "/data/out/talk"}
+      ]
+    }
+
+Per-source settings (defaults apply to every source and are overridden by the source):
+mode ("split" or "single"), sections (split only: [start, end] ranges in seconds; only these
+parts of a URL are downloaded), section_pad, reel_duration, overlap, max_reels, rank_highlights, single_pass,
+snap_to_scenes, snap_tolerance, start, duration, target_w, target_h, overlay_text, bg_music,
+track_subject, normalize_audio, quality ("draft" or "final"; by default "final" when exporting),
+export (true, false or a destination folder), export_mode (see ReelEditor.export_reels).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from downloader.video_downloader import VideoDownloader
+from editor.reel_editor import ReelEditor
+from editor.render_scheduler import RenderScheduler
+from editor.ffmpeg_wrapper import FFmpegWrapper
+from editor.probe_cache import ProbeCache
+from editor.storage_manager import StorageManager
+from utils.config import STORAGE_QUOTAS
+from utils.file_utils import ensure_folder
+
+DEFAULTS = {
+    "mode": "split",
+    "reel_duration": 15,
+    "overlap": 0.0,
+    "max_reels": None,
+    "sections": None,
+    "section_pad": 2.0,
+    "rank_highlights": False,
+    "single_pass": True,
+    "snap_to_scenes": False,
+    "snap_tolerance": 2.0,
+    "start": 0.0,
+    "duration": 15.0,
+    "target_w": 1080,
+    "target_h": 1920,
+    "overlay_text": None,
+    "bg_music": None,
+    "track_subject": False,
+    "normalize_audio": False,
+    "quality": None,
+    "export": True,
+    "export_mode": "auto",
+}
+
+_print_lock = threading.Lock()
+
+
+def log(*args) -> None:
+    with _print_lock:
+        print(datetime.now().strftime("%H:%M:%S"), *args, file=sys.stderr, flush=True)
+
+
+def is_url(src: str) -> bool:
+    return src.startswith(("http://", "https://"))
+
+
+def load_spec(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as fh:
+        spec = json.load(fh)
+    if not isinstance(spec.get("sources"), list) or not spec["sources"]:
+        raise ValueError("job spec needs a non-empty 'sources' list")
+    for i, source in enumerate(spec["sources"]):
+        if isinstance(source, str):
+            spec["sources"][i] = source = {"src": source}
+        check_source(source, spec.get("defaults", {}), f"source #{i}")
+    return spec
+
+
+def check_source(source: Dict[str, Any], defaults: Optional[Dict[str, Any]] = None, label: str = "source") -> None:
+    """
+    Raise ValueError if a source's settings (over defaults) cannot run: no src, unknown
+    mode, or sections that are not [start, end] pairs of a split.
+    """
+    defaults = defaults or {}
+    if not source.get("src"):
+        raise ValueError(f"{label} has no 'src'")
+    mode = source.get("mode", defaults.get("mode", DEFAULTS["mode"]))
+    if mode not in ("split", "single"):
+        raise ValueError(f"{label}: unknown mode {mode!r}")
+    sections = source.get("sections", defaults.get("sections"))
+    if sections:
+        if mode != "split":
+            raise ValueError(f"{label}: sections need split mode")
+        if any(not isinstance(s, (list, tuple)) or len(s) != 2 or float(s[1]) <= float(s[0]) for s in sections):
+            raise ValueError(f"{label}: sections must be [start, end] pairs with end > start")
+
+
+class BatchRunner:
+    """
+    Runs the sources of a job spec through VideoDownloader and ReelEditor. Up to
+    `sources` sources are processed at the same time; their ffmpeg renders share one
+    RenderScheduler, so render_workers bounds the ffmpeg processes of the whole batch.
+    """
+
+    def __init__(self, base_folder: str, sources: int = 1, render_workers: Optional[int] = None,
+                 downloads: int = 4, transcode_speed: Optional[str] = None):
+        self.base_folder = os.path.abspath(os.path.expanduser(base_folder))
+        self.sources = max(1, sources)
+        self.downloads = max(1, downloads)
+        self.output_folder = os.path.join(self.base_folder, "output")
+        ensure_folder(self.output_folder)
+        FFmpegWrapper.probe_cache = ProbeCache(os.path.join(self.base_folder, "cache", "probe.sqlite3"))
+        self.downloader = VideoDownloader(out_folder=os.path.join(self.base_folder, "downloads"),
+                                          force_mp4=True, transcode_speed=transcode_speed)
+        self.editor = ReelEditor(base_output=self.output_folder, temp_root=os.path.join(self.base_folder, "temp"),
+                                 scheduler=RenderScheduler(max_workers=render_workers))
+        # long batches on render nodes must not fill the disk: evict old drafts and downloads
+        self.storage = StorageManager(os.path.join(self.base_folder, "cache", "storage.sqlite3"))
+        self.editor.attach_storage(self.storage, STORAGE_QUOTAS)
+        self.storage.add_area("downloads", self.downloader.out_folder, STORAGE_QUOTAS["downloads"],
+                              protect=self.editor.keep_source)
+        self.storage.start()
+        # caps concurrent yt-dlp downloads across all source threads
+        self._download_slots = threading.Semaphore(self.downloads)
+
+    def run(self, sources: List[Dict[str, Any]], defaults: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Process every source; returns one result dict per source, in spec order.
+        """
+        settings = [{**DEFAULTS, **(defaults or {}), **source} for source in sources]
+        with ThreadPoolExecutor(max_workers=self.sources, thread_name_prefix="source") as pool:
+            return list(pool.map(self.run_source, settings))
+
+    def run_source(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        result = {"src": job["src"], "path": None, "video_hash": None, "status": "ok", "error": None,
+                  "reels": [], "elapsed_s": 0.0}
+        t0 = time.perf_counter()
+        try:
+            result.update(self.process(job))
+            log(f"done {job['src']}: {len(result['reels'])} reel(s)")
+        except Exception as e:
+            result.update(status="error", error=f"{type(e).__name__}: {e}")
+            log(f"failed {job['src']}: {e}")
+        result["elapsed_s"] = round(time.perf_counter() - t0, 3)
+        return result
+
+    def process(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Fetch, render and export one source (settings already merged with DEFAULTS).
+        Returns {"path", "video_hash", "reels"}; errors propagate. With sections, "path" is the
+        first downloaded section and "section_paths" lists all of them.
+        """
+        parts = self.fetch_sections(job) if job.get("sections") else [(self.fetch(job["src"]), None)]
+        paths = [path for path, _ in parts]
+        for path in paths:
+            self.storage.touch(path)
+        with self.storage.hold(*paths):
+            metas = []
+            for path, section in parts:
+                metas += self.render(path, job, section)
+            export = job.get("export")
+            exports = []
+            if export and metas:
+                exports = self.editor.export_reels(metas, dest_folder=export if isinstance(export, str) else None,
+                                                   mode=job["export_mode"])
+        reels = []
+        for i, meta in enumerate(metas):
+            reel = {key: meta.get(key) for key in ("path", "thumb", "start", "duration", "render_key")}
+            if exports:
+                reel["exported"] = exports[i]["path"]
+                reel["sha256"] = exports[i]["sha256"]
+            reels.append(reel)
+        result = {"path": paths[0], "video_hash": metas[0]["video_hash"] if metas else None, "reels": reels}
+        if job.get("sections"):
+            result["section_paths"] = paths
+        return result
+
+    def fetch(self, src: str) -> str:
+        if not is_url(src):
+            if not os.path.exists(src):
+                raise FileNotFoundError(src)
+            return src
+        log(f"downloading {src}")
+        with self._download_slots:
+            download = self.downloader.download_batch([src], max_concurrent=1)[0]
+        if download["error"]:
+            raise RuntimeError(download["error"])
+        return download["path"]
+
+    def fetch_sections(self, job: Dict[str, Any]) -> List[tuple]:
+        """
+        (path, section) pairs of a source with "sections": only those ranges of a URL are
+        downloaded (see VideoDownloader.download_sections); a local file is used as it is.
+        """
+        sections = [(float(start), float(end)) for start, end in job["sections"]]
+        if not is_url(job["src"]):
+            path = self.fetch(job["src"])
+            return [(path, section) for section in sections]
+        log(f"downloading {len(sections)} section(s) of {job['src']}")
+        with self._download_slots:
+            downloads = self.downloader.download_sections(job["src"], sections, pad=float(job["section_pad"]))
+        return [(d["path"], d["section"]) for d in downloads]
+
+    def download(self, url: str, title: Optional[str] = None) -> str:
+        with self._download_slots:
+            return self.downloader.download_best(url, title)
+
+    def render(self, path: str, job: Dict[str, Any],
+               section: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        style = {key: job[key] for key in ("target_w", "target_h", "overlay_text", "bg_music", "track_subject",
+                                               "normalize_audio")}
+        # exported reels are rendered at final quality directly rather than as drafts first
+        style["quality"] = job["quality"] or ("final" if job.get("export") else "draft")
+        log(f"rendering {path} ({job['mode']})")
+        if job["mode"] == "single":
+            future = self.editor.scheduler.submit_job(self.editor.create_single_reel, path,
+                                                      start=float(job["start"]), duration=float(job["duration"]),
+                                                      **style)
+            return [future.result()]
+        return self.editor.split_into_reels(path, reel_duration=job["reel_duration"], overlap=float(job["overlap"]),
+                                            max_reels=job["max_reels"], rank_highlights=job["rank_highlights"],
+                                            single_pass=job["single_pass"],
+                                            snap_to_scenes=job["snap_to_scenes"],
+                                            snap_tolerance=float(job["snap_tolerance"]), section=section, **style)
+
+    def close(self) -> None:
+        self.editor.scheduler.shutdown(cancel=False)
+        self.editor.render_cache.flush()
+        self.storage.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Render reels from a JSON job spec without the UI")
+    parser.add_argument("spec", help="JSON job spec")
+    parser.add_argument("--manifest", default="results.json", help="where to write the JSON results manifest")
+    parser.add_argument("--base-folder", help="overrides base_folder of the spec")
+    parser.add_argument("--sources-parallel", type=int, help="sources processed at the same time")
+    parser.add_argument("--render-workers", type=int, help="concurrent ffmpeg renders (default: from core count)")
+    parser.add_argument("--downloads", type=int, help="concurrent downloads")
+    parser.add_argument("--transcode-speed", help="tier for downloads that must be transcoded (fast/balanced/quality)")
+    args = parser.parse_args(argv)
+
+    try:
+        spec = load_spec(args.spec)
+    except (OSError, ValueError) as e:
+        print(f"Invalid job spec: {e}", file=sys.stderr)
+        return 2
+
+    parallel = spec.get("parallel", {})
+    runner = BatchRunner(
+        base_folder=args.base_folder or spec.get("base_folder") or os.path.join("~", "ReelShortMaker"),
+        sources=args.sources_parallel or parallel.get("sources", 1),
+        render_workers=args.render_workers or parallel.get("render_workers"),
+        downloads=args.downloads or parallel.get("downloads", 4),
+        transcode_speed=args.transcode_speed or spec.get("transcode_speed"),
+    )
+    started = datetime.now()
+    try:
+        results = runner.run(spec["sources"], spec.get("defaults"))
+    finally:
+        runner.close()
+
+    failed = sum(r["status"] != "ok" for r in results)
+    manifest = {
+        "spec": os.path.abspath(args.spec),
+        "started": started.isoformat(timespec="seconds"),
+        "finished": datetime.now().isoformat(timespec="seconds"),
+        "render_workers": runner.editor.scheduler.max_workers,
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "sources": results,
+    }
+    ensure_folder(os.path.dirname(os.path.abspath(args.manifest)))
+    with open(args.manifest, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2)
+    log(f"wrote {args.manifest}: {manifest['succeeded']} ok, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,35 @@
 # Handles YouTube/Facebook downloads
 import os
-from typing import Optional, Dict, Any
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable, Sequence, Tuple
 from yt_dlp import YoutubeDL
+from yt_dlp.utils import download_range_func
 from utils.file_utils import join_path, ensure_folder, safe_filename
+from utils.fingerprint import fast_fingerprint, full_fingerprint
 from editor.ffmpeg_wrapper import FFmpegWrapper
 
 
 class VideoDownloader:
     """
     Simple wrapper for yt-dlp to fetch info and download videos.
+    Downloaded files are recorded by content fingerprint and video id in
+    <out_folder>/.index.json so the same video fetched twice is kept only once.
     """
 
-    def __init__(self, out_folder: str = "ReelShortMaker/downloads", force_mp4: bool = True):
+    INDEX_FILE = ".index.json"
+    # seconds added on both sides of a section so that reels can be trimmed exactly from it
+    SECTION_PAD = 2.0
+
+    def __init__(self, out_folder: str = "ReelShortMaker/downloads", force_mp4: bool = True,
+                 transcode_speed: Optional[str] = None):
         self.out_folder = out_folder
         ensure_folder(self.out_folder)
         self.force_mp4 = force_mp4
+        # speed tier used when a download has to be fully transcoded (utils.config.TRANSCODE_TIERS)
+        self.transcode_speed = transcode_speed
+        self._index_lock = threading.Lock()
 
     def fetch_info(self, url: str) -> Dict[str, Any]:
         opts = {'quiet': True, 'no_warnings': True}
@@ -22,11 +37,106 @@ class VideoDownloader:
             info = ydl.extract_info(url, download=False)
         return info
 
-    def download_best(self, url: str, title_hint: Optional[str] = None) -> str:
+    def download_best(self, url: str, title_hint: Optional[str] = None,
+                      info: Optional[Dict[str, Any]] = None) -> str:
         """
         Download best video+audio. If force_mp4 is True, attempt bestvideo[ext=mp4]+bestaudio[ext=m4a]/mp4
+        Pass the result of fetch_info as info to skip a second metadata extraction.
         Returns the path to the saved file.
         """
+        with YoutubeDL(self._download_opts()) as ydl:
+            if info is not None:
+                info = ydl.process_ie_result(info, download=True)
+            else:
+                info = ydl.extract_info(url, download=True)
+        return self._finish_download(info, title_hint)
+
+    def download_sections(self, url: str, ranges: Sequence[Tuple[float, float]], pad: float = SECTION_PAD,
+                          exact: bool = False, info: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Download only the (start, end) time ranges (seconds) of a video, each padded by pad
+        seconds and saved to its own file, instead of the whole video. Sections are cut by
+        stream copy, so a file other than mp4 may begin on the keyframe before its padded
+        start; with exact=True yt-dlp re-encodes around the cut points instead (force_keyframes_at_cuts).
+        Returns one dict per range, in input order: {"path", "section", "source_start"}, where
+        section is the (start, end) of the requested range inside the file, ready for
+        ReelEditor.split_into_reels(path, section=section), and source_start is where the
+        file begins in the original video.
+        """
+        ranges = [(float(start), float(end)) for start, end in ranges]
+        for start, end in ranges:
+            if start < 0 or end <= start:
+                raise ValueError(f"invalid time range {start}-{end}")
+        padded = [(max(0.0, start - pad), end + pad) for start, end in ranges]
+        opts = self._download_opts()
+        opts['outtmpl'] = os.path.join(self.out_folder, "%(title)s [%(section_start)d-%(section_end)d].%(ext)s")
+        opts['download_ranges'] = download_range_func(None, padded)
+        opts['force_keyframes_at_cuts'] = exact
+        with YoutubeDL(opts) as ydl:
+            if info is not None:
+                info = ydl.process_ie_result(info, download=True)
+            else:
+                info = ydl.extract_info(url, download=True)
+
+        downloads = [d for d in info.get('requested_downloads') or [] if d.get('filepath')]
+        if not downloads:
+            raise RuntimeError(f"no section of {url} was downloaded")
+        video_key = self._video_key(info)
+        results = []
+        for (start, end), (pad_start, pad_end) in zip(ranges, padded):
+            section = min(downloads, key=lambda d: abs((d.get('section_start') or 0.0) - pad_start))
+            pad_end = section.get('section_end') or pad_end  # clamped to the video duration
+            path = section['filepath']
+            fmt = FFmpegWrapper.probe(path).get("format", {})
+            length = float(fmt.get("duration") or 0.0)
+            if exact or not length or "mp4" in (fmt.get("format_name") or ""):
+                # mp4 keeps the cut point as its origin: the lead-in from the keyframe before
+                # pad_start is hidden by an edit list
+                file_start = pad_start
+            else:
+                # other containers start on that keyframe; a stream-copied section ends at
+                # pad_end, so anything beyond its padded length is the lead-in
+                file_start = max(0.0, min(pad_start, pad_end - length))
+            key = f"{video_key}@{pad_start:.3f}-{pad_end:.3f}" if video_key else None
+            results.append({
+                "path": self._dedupe(path, key),
+                "section": (round(start - file_start, 3), round(min(end, pad_end) - file_start, 3)),
+                "source_start": round(file_start, 3),
+            })
+        return results
+
+    def download_batch(self, urls: List[str], max_concurrent: int = 4, fragments: int = 4,
+                       on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Download many URLs, max_concurrent at a time, each with `fragments` concurrent fragment
+        downloads. Metadata is extracted once per URL and handed straight to processing; URLs
+        whose video id is already in the download index are skipped.
+        Returns one result dict per URL, in input order:
+        {"url", "id", "title", "path", "skipped", "error"}.
+        """
+        def work(url: str) -> Dict[str, Any]:
+            result = {"url": url, "id": None, "title": None, "path": None, "skipped": False, "error": None}
+            try:
+                with YoutubeDL(self._download_opts(fragments=fragments)) as ydl:
+                    info = ydl.extract_info(url, download=False, process=False)
+                    result["id"] = self._video_key(info)
+                    result["title"] = info.get("title")
+                    known = self._known_download(result["id"])
+                    if known:
+                        result.update(path=known, skipped=True)
+                    else:
+                        info = ydl.process_ie_result(info, download=True)
+                result["path"] = result["path"] or self._finish_download(info, result["title"])
+            except Exception as e:
+                result["error"] = str(e)
+            if on_result:
+                on_result(result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrent), thread_name_prefix="download") as pool:
+            return list(pool.map(work, urls))
+
+    def _download_opts(self, fragments: Optional[int] = None) -> Dict[str, Any]:
         outtmpl = os.path.join(self.out_folder, "%(title)s.%(ext)s")
         ydl_opts = {
             'outtmpl': outtmpl,
@@ -38,10 +148,11 @@ class VideoDownloader:
             ydl_opts['format'] = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/mp4'
         else:
             ydl_opts['format'] = 'bestvideo+bestaudio/best'
+        if fragments:
+            ydl_opts['concurrent_fragment_downloads'] = fragments
+        return ydl_opts
 
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-
+    def _finish_download(self, info: Dict[str, Any], title_hint: Optional[str] = None) -> str:
         # Try to find actual saved filename
         filename = info.get('_filename') or info.get('requested_downloads', [{}])[0].get('filepath')
         if not filename:
@@ -53,10 +164,61 @@ class VideoDownloader:
         if self.force_mp4 and not filename.lower().endswith(".mp4"):
             target = os.path.splitext(filename)[0] + ".mp4"
             try:
-                FFmpegWrapper.convert_to_mp4(filename, target)
+                FFmpegWrapper.convert_to_mp4(filename, target, speed=self.transcode_speed)
                 filename = target
             except Exception:
                 # If conversion fails, just return original path
                 pass
 
+        return self._dedupe(filename, self._video_key(info))
+
+    @staticmethod
+    def _video_key(info: Dict[str, Any]) -> Optional[str]:
+        vid = info.get('id')
+        if not vid:
+            return None
+        return f"{info.get('extractor_key') or info.get('ie_key') or 'generic'}:{vid}"
+
+    def _known_download(self, video_key: Optional[str]) -> Optional[str]:
+        if not video_key:
+            return None
+        with self._index_lock:
+            path = self._load_index()["ids"].get(video_key)
+        return path if path and os.path.exists(path) else None
+
+    def _dedupe(self, filename: str, video_key: Optional[str] = None) -> str:
+        """
+        Return the existing copy if a file with the same content was downloaded before,
+        otherwise record filename (and its video id) in the download index. The sampled
+        fingerprint only finds the candidate; the new file is deleted after a full-content
+        comparison.
+        """
+        fp = fast_fingerprint(filename)
+        with self._index_lock:
+            index = self._load_index()
+            known = index["files"].get(fp)
+            if (known and os.path.abspath(known) != os.path.abspath(filename) and os.path.exists(known)
+                    and full_fingerprint(known) == full_fingerprint(filename)):
+                os.remove(filename)
+                filename = known
+            index["files"][fp] = filename
+            if video_key:
+                index["ids"][video_key] = filename
+            self._save_index(index)
         return filename
+
+    def _load_index(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.out_folder, self.INDEX_FILE), "r", encoding="utf-8") as fh:
+                index = json.load(fh)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("files", {})
+        index.setdefault("ids", {})
+        return index
+
+    def _save_index(self, index: Dict[str, Any]) -> None:
+        path = os.path.join(self.out_folder, self.INDEX_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump(index, fh, indent=1)
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,58 @@
+# Cache for per-source analysis results
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+from utils.file_utils import ensure_folder
+from utils.fingerprint import fast_fingerprint
+
+
+class AnalysisCache:
+    """
+    SQLite store of analysis results (scene cuts, audio scores...) keyed on the content
+    fingerprint of the source, the kind of analysis and its parameters. Copies or renames
+    of a source reuse its results; a re-encoded file is analysed again.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        ensure_folder(os.path.dirname(os.path.abspath(db_path)))
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "fingerprint TEXT, kind TEXT, params TEXT, data TEXT, created REAL,"
+            " PRIMARY KEY (fingerprint, kind, params))"
+        )
+        self._db.commit()
+
+    def get(self, src_path: str, kind: str, params: Dict[str, Any]) -> Optional[Any]:
+        key = self._key(src_path, kind, params)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM analyses WHERE fingerprint = ? AND kind = ? AND params = ?", key
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, src_path: str, kind: str, params: Dict[str, Any], data: Any) -> None:
+        key = self._key(src_path, kind, params)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO analyses (fingerprint, kind, params, data, created) VALUES (?, ?, ?, ?, ?)",
+                key + (json.dumps(data), time.time())
+            )
+            self._db.commit()
+
+    def clear(self, kind: Optional[str] = None) -> None:
+        with self._lock:
+            if kind:
+                self._db.execute("DELETE FROM analyses WHERE kind = ?", (kind,))
+            else:
+                self._db.execute("DELETE FROM analyses")
+            self._db.commit()
+
+    @staticmethod
+    def _key(src_path: str, kind: str, params: Dict[str, Any]) -> tuple:
+        return fast_fingerprint(src_path), kind, json.dumps(params, sort_keys=True)
@@ -0,0 +1,272 @@
+# Subject tracking for the vertical crop
+import base64
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .ffmpeg_wrapper import FFmpegWrapper
+from .analysis_cache import AnalysisCache
+from .scene_detector import SceneDetector
+
+
+class CropTracker:
+    """
+    Chooses where the vertical crop window sits in a wider source, per frame, instead of the
+    fixed centre crop. A small grayscale decode is scored with NumPy: motion energy (difference
+    to the previous frame) plus edge energy (gradient magnitude) is summed per column into a
+    BINS-wide profile. The crop window holding the most energy gives the subject position;
+    positions are smoothed within each shot (cuts found on the same frames) and turned into
+    a piecewise-linear crop x expression for ffmpeg.
+
+    Analysis runs on fixed BLOCK-second blocks of the source, each cached per source
+    fingerprint, so rendering a segment only analyses the blocks it overlaps, once.
+    """
+
+    WIDTH = 160
+    HEIGHT = 90
+    FPS = 5.0
+    BINS = 32
+    BLOCK = 30.0
+    # smoothing window (seconds) and the span below which a shot keeps one position
+    SMOOTH = 1.5
+    STILL = 0.04
+    # max error (fraction of the frame width) when dropping path keyframes
+    KEY_TOLERANCE = 0.01
+    # keyframes per crop expression; keeps ffmpeg command lines far below the Windows limit
+    # (32767 characters) however long the render is
+    MAX_KEYS = 64
+
+    @classmethod
+    def analyse_range(cls, src_path: str, start: float, end: float, cache: Optional[AnalysisCache] = None,
+                      cancel_event: Optional[threading.Event] = None,
+                      decode_path: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (times, column profiles (n, BINS) normalised per frame, cut scores (n,)) of the frames
+        in the blocks covering [start, end). Missing blocks are decoded from decode_path (a
+        proxy, see ProxyManager) when given.
+        """
+        first, last = int(start // cls.BLOCK), int(max(start, end - 1e-6) // cls.BLOCK)
+        params = {"fps": cls.FPS, "width": cls.WIDTH, "height": cls.HEIGHT, "bins": cls.BINS, "block": cls.BLOCK}
+        blocks: Dict[int, Dict[str, np.ndarray]] = {}
+        missing = []
+        for b in range(first, last + 1):
+            data = cache.get(src_path, "crop_profile", dict(params, index=b)) if cache else None
+            if data is None:
+                missing.append(b)
+            else:
+                blocks[b] = cls._decode_block(data)
+        # contiguous missing blocks are analysed by one ffmpeg process
+        runs: List[List[int]] = []
+        for b in missing:
+            if runs and runs[-1][-1] == b - 1:
+                runs[-1].append(b)
+            else:
+                runs.append([b])
+        for run in runs:
+            for b, block in cls._analyse_blocks(decode_path or src_path, run, cancel_event).items():
+                blocks[b] = block
+                if cache:
+                    cache.put(src_path, "crop_profile", dict(params, index=b), cls._encode_block(block))
+
+        times, profiles, scores = [], [], []
+        for b in range(first, last + 1):
+            block = blocks[b]
+            times.append(b * cls.BLOCK + np.arange(len(block["scores"])) / cls.FPS)
+            profiles.append(block["profiles"])
+            scores.append(block["scores"])
+        if not times:
+            return np.zeros(0), np.zeros((0, cls.BINS)), np.zeros(0)
+        return np.concatenate(times), np.concatenate(profiles), np.concatenate(scores)
+
+    @classmethod
+    def _analyse_blocks(cls, src_path: str, run: List[int],
+                        cancel_event: Optional[threading.Event]) -> Dict[int, Dict[str, np.ndarray]]:
+        w, h = cls.WIDTH, cls.HEIGHT
+        span_start = run[0] * cls.BLOCK
+        args = ["-skip_loop_filter", "all", "-ss", str(span_start), "-t", str(len(run) * cls.BLOCK),
+                "-i", src_path, "-an", "-sn", "-dn",
+                "-vf", f"fps={cls.FPS},scale={w}:{h}:flags=fast_bilinear,format=gray",
+                "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1"]
+        profiles, scores = [], []
+        prev = None
+        for chunk in FFmpegWrapper.read_raw(args, w * h * 256, cancel_event=cancel_event):
+            usable = len(chunk) - len(chunk) % (w * h)
+            if not usable:
+                continue
+            frames = np.frombuffer(chunk[:usable], dtype=np.uint8).reshape(-1, h, w)
+            stack = frames if prev is None else np.concatenate([prev, frames])
+            profiles.append(cls._column_profiles(stack)[-len(frames):])
+            batch_scores = SceneDetector._score_batch(stack) if len(stack) > 1 else np.zeros(0, np.float32)
+            if prev is None:
+                batch_scores = np.concatenate([np.zeros(1, np.float32), batch_scores])
+            scores.append(batch_scores)
+            prev = frames[-1:]
+        all_profiles = np.concatenate(profiles) if profiles else np.zeros((0, cls.BINS), np.float32)
+        all_scores = np.concatenate(scores) if scores else np.zeros(0, np.float32)
+        per_block = int(round(cls.BLOCK * cls.FPS))
+        return {b: {"profiles": all_profiles[i * per_block:(i + 1) * per_block],
+                    "scores": all_scores[i * per_block:(i + 1) * per_block]}
+                for i, b in enumerate(run)}
+
+    @classmethod
+    def _column_profiles(cls, stack: np.ndarray) -> np.ndarray:
+        # per-frame energy summed over rows and pooled into BINS columns, each frame scaled to max 1
+        f = stack.astype(np.float32)
+        edges = np.zeros_like(f)
+        edges[:, :, 1:] += np.abs(np.diff(f, axis=2))
+        edges[:, 1:, :] += np.abs(np.diff(f, axis=1))
+        motion = np.zeros_like(f)
+        motion[1:] = np.abs(np.diff(f, axis=0))
+        energy = (2.0 * motion + 0.5 * edges).sum(axis=1)
+        energy = energy.reshape(len(f), cls.BINS, -1).sum(axis=2)
+        peak = energy.max(axis=1, keepdims=True)
+        return np.divide(energy, peak, out=np.zeros_like(energy), where=peak > 0)
+
+    @classmethod
+    def _encode_block(cls, block: Dict[str, np.ndarray]) -> Dict[str, str]:
+        # stored quantised to bytes: a block is a few KB
+        def pack(a: np.ndarray) -> str:
+            return base64.b64encode(np.clip(np.round(a * 255), 0, 255).astype(np.uint8).tobytes()).decode("ascii")
+        return {"profiles": pack(block["profiles"]), "scores": pack(block["scores"])}
+
+    @classmethod
+    def _decode_block(cls, data: Dict[str, str]) -> Dict[str, np.ndarray]:
+        def unpack(s: str) -> np.ndarray:
+            return np.frombuffer(base64.b64decode(s), dtype=np.uint8).astype(np.float32) / 255.0
+        return {"profiles": unpack(data["profiles"]).reshape(-1, cls.BINS), "scores": unpack(data["scores"])}
+
+    @classmethod
+    def track(cls, times: np.ndarray, profiles: np.ndarray, scores: np.ndarray,
+              window: float) -> Tuple[np.ndarray, List[int]]:
+        """
+        Smoothed centre (0..1 of the frame width) of a crop window `window` wide, per frame,
+        and the frame indices where shots start.
+        """
+        n = len(times)
+        if n == 0:
+            return np.zeros(0), [0]
+        k = int(min(cls.BINS, max(1, round(window * cls.BINS))))
+        cs = np.concatenate([np.zeros((n, 1)), np.cumsum(profiles, axis=1)], axis=1)
+        sums = cs[:, k:] - cs[:, :-k]
+        best = sums.argmax(axis=1)
+        # centre on the energy inside the best window (ties between windows would pick the leftmost)
+        cols = np.arange(cls.BINS)
+        inside = (cols >= best[:, None]) & (cols < best[:, None] + k)
+        mass = (profiles * inside).sum(axis=1)
+        centroid = ((profiles * inside) * (cols + 0.5)).sum(axis=1) / np.maximum(mass, 1e-9)
+        centres = np.where(mass > 0, centroid, best + k / 2.0) / cls.BINS
+        # confidence: how much more energy the best window holds than an average one
+        weights = sums.max(axis=1) - sums.mean(axis=1) + 1e-3
+
+        lo, hi = window / 2.0, 1.0 - window / 2.0
+        path = np.full(n, 0.5)
+        bounds = [0] + [int(round(t * cls.FPS)) for t in SceneDetector.find_cuts(scores, cls.FPS)] + [n]
+        half = max(1, int(round(cls.SMOOTH * cls.FPS / 2)))
+        kernel = np.ones(2 * half + 1)
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            if b <= a:
+                continue
+            c, wt = centres[a:b], weights[a:b]
+            smooth = (np.convolve(c * wt, kernel, mode="same") / np.convolve(wt, kernel, mode="same"))
+            if smooth.max() - smooth.min() < cls.STILL:
+                smooth = np.full(b - a, np.average(c, weights=wt))
+            path[a:b] = smooth
+        return np.clip(path, lo, hi), bounds[:-1]
+
+    @classmethod
+    def keyframes(cls, times: np.ndarray, path: np.ndarray, shots: List[int],
+                  tolerance: float = KEY_TOLERANCE) -> List[Tuple[float, float]]:
+        """
+        Reduce a per-frame path to (time, centre) keyframes, linear in between within tolerance.
+        The window holds its position up to each shot start and jumps there (no pan across cuts).
+        """
+        keys: List[Tuple[float, float]] = []
+        for a, b in zip(shots, shots[1:] + [len(times)]):
+            if b <= a:
+                continue
+            if keys:
+                keys.append((float(times[a]) - 0.001, keys[-1][1]))
+            picked = [a]
+            for i in range(a + 1, b):
+                if i == b - 1:
+                    picked.append(i)
+                    break
+                # would a straight line from the last key to i+1 still pass through every frame?
+                seg_t, seg_p = times[picked[-1]:i + 2], path[picked[-1]:i + 2]
+                line = seg_p[0] + (seg_p[-1] - seg_p[0]) * (seg_t - seg_t[0]) / max(seg_t[-1] - seg_t[0], 1e-9)
+                if np.abs(line - seg_p).max() > tolerance:
+                    picked.append(i)
+            keys += [(float(times[i]), float(path[i])) for i in picked]
+        return keys
+
+    @staticmethod
+    def crop_x_expr(keys: List[Tuple[float, float]], origin: float = 0.0) -> str:
+        """
+        crop filter x expression following keys; t is counted from `origin` (the input seek).
+        Flat sum of per-interval terms, so long paths do not nest.
+        """
+        if not keys:
+            return "(in_w-out_w)/2"
+        pts = [(t - origin, c) for t, c in keys]
+        if len(pts) == 1:
+            centre = f"{pts[0][1]:.4f}"
+        else:
+            terms = []
+            for (t0, c0), (t1, c1) in zip(pts[:-1], pts[1:]):
+                if t1 - t0 < 1e-6:
+                    continue
+                slope = (c1 - c0) / (t1 - t0)
+                terms.append(f"gte(t,{t0:.3f})*lt(t,{t1:.3f})*({c0:.4f}{slope:+.5f}*(t{-t0:+.3f}))")
+            terms.insert(0, f"lt(t,{pts[0][0]:.3f})*{pts[0][1]:.4f}")
+            terms.append(f"gte(t,{pts[-1][0]:.3f})*{pts[-1][1]:.4f}")
+            centre = "+".join(terms)
+        return f"clip(({centre})*in_w-out_w/2,0,in_w-out_w)"
+
+    @classmethod
+    def crop_expression(cls, src_path: str, start: float, duration: float, target_w: int, target_h: int,
+                        origin: Optional[float] = None, cache: Optional[AnalysisCache] = None,
+                        cancel_event: Optional[threading.Event] = None,
+                        decode_path: Optional[str] = None) -> Optional[str]:
+        """
+        Crop x expression tracking the subject over [start, start + duration] of a source wider
+        than target_w:target_h, with t counted from origin (default start). None when the
+        source is not wider than the target (there is nothing to pan).
+        """
+        video = FFmpegWrapper.get_stream(FFmpegWrapper.probe(src_path), "video")
+        width, height = video.get("width") or 0, video.get("height") or 0
+        rotation = video.get("tags", {}).get("rotate") or next(
+            (sd.get("rotation") for sd in video.get("side_data_list", []) if sd.get("rotation")), 0)
+        if abs(int(float(rotation))) % 180 == 90:
+            width, height = height, width
+        if not width or not height or width / height <= target_w / target_h:
+            return None
+        window = (target_w / target_h) / (width / height)
+        times, profiles, scores = cls.analyse_range(src_path, start, start + duration, cache, cancel_event,
+                                                    decode_path)
+        path, shots = cls.track(times, profiles, scores, window)
+        keys = cls.limit_keys(times, path, shots, start, start + duration)
+        return cls.crop_x_expr(keys, start if origin is None else origin)
+
+    @classmethod
+    def limit_keys(cls, times: np.ndarray, path: np.ndarray, shots: List[int], start: float, end: float,
+                   max_keys: int = MAX_KEYS) -> List[Tuple[float, float]]:
+        """
+        Keyframes of the path around [start, end], at most max_keys of them. The tolerance is
+        relaxed until they fit; if the shots alone need more (many cuts), the path inside the
+        range is resampled to max_keys evenly spaced keys (cuts become short pans).
+        """
+        tolerance = cls.KEY_TOLERANCE
+        while True:
+            keys = cls.keyframes(times, path, shots, tolerance)
+            # the expression only needs the keys around [start, end]
+            first = max([i for i, (t, _) in enumerate(keys) if t <= start] or [0])
+            last = min([i for i, (t, _) in enumerate(keys) if t >= end] or [len(keys) - 1])
+            keys = keys[first:last + 1]
+            if len(keys) <= max_keys or tolerance >= 0.5:
+                break
+            tolerance *= 2
+        if len(keys) > max_keys:
+            key_t = np.array([t for t, _ in keys])
+            key_c = np.array([c for _, c in keys])
+            grid = np.linspace(key_t[0], key_t[-1], max_keys)
+            keys = [(float(t), float(c)) for t, c in zip(grid, np.interp(grid, key_t, key_c))]
+        return keys
@@ -0,0 +1,214 @@
+# Persistent index of reel drafts
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from utils.file_utils import ensure_folder
+
+
+class DraftIndex:
+    """
+    SQLite index of the drafts under temp_root, with the full metadata returned by the
+    editor (start, duration, render params, export destination...). Renders, deletes and
+    exports update it directly; reconcile() rescans a draft folder only when the folder's
+    mtime differs from the one recorded at the last scan. Pinned drafts are never evicted
+    by the StorageManager, nor is the source of a pinned or unexported draft (exporting a
+    draft renders it again from its source). Every change stamps the rows it touches (removed drafts leave a
+    tombstone) with the next value of a change counter, so changes() returns just what
+    changed since a given counter value. Each source has one reader of its changes (the
+    draft list): once it passes a counter value, older tombstones of the source are dropped.
+    """
+
+    COLUMNS = ("path", "video_hash", "name", "thumb", "start", "duration", "render_key",
+               "params", "created", "exported_to", "pinned")
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        ensure_folder(os.path.dirname(os.path.abspath(db_path)))
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS drafts ("
+            " path TEXT PRIMARY KEY, video_hash TEXT, name TEXT, thumb TEXT, start REAL, duration REAL,"
+            " render_key TEXT, params TEXT, created REAL, exported_to TEXT, pinned INTEGER NOT NULL DEFAULT 0,"
+            " src_path TEXT, seq INTEGER NOT NULL DEFAULT 0);"
+            "CREATE INDEX IF NOT EXISTS drafts_video ON drafts (video_hash);"
+            "CREATE INDEX IF NOT EXISTS drafts_changes ON drafts (video_hash, seq);"
+            "CREATE INDEX IF NOT EXISTS drafts_source ON drafts (src_path);"
+            "CREATE TABLE IF NOT EXISTS folders (video_hash TEXT PRIMARY KEY, mtime_ns INTEGER);"
+            "CREATE TABLE IF NOT EXISTS removed (path TEXT PRIMARY KEY, video_hash TEXT, seq INTEGER);"
+            "CREATE TABLE IF NOT EXISTS counter (seq INTEGER NOT NULL);"
+        )
+        if self._db.execute("SELECT COUNT(*) FROM counter").fetchone()[0] == 0:
+            self._db.execute("INSERT INTO counter (seq) VALUES (0)")
+        self._db.commit()
+
+    def add(self, meta: Dict[str, Any]) -> None:
+        """
+        Insert or update a draft from an editor metadata dict. The pinned flag of an existing
+        draft is kept (see set_pinned).
+        """
+        columns = self.COLUMNS[:-1]
+        row = (
+            meta["path"], meta.get("video_hash"), os.path.basename(meta["path"]), meta.get("thumb") or "",
+            meta.get("start"), meta.get("duration"), meta.get("render_key"),
+            json.dumps(meta.get("params") or {}), meta.get("created") or time.time(),
+            meta.get("exported_to"),
+        )
+        columns += ("src_path", "seq")
+        with self._lock:
+            row += (self._source_of(meta.get("params") or {}), self._next_seq())
+            self._db.execute(
+                f"INSERT INTO drafts ({', '.join(columns)}) VALUES ({', '.join('?' * len(row))})"
+                f" ON CONFLICT (path) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns[1:])}", row
+            )
+            self._db.execute("DELETE FROM removed WHERE path = ?", (meta["path"],))
+            self._db.commit()
+
+    def remove(self, path: str) -> None:
+        with self._lock:
+            self._delete(path, self._next_seq())
+            self._db.commit()
+
+    def update(self, path: str, **fields) -> None:
+        """
+        Update some columns of a draft (thumb, exported_to, ...).
+        """
+        fields = {k: v for k, v in fields.items() if k in self.COLUMNS and k != "path"}
+        if not fields:
+            return
+        if "params" in fields:
+            fields["src_path"] = self._source_of(fields["params"] or {})
+            fields["params"] = json.dumps(fields["params"] or {})
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE drafts SET {assignments}, seq = ? WHERE path = ?",
+                             tuple(fields.values()) + (self._next_seq(), path))
+            self._db.commit()
+
+    def set_pinned(self, path: str, pinned: bool = True) -> None:
+        with self._lock:
+            self._db.execute("UPDATE drafts SET pinned = ?, seq = ? WHERE path = ?",
+                             (int(pinned), self._next_seq(), path))
+            self._db.commit()
+
+    def is_pinned(self, path: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT pinned FROM drafts WHERE path = ?", (path,)).fetchone()
+        return bool(row and row[0])
+
+    def source_needed(self, src_path: str) -> bool:
+        """
+        True if a pinned or not yet exported draft was rendered from src_path.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM drafts WHERE src_path = ? AND (pinned OR exported_to IS NULL) LIMIT 1",
+                (os.path.abspath(src_path),)
+            ).fetchone()
+        return row is not None
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM drafts WHERE path = ?", (path,)).fetchone()
+        return self._to_meta(row) if row else None
+
+    def list_drafts(self, video_hash: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM drafts WHERE video_hash = ? ORDER BY name", (video_hash,)
+            ).fetchall()
+        return [self._to_meta(r) for r in rows]
+
+    def changes(self, video_hash: str, since: int = -1) -> Tuple[int, List[Dict[str, Any]], List[str]]:
+        """
+        (counter, drafts, removed paths) of one source: the drafts added or modified and the
+        paths removed after change counter `since`. Pass the returned counter as `since` on
+        the next call; the default returns every draft. Tombstones up to `since` were read by
+        the previous call and are dropped.
+        """
+        with self._lock:
+            if since >= 0:
+                self._db.execute("DELETE FROM removed WHERE video_hash = ? AND seq <= ?", (video_hash, since))
+                self._db.commit()
+            seq = self._db.execute("SELECT seq FROM counter").fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM drafts WHERE video_hash = ? AND seq > ? AND seq <= ?",
+                (video_hash, since, seq)
+            ).fetchall()
+            removed = [r[0] for r in self._db.execute(
+                "SELECT path FROM removed WHERE video_hash = ? AND seq > ? AND seq <= ?", (video_hash, since, seq))]
+        return seq, [self._to_meta(r) for r in rows], removed
+
+    def all_drafts(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM drafts ORDER BY name").fetchall()
+        return [self._to_meta(r) for r in rows]
+
+    def reconcile(self, folder: str, video_hash: str) -> bool:
+        """
+        Bring the index in line with the files of one draft folder, but only if the folder
+        changed since the last scan. Returns True when a scan was done.
+        """
+        try:
+            mtime_ns = os.stat(folder).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        with self._lock:
+            row = self._db.execute("SELECT mtime_ns FROM folders WHERE video_hash = ?", (video_hash,)).fetchone()
+        if row and row[0] == mtime_ns:
+            return False
+
+        on_disk = set()
+        if mtime_ns is not None:
+            with os.scandir(folder) as it:
+                on_disk = {os.path.join(folder, e.name) for e in it if e.name.endswith(".mp4") and e.is_file()}
+        known = {m["path"]: m for m in self.list_drafts(video_hash)}
+        with self._lock:
+            seq = self._next_seq()
+            for path in set(known) - on_disk:
+                self._delete(path, seq)
+            for path in on_disk - set(known):
+                thumb = path + ".thumb.jpg"
+                self._db.execute(
+                    "INSERT OR REPLACE INTO drafts (path, video_hash, name, thumb, created, seq)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, video_hash, os.path.basename(path), thumb if os.path.exists(thumb) else "",
+                     os.path.getmtime(path), seq)
+                )
+                self._db.execute("DELETE FROM removed WHERE path = ?", (path,))
+            for path in on_disk & set(known):
+                thumb = path + ".thumb.jpg"
+                if not known[path]["thumb"] and os.path.exists(thumb):
+                    self._db.execute("UPDATE drafts SET thumb = ?, seq = ? WHERE path = ?", (thumb, seq, path))
+            self._db.execute("INSERT OR REPLACE INTO folders (video_hash, mtime_ns) VALUES (?, ?)",
+                             (video_hash, mtime_ns))
+            self._db.commit()
+        return True
+
+    @staticmethod
+    def _source_of(params: Dict[str, Any]) -> Optional[str]:
+        src_path = params.get("src_path")
+        return os.path.abspath(src_path) if src_path else None
+
+    def _next_seq(self) -> int:
+        # called with the lock held; the counter lives in the database so that several
+        # processes sharing the index never hand out the same value
+        self._db.execute("UPDATE counter SET seq = seq + 1")
+        return self._db.execute("SELECT seq FROM counter").fetchone()[0]
+
+    def _delete(self, path: str, seq: int) -> None:
+        # called with the lock held; leaves a tombstone for changes()
+        row = self._db.execute("SELECT video_hash FROM drafts WHERE path = ?", (path,)).fetchone()
+        self._db.execute("DELETE FROM drafts WHERE path = ?", (path,))
+        if row:
+            self._db.execute("INSERT OR REPLACE INTO removed (path, video_hash, seq) VALUES (?, ?, ?)",
+                             (path, row[0], seq))
+
+    def _to_meta(self, row) -> Dict[str, Any]:
+        meta = dict(zip(self.COLUMNS, row))
+        meta["params"] = json.loads(meta["params"] or "{}")
+        meta["pinned"] = bool(meta["pinned"])
+        return meta
@@ -1,14 +1,24 @@
 # Low-level ffmpeg commands
+import os
 import subprocess
+import tempfile
 import json
 import shutil
-from typing import Dict, Any, Optional
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, List, Callable, Deque, Iterator
+from .probe_cache import ProbeCache
+from utils.config import TRANSCODE_TIERS, DEFAULT_TRANSCODE_TIER
 
 
 class FFmpegError(RuntimeError):
     pass
 
 
+class FFmpegCancelled(FFmpegError):
+    pass
+
+
 class FFmpegWrapper:
     """
     Thin wrapper around ffmpeg / ffprobe command-line tools.
@@ -17,9 +27,28 @@ class FFmpegWrapper:
 
     FFMPEG = shutil.which("ffmpeg") or "ffmpeg"
     FFPROBE = shutil.which("ffprobe") or "ffprobe"
+    # replaced with a disk-backed cache by the app (see ProbeCache)
+    probe_cache: Optional[ProbeCache] = ProbeCache()
 
     @classmethod
-    def run(cls, args: list, capture_output: bool = False, check: bool = True) -> subprocess.CompletedProcess:
+    def run(cls, args: list, capture_output: bool = False, check: bool = True,
+            threads: Optional[int] = None, cancel_event: Optional[threading.Event] = None,
+            on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+            duration: Optional[float] = None) -> subprocess.CompletedProcess:
+        """
+        Run ffmpeg with args. threads limits the encoder/filter threads of the job (the
+        output file is expected to be the last argument). Commands with several outputs
+        pass their own per-output -threads, which is then left alone. With cancel_event or
+        on_progress the job runs in streaming mode (see run_streaming).
+        """
+        if threads:
+            n = str(threads)
+            if "-threads" not in args:
+                args = args[:-1] + ["-threads", n] + args[-1:]
+            args = ["-filter_threads", n, "-filter_complex_threads", n] + args
+        if cancel_event is not None or on_progress is not None:
+            return cls.run_streaming(args, on_progress=on_progress, duration=duration,
+                                     cancel_event=cancel_event, check=check)
         cmd = [cls.FFMPEG] + args
         try:
             proc = subprocess.run(cmd, capture_output=capture_output, text=True, check=check)
@@ -29,14 +58,138 @@ class FFmpegWrapper:
             err = e.stderr or ""
             raise FFmpegError(f"ffmpeg failed: {e.returncode}\nSTDOUT: {out}\nSTDERR: {err}")
 
+    @classmethod
+    def run_streaming(cls, args: list, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                      duration: Optional[float] = None, cancel_event: Optional[threading.Event] = None,
+                      check: bool = True, stderr_lines: int = 40) -> subprocess.CompletedProcess:
+        """
+        Run ffmpeg reading `-progress pipe:1` output as it is written. Every progress block is
+        sent to on_progress as a dict with out_time, frame, fps, speed, bitrate, total_size,
+        progress ("continue"/"end") and, when duration is known, percent and eta (seconds).
+        Only the last stderr_lines lines of stderr are kept (for error messages). Setting
+        cancel_event kills the process and raises FFmpegCancelled, unless ffmpeg had already
+        finished successfully. If on_progress raises, the process is killed and the
+        exception propagates.
+        """
+        cmd = [cls.FFMPEG, "-nostats", "-progress", "pipe:1"] + args
+        proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True, bufsize=1)
+        tail: Deque[str] = deque(maxlen=stderr_lines)
+        stderr_reader = threading.Thread(target=lambda: tail.extend(proc.stderr), daemon=True)
+        stderr_reader.start()
+        if cancel_event is not None:
+            def watch():
+                while proc.poll() is None:
+                    if cancel_event.wait(0.2):
+                        proc.kill()
+                        return
+            threading.Thread(target=watch, daemon=True).start()
+
+        block: Dict[str, str] = {}
+        try:
+            for line in proc.stdout:
+                key, _, value = line.strip().partition("=")
+                if not key:
+                    continue
+                block[key] = value
+                if key == "progress":
+                    if on_progress:
+                        on_progress(cls._progress_event(block, duration))
+                    block = {}
+            proc.wait()
+        finally:
+            # e.g. an on_progress callback raised: do not leave ffmpeg running
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+        stderr_reader.join(timeout=1.0)
+
+        # a kill shows up as a non-zero (negative) return code; a run that completed stays done
+        if cancel_event is not None and cancel_event.is_set() and proc.returncode != 0:
+            raise FFmpegCancelled("ffmpeg cancelled")
+        err = "".join(tail)
+        if check and proc.returncode != 0:
+            raise FFmpegError(f"ffmpeg failed: {proc.returncode}\nSTDERR (tail): {err}")
+        return subprocess.CompletedProcess(cmd, proc.returncode, "", err)
+
+    @classmethod
+    def read_raw(cls, args: list, chunk_size: int, cancel_event: Optional[threading.Event] = None,
+                 stderr_lines: int = 40) -> Iterator[bytes]:
+        """
+        Run ffmpeg writing raw data (rawvideo / PCM) to pipe:1 and yield it in chunks of
+        chunk_size bytes (the last chunk may be shorter). The process is killed if the
+        consumer stops early; a failed run raises FFmpegError after the last chunk.
+        """
+        cmd = [cls.FFMPEG, "-nostdin", "-hide_banner", "-nostats"] + args
+        proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        tail: Deque[bytes] = deque(maxlen=stderr_lines)
+        stderr_reader = threading.Thread(target=lambda: tail.extend(proc.stderr), daemon=True)
+        stderr_reader.start()
+        try:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise FFmpegCancelled("ffmpeg cancelled")
+                chunk = proc.stdout.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+            proc.wait()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+        stderr_reader.join(timeout=1.0)
+        if proc.returncode != 0:
+            err = b"".join(tail).decode("utf-8", "replace")
+            raise FFmpegError(f"ffmpeg failed: {proc.returncode}\nSTDERR (tail): {err}")
+
+    @staticmethod
+    def _progress_event(block: Dict[str, str], duration: Optional[float]) -> Dict[str, Any]:
+        def number(value: Optional[str]) -> Optional[float]:
+            try:
+                return float((value or "").rstrip("x").strip())
+            except ValueError:
+                return None
+
+        out_us = number(block.get("out_time_us"))
+        if out_us is None:
+            out_us = number(block.get("out_time_ms"))  # also microseconds, despite the name
+        out_time = out_us / 1e6 if out_us is not None else None
+        speed = number(block.get("speed"))
+        event = {
+            "out_time": out_time,
+            "frame": number(block.get("frame")),
+            "fps": number(block.get("fps")),
+            "speed": speed,
+            "bitrate": block.get("bitrate"),
+            "total_size": number(block.get("total_size")),
+            "progress": block.get("progress"),
+            "percent": None,
+            "eta": None,
+        }
+        if duration and out_time is not None:
+            event["percent"] = min(100.0, 100.0 * out_time / duration)
+            if speed:
+                event["eta"] = max(0.0, (duration - out_time) / speed)
+        return event
+
     @classmethod
     def probe(cls, path: str) -> Dict[str, Any]:
+        if cls.probe_cache is not None:
+            info = cls.probe_cache.get(path)
+            if info is not None:
+                return info
         cmd = [cls.FFPROBE, "-v", "quiet", "-print_format", "json", "-show_format", "-show_streams", path]
         try:
             proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            return json.loads(proc.stdout or "{}")
+            info = json.loads(proc.stdout or "{}")
         except subprocess.CalledProcessError as e:
             raise FFmpegError(f"ffprobe failed: {e.stderr or e}")
+        if cls.probe_cache is not None:
+            cls.probe_cache.put(path, info)
+        return info
 
     @classmethod
     def get_duration(cls, path: str) -> float:
@@ -56,32 +209,202 @@ class FFmpegWrapper:
         ]
         cls.run(args, capture_output=True)
 
+    @classmethod
+    def get_stream(cls, info: Dict[str, Any], codec_type: str) -> Dict[str, Any]:
+        # first stream of the given type ("video" / "audio") from a probe result, or {}
+        for stream in info.get("streams", []):
+            if stream.get("codec_type") == codec_type:
+                return stream
+        return {}
+
+    @classmethod
+    def keyframe_times(cls, path: str, start: float = 0.0, end: Optional[float] = None) -> List[float]:
+        """
+        Presentation times of the video keyframes between start and end, read from packet flags.
+        """
+        interval = f"{start}%{end}" if end is not None else f"{start}%"
+        cmd = [cls.FFPROBE, "-v", "error", "-select_streams", "v:0", "-read_intervals", interval,
+               "-show_entries", "packet=pts_time,flags", "-of", "csv=print_section=0", path]
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            raise FFmpegError(f"ffprobe failed: {e.stderr or e}")
+        times = []
+        for line in proc.stdout.splitlines():
+            parts = line.strip().split(",")
+            if len(parts) >= 2 and "K" in parts[1] and parts[0] not in ("", "N/A"):
+                times.append(float(parts[0]))
+        return sorted(times)
+
     @classmethod
     def extract_clip(cls, input_path: str, output_path: str, start: float, duration: float,
-                     video_filter: Optional[str] = None, audio_only: bool = False) -> None:
+                     video_filter: Optional[str] = None, audio_only: bool = False,
+                     threads: Optional[int] = None, cancel_event: Optional[threading.Event] = None,
+                     allow_copy: bool = True, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                     audio_filter: Optional[str] = None, encoder_args: Optional[List[str]] = None) -> None:
+        """
+        Cut [start, start + duration] out of input_path. Without a video filter the cut is
+        stream-copied when possible (see smart_cut) and only re-encoded as a fallback.
+        audio_filter (e.g. loudness normalization) only affects the audio encode.
+        encoder_args replace the default x264/aac settings of a re-encode.
+        """
+        if not audio_only and not video_filter and allow_copy:
+            if cls.smart_cut(input_path, output_path, start, duration, threads=threads, cancel_event=cancel_event,
+                             audio_filter=audio_filter):
+                return
         args = ["-y", "-ss", str(start), "-i", input_path, "-t", str(duration)]
+        if audio_filter:
+            args += ["-af", audio_filter]
         if audio_only:
             args += ["-vn", "-c:a", "aac", "-b:a", "192k", output_path]
         else:
             if video_filter:
                 args += ["-vf", video_filter]
-            args += ["-c:v", "libx264", "-preset", "fast", "-crf", "18", "-c:a", "aac", "-b:a", "192k", output_path]
-        cls.run(args, capture_output=True)
+            args += (encoder_args or ["-c:v", "libx264", "-preset", "fast", "-crf", "18", "-c:a", "aac", "-b:a", "192k"])
+            args.append(output_path)
+        cls.run(args, capture_output=True, threads=threads, cancel_event=cancel_event,
+                on_progress=on_progress, duration=duration)
+
+    @classmethod
+    def smart_cut(cls, input_path: str, output_path: str, start: float, duration: float,
+                  threads: Optional[int] = None, cancel_event: Optional[threading.Event] = None,
+                  audio_filter: Optional[str] = None) -> bool:
+        """
+        Cut an H.264 source without a full re-encode. A keyframe-aligned cut is a plain
+        `-c copy`; otherwise only the partial GOPs before the first and after the last
+        keyframe inside the range are encoded and the middle is stream-copied. Audio is
+        re-encoded separately (cheap) to keep it sample-accurate, with audio_filter if given.
+        The encoded GOPs use the profile, level, reference frames and pixel format of the
+        source so the joined stream stays decodable; when x264 cannot reproduce them only a
+        keyframe-aligned cut is copied and anything else is left to a full re-encode.
+        Returns False when the source is not suitable and the caller must encode normally.
+        """
+        info = cls.probe(input_path)
+        video = cls.get_stream(info, "video")
+        audio = cls.get_stream(info, "audio")
+        if video.get("codec_name") != "h264" or (audio and audio.get("codec_name") != "aac"):
+            return False
+
+        end = start + duration
+        fps = cls._frame_rate(video) or 25.0
+        eps = 1.0 / fps
+        kfs = cls.keyframe_times(input_path, max(0.0, start - 1.0), end + 1.0)
+        inside = [k for k in kfs if start - eps <= k <= end + eps]
+        if not inside:
+            return False
+        first_kf, last_kf = inside[0], inside[-1]
+        head = first_kf - start > eps
+        tail = end - last_kf > eps
+
+        audio_encode = ["-c:a", "aac", "-b:a", "192k"] + (["-af", audio_filter] if audio_filter else [])
+        if not head and not tail:
+            codecs = ["-c:v", "copy"] + audio_encode if audio_filter else ["-c", "copy"]
+            cls.run(["-y", "-ss", str(first_kf), "-i", input_path, "-t", str(duration),
+                     "-map", "0:v:0", "-map", "0:a:0?"] + codecs + ["-avoid_negative_ts", "make_zero",
+                     "-movflags", "+faststart", output_path],
+                    capture_output=True, cancel_event=cancel_event)
+            return True
+        if last_kf <= first_kf and head and tail:
+            # the range sits inside one or two GOPs; nothing worth copying
+            return False
+        matched = cls._matching_h264_args(video)
+        if matched is None:
+            return False
+
+        encode = ["-c:v", "libx264", "-preset", "fast", "-crf", "18"] + matched + ["-an", "-f", "mpegts"]
+        work = tempfile.mkdtemp(prefix="smartcut_", dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            parts = []
+            if head:
+                part = os.path.join(work, "head.ts")
+                cls.run(["-y", "-ss", str(start), "-i", input_path, "-t", str(first_kf - start)] + encode + [part],
+                        capture_output=True, threads=threads, cancel_event=cancel_event)
+                parts.append(part)
+            mid_end = last_kf if tail else end
+            if mid_end - first_kf > eps:
+                part = os.path.join(work, "middle.ts")
+                cls.run(["-y", "-ss", str(first_kf), "-i", input_path, "-t", str(mid_end - first_kf),
+                         "-map", "0:v:0", "-c:v", "copy", "-an", "-f", "mpegts", part],
+                        capture_output=True, cancel_event=cancel_event)
+                parts.append(part)
+            if tail:
+                part = os.path.join(work, "tail.ts")
+                cls.run(["-y", "-ss", str(last_kf), "-i", input_path, "-t", str(end - last_kf)] + encode + [part],
+                        capture_output=True, threads=threads, cancel_event=cancel_event)
+                parts.append(part)
+
+            concat_list = os.path.join(work, "parts.txt")
+            with open(concat_list, "w", encoding="utf-8") as fh:
+                for part in parts:
+                    fh.write(f"file '{part}'\n")
+            args = ["-y", "-f", "concat", "-safe", "0", "-i", concat_list]
+            if audio:
+                args += ["-ss", str(start), "-t", str(duration), "-i", input_path,
+                         "-map", "0:v:0", "-map", "1:a:0"] + audio_encode
+            args += ["-c:v", "copy", "-movflags", "+faststart", output_path]
+            cls.run(args, capture_output=True, cancel_event=cancel_event)
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+        return True
+
+    # ffprobe profile names -> x264 profiles; anything else (10-bit, 4:2:2, 4:4:4) is not matched
+    H264_PROFILES = {"Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high"}
 
     @classmethod
-    def convert_to_mp4(cls, input_path: str, output_path: str) -> None:
+    def _matching_h264_args(cls, video: Dict[str, Any]) -> Optional[List[str]]:
+        """
+        x264 options producing a stream with the profile, level, reference count and pixel
+        format of the probed H.264 stream, or None when they cannot be matched (the encoded
+        GOPs could then not be joined to the copied ones).
+        """
+        profile = cls.H264_PROFILES.get(video.get("profile") or "")
+        level = video.get("level") or 0
+        pix_fmt = video.get("pix_fmt")
+        if (not profile or level <= 0 or pix_fmt not in ("yuv420p", "yuvj420p")
+                or video.get("field_order") not in (None, "unknown", "progressive")):
+            return None
+        args = ["-profile:v", profile, "-level:v", f"{level / 10:.1f}", "-pix_fmt", pix_fmt]
+        refs = video.get("refs") or 0
+        if refs > 0:
+            args += ["-refs", str(refs)]
+        return args
+
+    @staticmethod
+    def _frame_rate(stream: Dict[str, Any]) -> float:
+        rate = stream.get("avg_frame_rate") or stream.get("r_frame_rate") or "0/0"
+        try:
+            num, den = rate.split("/")
+            return float(num) / float(den) if float(den) else 0.0
+        except (ValueError, ZeroDivisionError):
+            return 0.0
+
+    @classmethod
+    def convert_to_mp4(cls, input_path: str, output_path: str, speed: Optional[str] = None) -> Dict[str, str]:
         """
         Convert input video to a friendly mp4 (h264 + aac) preserving quality where possible.
+        Streams that are already H.264 / AAC are remuxed with -c copy; only incompatible
+        streams are re-encoded, video with the x264 settings of the `speed` tier
+        (see utils.config.TRANSCODE_TIERS). Returns {"video": "copy"|"encode", "audio": ...}.
         """
-        args = [
-            "-y",
-            "-i", input_path,
-            "-c:v", "libx264",
-            "-preset", "slow",
-            "-crf", "18",
-            "-c:a", "aac",
-            "-b:a", "192k",
-            "-movflags", "+faststart",
-            output_path
-        ]
+        info = cls.probe(input_path)
+        video = cls.get_stream(info, "video")
+        audio = cls.get_stream(info, "audio")
+        tier = TRANSCODE_TIERS[speed or DEFAULT_TRANSCODE_TIER]
+
+        copy_video = video.get("codec_name") == "h264" and video.get("pix_fmt") in ("yuv420p", "yuvj420p")
+        copy_audio = audio.get("codec_name") == "aac"
+        args = ["-y", "-i", input_path, "-map", "0:v:0?", "-map", "0:a:0?"]
+        if copy_video:
+            args += ["-c:v", "copy"]
+        else:
+            args += ["-c:v", "libx264", "-preset", tier["preset"], "-crf", tier["crf"], "-pix_fmt", "yuv420p"]
+        if copy_audio:
+            args += ["-c:a", "copy"]
+        else:
+            args += ["-c:a", "aac", "-b:a", "192k"]
+        args += ["-movflags", "+faststart", output_path]
         cls.run(args, capture_output=True)
+        return {
+            "video": "copy" if copy_video else "encode",
+            "audio": "copy" if copy_audio or not audio else "encode",
+        }
@@ -0,0 +1,132 @@
+# Audio highlight ranking
+import math
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from .ffmpeg_wrapper import FFmpegWrapper
+from .analysis_cache import AnalysisCache
+
+
+class HighlightScorer:
+    """
+    Ranks parts of a source by its audio. ffmpeg decodes the audio as mono 8 kHz PCM and
+    streams it; NumPy computes, per 50 ms frame, RMS level, log-energy onset strength and
+    speech activity (energy share in the voice band and zero-crossing rate). Features are
+    pooled per HOP seconds and cached per source fingerprint, so ranking again (another reel
+    length or count) needs no decode.
+    """
+
+    SAMPLE_RATE = 8000
+    FRAME = 400          # samples per analysis frame (50 ms)
+    HOP = 0.5            # seconds per stored feature row
+    CHUNK_HOPS = 240     # hops decoded per chunk (2 minutes)
+    SPEECH_BAND = (300.0, 3400.0)
+    # feature weights of the window score
+    WEIGHTS = {"loudness": 0.35, "onsets": 0.25, "speech": 0.4}
+
+    @classmethod
+    def features(cls, src_path: str, cache: Optional[AnalysisCache] = None,
+                 cancel_event: Optional[threading.Event] = None, decode_path: Optional[str] = None) -> np.ndarray:
+        """
+        (n_hops, 3) array of rms, onset strength and speech fraction per HOP seconds.
+        The audio is decoded from decode_path (a proxy, see ProxyManager) when given.
+        """
+        params = {"rate": cls.SAMPLE_RATE, "frame": cls.FRAME, "hop": cls.HOP, "band": list(cls.SPEECH_BAND)}
+        cached = cache.get(src_path, "audio_features", params) if cache else None
+        if cached is not None:
+            return np.asarray(cached, dtype=np.float32).reshape(-1, 3)
+
+        hop_samples = int(cls.HOP * cls.SAMPLE_RATE)
+        args = ["-i", decode_path or src_path, "-vn", "-sn", "-dn", "-ac", "1", "-ar", str(cls.SAMPLE_RATE),
+                "-f", "s16le", "-acodec", "pcm_s16le", "pipe:1"]
+        rows = []
+        last_energy = None
+        for chunk in FFmpegWrapper.read_raw(args, hop_samples * 2 * cls.CHUNK_HOPS, cancel_event=cancel_event):
+            samples = np.frombuffer(chunk[:len(chunk) - len(chunk) % 2], dtype="<i2").astype(np.float32) / 32768.0
+            if len(samples):
+                row, last_energy = cls._chunk_features(samples, last_energy)
+                rows.append(row)
+        feats = np.concatenate(rows).astype(np.float32) if rows else np.zeros((0, 3), dtype=np.float32)
+        if cache:
+            cache.put(src_path, "audio_features", params, [round(float(v), 5) for v in feats.ravel()])
+        return feats
+
+    @classmethod
+    def _chunk_features(cls, samples: np.ndarray,
+                        last_energy: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        # feature rows of a run of samples (padded to whole hops) and its last frame energy
+        hop_samples = int(cls.HOP * cls.SAMPLE_RATE)
+        frames_per_hop = hop_samples // cls.FRAME
+        n_hops = -(-len(samples) // hop_samples)
+        samples = np.pad(samples, (0, n_hops * hop_samples - len(samples)))
+        frames = samples.reshape(n_hops * frames_per_hop, cls.FRAME)
+
+        power = (frames ** 2).mean(axis=1)
+        energy = np.log10(power + 1e-10)
+        flux = np.maximum(np.diff(energy, prepend=energy[:1] if last_energy is None else last_energy), 0.0)
+
+        freqs = np.fft.rfftfreq(cls.FRAME, 1.0 / cls.SAMPLE_RATE)
+        band = (freqs >= cls.SPEECH_BAND[0]) & (freqs <= cls.SPEECH_BAND[1])
+        spectrum = np.abs(np.fft.rfft(frames * np.hanning(cls.FRAME), axis=1)) ** 2
+        band_share = spectrum[:, band].sum(axis=1) / np.maximum(spectrum.sum(axis=1), 1e-12)
+        zcr = (np.diff(np.signbit(frames), axis=1) != 0).mean(axis=1)
+        voiced = (band_share > 0.6) & (power > 1e-4) & (zcr < 0.35)
+
+        per_hop = (n_hops, frames_per_hop)
+        rows = np.stack([
+            np.sqrt(power.reshape(per_hop).mean(axis=1)),
+            flux.reshape(per_hop).sum(axis=1),
+            voiced.reshape(per_hop).mean(axis=1),
+        ], axis=1)
+        return rows, energy[-1:]
+
+    @classmethod
+    def window_scores(cls, feats: np.ndarray, window: float) -> np.ndarray:
+        """
+        Score (0..1) of every window of `window` seconds starting on a HOP boundary.
+        """
+        k = max(1, int(round(window / cls.HOP)))
+        if len(feats) < k:
+            return np.zeros(1 if len(feats) else 0)
+        loudness = np.clip((20 * np.log10(feats[:, 0] + 1e-6) + 50.0) / 50.0, 0.0, 1.0)
+        onset_scale = np.percentile(feats[:, 1], 95) or 1.0
+        onsets = np.clip(feats[:, 1] / onset_scale, 0.0, 1.0)
+        per_hop = (cls.WEIGHTS["loudness"] * loudness + cls.WEIGHTS["onsets"] * onsets
+                   + cls.WEIGHTS["speech"] * feats[:, 2])
+        cs = np.concatenate([[0.0], np.cumsum(per_hop)])
+        return (cs[k:] - cs[:-k]) / k
+
+    @classmethod
+    def pick(cls, scores: np.ndarray, window: float, count: int) -> List[Tuple[float, float]]:
+        """
+        Best `count` non-overlapping windows as (start, score), sorted by start.
+        """
+        k = max(1, int(round(window / cls.HOP)))
+        taken = np.zeros(len(scores) + k, dtype=bool)
+        picked = []
+        for i in np.argsort(-scores, kind="stable"):
+            if len(picked) >= count:
+                break
+            # a window starting at i overlaps any picked window starting in (i - k, i + k)
+            if taken[max(0, i - k + 1):i + k].any():
+                continue
+            taken[i] = True
+            picked.append((round(float(i) * cls.HOP, 3), float(scores[i])))
+        return sorted(picked)
+
+    @classmethod
+    def rank(cls, src_path: str, window: float, count: int, cache: Optional[AnalysisCache] = None,
+             cancel_event: Optional[threading.Event] = None, decode_path: Optional[str] = None,
+             span: Optional[Tuple[float, float]] = None) -> List[Dict[str, Any]]:
+        """
+        Top `count` non-overlapping windows of `window` seconds by audio score:
+        [{"start", "score"}] in time order. With span (start, end), only windows inside it.
+        """
+        feats = cls.features(src_path, cache, cancel_event, decode_path)
+        first = 0
+        if span:
+            first = int(math.ceil(span[0] / cls.HOP))
+            feats = feats[first:int(span[1] / cls.HOP)]
+        scores = cls.window_scores(feats, window)
+        return [{"start": round(start + first * cls.HOP, 3), "score": round(score, 4)}
+                for start, score in cls.pick(scores, window, count)]
@@ -0,0 +1,64 @@
+# EBU R128 loudness measurement and normalization
+import re
+import json
+import threading
+from typing import Dict, Optional
+from .ffmpeg_wrapper import FFmpegWrapper, FFmpegError
+from .analysis_cache import AnalysisCache
+
+
+class Loudness:
+    """
+    Two-pass loudnorm with the first pass done once per file: measure() runs the loudnorm
+    analysis over a whole source or music file and caches the result per content fingerprint.
+    Every reel cut from that file is then normalized in its single render pass with
+    loudnorm's linear mode (a constant gain computed from the cached measurement).
+    """
+
+    # integrated loudness (LUFS), true peak (dBTP) and loudness range targets of reels
+    TARGET = {"I": -14.0, "TP": -1.5, "LRA": 11.0}
+    # loudnorm upsamples to 192 kHz; its output is resampled back to this rate for the reels
+    SAMPLE_RATE = 48000
+    # format of the normalized audio; the channel layouts must be explicit, as ffmpeg 6.0 fails
+    # to negotiate one for a resampler after loudnorm ("Cannot select channel layout")
+    OUTPUT_FORMAT = f"aformat=sample_rates={SAMPLE_RATE}:channel_layouts=mono|stereo"
+
+    @classmethod
+    def measure(cls, path: str, cache: Optional[AnalysisCache] = None,
+                cancel_event: Optional[threading.Event] = None) -> Dict[str, float]:
+        """
+        loudnorm first-pass values of the whole file: input_i, input_tp, input_lra,
+        input_thresh and target_offset (for TARGET).
+        """
+        params = dict(cls.TARGET)
+        cached = cache.get(path, "loudness", params) if cache else None
+        if cached is not None:
+            return cached
+        t = cls.TARGET
+        proc = FFmpegWrapper.run_streaming(
+            ["-hide_banner", "-i", path, "-vn", "-sn", "-dn",
+             "-af", f"loudnorm=I={t['I']}:TP={t['TP']}:LRA={t['LRA']}:print_format=json", "-f", "null", "-"],
+            cancel_event=cancel_event, stderr_lines=64)
+        match = re.search(r"\{[^{}]*\"input_i\"[^{}]*\}", proc.stderr)
+        if not match:
+            raise FFmpegError(f"loudnorm measurement missing for {path}")
+        raw = json.loads(match.group(0))
+        measured = {key: float(raw[key]) for key in ("input_i", "input_tp", "input_lra", "input_thresh",
+                                                      "target_offset")}
+        if cache:
+            cache.put(path, "loudness", params, measured)
+        return measured
+
+    @classmethod
+    def filter(cls, measured: Dict[str, float]) -> str:
+        """
+        Single-pass loudnorm filter using a measurement from measure().
+        """
+        t = cls.TARGET
+        if measured["input_i"] == float("-inf") or measured["input_i"] < -70.0:
+            # silence: nothing to normalize
+            return cls.OUTPUT_FORMAT
+        return (f"loudnorm=I={t['I']}:TP={t['TP']}:LRA={t['LRA']}"
+                f":measured_I={measured['input_i']:.2f}:measured_TP={measured['input_tp']:.2f}"
+                f":measured_LRA={measured['input_lra']:.2f}:measured_thresh={measured['input_thresh']:.2f}"
+                f":offset={measured['target_offset']:.2f}:linear=true,{cls.OUTPUT_FORMAT}")
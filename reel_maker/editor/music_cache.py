@@ -0,0 +1,86 @@
+# Pre-decoded background music assets
+import os
+import threading
+from typing import Dict, List, Optional
+from .ffmpeg_wrapper import FFmpegWrapper
+from .analysis_cache import AnalysisCache
+from .loudness import Loudness
+from utils.file_utils import ensure_folder
+from utils.fingerprint import fast_fingerprint
+
+
+class MusicCache:
+    """
+    Decodes every background track once to a FLAC intermediate at the reel sample rate
+    (<root>/<fingerprint>[_norm].flac, loudness-normalized when asked), so renders read a
+    cheap lossless file instead of decoding the MP3/AAC again for every reel. input_args()
+    places a reel at any offset of the track and loops it when the reel runs past its end.
+    """
+
+    SAMPLE_RATE = Loudness.SAMPLE_RATE
+    CHANNELS = 2
+
+    def __init__(self, root: str, analysis_cache: Optional[AnalysisCache] = None):
+        self.root = root
+        self.analysis_cache = analysis_cache
+        ensure_folder(self.root)
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._durations: Dict[str, float] = {}
+
+    def prepare(self, music_path: str, normalize: bool = False,
+                cancel_event: Optional[threading.Event] = None) -> str:
+        """
+        Path of the decoded asset of music_path, decoding it first if needed. Concurrent
+        callers for the same track wait for a single decode.
+        """
+        name = fast_fingerprint(music_path) + ("_norm" if normalize else "") + ".flac"
+        asset = os.path.join(self.root, name)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(name, threading.Lock())
+        with key_lock:
+            if os.path.exists(asset):
+                return asset
+            args = ["-y", "-i", music_path, "-vn", "-sn", "-dn"]
+            if normalize:
+                measured = Loudness.measure(music_path, cache=self.analysis_cache, cancel_event=cancel_event)
+                args += ["-af", Loudness.filter(measured)]
+            tmp = asset + ".part.flac"
+            args += ["-ac", str(self.CHANNELS), "-ar", str(self.SAMPLE_RATE), "-c:a", "flac", tmp]
+            FFmpegWrapper.run(args, capture_output=True, cancel_event=cancel_event)
+            os.replace(tmp, asset)
+        return asset
+
+    def duration(self, asset: str) -> float:
+        with self._lock:
+            if asset in self._durations:
+                return self._durations[asset]
+        value = FFmpegWrapper.get_duration(asset)
+        with self._lock:
+            self._durations[asset] = value
+        return value
+
+    def input_args(self, asset: str, offset: float, duration: float, loop: bool = True) -> List[str]:
+        """
+        ffmpeg input options reading `duration` seconds of asset from `offset` (wrapped
+        around the track length when looping).
+        """
+        length = self.duration(asset)
+        args = []
+        if loop and length > 0:
+            offset %= length
+            if offset + duration > length:
+                args += ["-stream_loop", "-1"]
+        if offset > 0:
+            args += ["-ss", f"{offset:.3f}"]
+        return args + ["-t", f"{duration:.3f}", "-i", asset]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._durations.clear()
+            for name in os.listdir(self.root):
+                if name.endswith(".flac"):
+                    try:
+                        os.remove(os.path.join(self.root, name))
+                    except OSError:
+                        pass
@@ -0,0 +1,100 @@
+# Cache for ffprobe results
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from utils.file_utils import ensure_folder, file_stat_key
+from utils.fingerprint import fast_fingerprint
+
+
+class ProbeCache:
+    """
+    In-memory LRU of ffprobe results, optionally backed by a SQLite file.
+    Entries are keyed on (absolute path, size, mtime_ns), so a rewritten file misses
+    and its stale row is replaced on the next put. Disk rows also carry the content
+    fingerprint, so a copied or renamed file is found without running ffprobe again.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = 512):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._mem: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            ensure_folder(os.path.dirname(os.path.abspath(db_path)))
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(probes)")]
+            if columns and "fingerprint" not in columns:
+                # cache written by an older version; it is only a cache, start over
+                self._db.execute("DROP TABLE probes")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, fingerprint TEXT, data TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS probes_fingerprint ON probes (fingerprint)")
+            self._db.commit()
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            key = file_stat_key(path)
+        except OSError:
+            return None
+        with self._lock:
+            info = self._mem.get(key)
+            if info is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return info
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT data FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?", key
+                ).fetchone()
+                if not row:
+                    row = self._db.execute(
+                        "SELECT data FROM probes WHERE fingerprint = ? LIMIT 1", (fast_fingerprint(path),)
+                    ).fetchone()
+                if row:
+                    info = json.loads(row[0])
+                    self._remember(key, info)
+                    self.hits += 1
+                    return info
+            self.misses += 1
+            return None
+
+    def put(self, path: str, info: Dict[str, Any]) -> None:
+        try:
+            key = file_stat_key(path)
+        except OSError:
+            return
+        with self._lock:
+            # drop the entry of an older version of the same file
+            for old in [k for k in self._mem if k[0] == key[0] and k != key]:
+                del self._mem[old]
+            self._remember(key, info)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO probes (path, size, mtime_ns, fingerprint, data) VALUES (?, ?, ?, ?, ?)",
+                    key + (fast_fingerprint(path), json.dumps(info))
+                )
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._mem)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM probes")
+                self._db.commit()
+
+    def _remember(self, key: tuple, info: Dict[str, Any]) -> None:
+        self._mem[key] = info
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
@@ -0,0 +1,71 @@
+# Low-res proxies of sources for analysis and thumbnails
+import os
+import threading
+from typing import Dict, Optional
+from .ffmpeg_wrapper import FFmpegWrapper
+from utils.file_utils import ensure_folder
+from utils.fingerprint import fast_fingerprint
+
+
+class ProxyManager:
+    """
+    Keeps a low-res, short-GOP copy of every source under <root>/<fingerprint>.mp4. A seek
+    into the proxy decodes at most GOP small frames instead of a long GOP of 1080p/4K ones,
+    so scene detection, subject tracking and thumbnails read it instead of the original.
+    Renders always read the original. The proxy keeps the source timeline (times in the
+    proxy are times in the source).
+    """
+
+    # size of the shorter side of proxies
+    HEIGHT = 360
+    GOP = 12
+    ENCODER = ["-c:v", "libx264", "-preset", "ultrafast", "-tune", "fastdecode", "-crf", "28",
+               "-pix_fmt", "yuv420p", "-c:a", "aac", "-b:a", "96k"]
+
+    def __init__(self, root: str):
+        self.root = root
+        ensure_folder(self.root)
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def path_for(self, src_path: str) -> str:
+        return os.path.join(self.root, fast_fingerprint(src_path) + ".mp4")
+
+    def get(self, src_path: str) -> Optional[str]:
+        """
+        The finished proxy of src_path, or None if there is none (yet).
+        """
+        proxy = self.path_for(src_path)
+        return proxy if os.path.exists(proxy) else None
+
+    def ensure(self, src_path: str, threads: Optional[int] = None,
+               cancel_event: Optional[threading.Event] = None) -> str:
+        """
+        Create the proxy of src_path if needed and return the path to read for analysis.
+        Sources no taller than HEIGHT are their own proxy.
+        """
+        proxy = self.path_for(src_path)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(proxy, threading.Lock())
+        with key_lock:
+            if os.path.exists(proxy):
+                return proxy
+            video = FFmpegWrapper.get_stream(FFmpegWrapper.probe(src_path), "video")
+            if min(video.get("width") or 0, video.get("height") or 0) <= self.HEIGHT:
+                return src_path
+            tmp = proxy + ".part.mp4"
+            h = self.HEIGHT
+            args = ["-y", "-i", src_path, "-map", "0:v:0", "-map", "0:a:0?", "-sn", "-dn",
+                    "-vf", f"scale='if(gt(iw,ih),-2,{h})':'if(gt(iw,ih),{h},-2)':flags=fast_bilinear",
+                    "-g", str(self.GOP), "-keyint_min", str(self.GOP), "-sc_threshold", "0"]
+            args += self.ENCODER + ["-movflags", "+faststart", tmp]
+            FFmpegWrapper.run(args, capture_output=True, threads=threads, cancel_event=cancel_event,
+                              duration=FFmpegWrapper.get_duration(src_path))
+            os.replace(tmp, proxy)
+        return proxy
+
+    def remove(self, src_path: str) -> None:
+        try:
+            os.remove(self.path_for(src_path))
+        except OSError:
+            pass
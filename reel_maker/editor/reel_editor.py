@@ -1,11 +1,31 @@
 # Handles trimming, cropping, filtering
 import os
+import re
+import json
 import math
+import time
+import bisect
 import shutil
 import tempfile
-from typing import List, Optional, Dict, Any
-from .ffmpeg_wrapper import FFmpegWrapper, FFmpegError
-from utils.file_utils import ensure_folder, timestamped_filename, join_path, safe_filename
+import threading
+import contextlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple, Callable
+from .ffmpeg_wrapper import FFmpegWrapper, FFmpegError, FFmpegCancelled
+from .render_scheduler import RenderScheduler
+from .render_cache import RenderCache
+from .thumbnail_engine import ThumbnailEngine
+from .draft_index import DraftIndex
+from .analysis_cache import AnalysisCache
+from .scene_detector import SceneDetector
+from .crop_tracker import CropTracker
+from .highlight_scorer import HighlightScorer
+from .loudness import Loudness
+from .music_cache import MusicCache
+from .proxy_manager import ProxyManager
+from .storage_manager import StorageManager
+from utils.file_utils import ensure_folder, timestamped_filename, join_path, safe_filename, link_or_copy, transfer
+from utils.fingerprint import fast_fingerprint, video_hash_for
 
 
 class ReelEditor:
@@ -17,11 +37,68 @@ class ReelEditor:
     - place drafts in a per-video temp folder
     """
 
-    def __init__(self, base_output: str = "ReelShortMaker/output", temp_root: str = "ReelShortMaker/temp"):
+    # max number of segments written by one ffmpeg process in single-pass split mode
+    SINGLE_PASS_BATCH = 16
+    # a segment joins a single-pass batch (or a crop analysis run) only if it starts at most
+    # this many seconds after the previous one ends; the decode in between is thrown away
+    SINGLE_PASS_GAP = 2.0
+    # encoder settings of final renders; part of the render cache key
+    ENCODER = {"c:v": "libx264", "preset": "fast", "crf": "18", "pix_fmt": "yuv420p", "c:a": "aac", "b:a": "192k"}
+    # render profiles: drafts are quick previews at a fraction of the target size, exports
+    # render the kept drafts again with "final" (see finalize_draft)
+    PROFILES = {
+        "draft": {"scale": 0.5, "encoder": dict(ENCODER, preset="ultrafast", crf="26", **{"b:a": "128k"})},
+        "final": {"scale": 1.0, "encoder": ENCODER},
+    }
+    EXPORT_MODES = ("auto", "move", "link", "reflink", "copy")
+    # written to export folders by export_reels
+    EXPORT_MANIFEST = "export_manifest.json"
+
+    def __init__(self, base_output: str = "ReelShortMaker/output", temp_root: str = "ReelShortMaker/temp",
+                 scheduler: Optional[RenderScheduler] = None, render_cache: Optional[RenderCache] = None,
+                 draft_index: Optional[DraftIndex] = None, analysis_cache: Optional[AnalysisCache] = None,
+                 music_cache: Optional[MusicCache] = None, proxies: Optional[ProxyManager] = None):
         self.base_output = base_output
-        self.temp_root = temp_root
+        # absolute, so draft paths in the index, the render cache and the storage areas agree
+        self.temp_root = os.path.abspath(temp_root)
         ensure_folder(self.base_output)
         ensure_folder(self.temp_root)
+        self.scheduler = scheduler or RenderScheduler()
+        self.render_cache = render_cache or RenderCache(os.path.join(self.temp_root, ".render_cache"))
+        self.index = draft_index or DraftIndex(os.path.join(self.temp_root, "drafts.sqlite3"))
+        self.analysis_cache = analysis_cache or AnalysisCache(os.path.join(self.temp_root, "analysis.sqlite3"))
+        self.music_cache = music_cache or MusicCache(os.path.join(self.temp_root, ".music_cache"), self.analysis_cache)
+        self.proxies = proxies or ProxyManager(os.path.join(self.temp_root, ".proxies"))
+        self._export_lock = threading.Lock()
+        self.storage: Optional[StorageManager] = None
+
+    def video_hash(self, src_path: str) -> str:
+        """
+        Content id of a source (see video_hash_for); names its draft folder. Drafts left in a
+        folder named after the file stem, from before sources were fingerprinted, are moved
+        into it the first time the source is seen.
+        """
+        video_hash = video_hash_for(src_path)
+        self._adopt_legacy_drafts(src_path, video_hash)
+        return video_hash
+
+    def _adopt_legacy_drafts(self, src_path: str, video_hash: str) -> None:
+        stem = safe_filename(os.path.splitext(os.path.basename(src_path))[0])
+        legacy = os.path.join(self.temp_root, stem)
+        if not stem or stem.startswith(".") or stem == safe_filename(video_hash) or not os.path.isdir(legacy):
+            return
+        folder = self._make_video_temp_folder(video_hash)
+        for name in os.listdir(legacy):
+            try:
+                os.replace(os.path.join(legacy, name), os.path.join(folder, name))
+            except OSError:
+                pass
+        try:
+            os.rmdir(legacy)
+        except OSError:
+            pass
+        # drop the index rows of the old folder; the new one is rescanned on the next listing
+        self.index.reconcile(legacy, stem)
 
     def _make_video_temp_folder(self, video_hash: str) -> str:
         folder = os.path.join(self.temp_root, safe_filename(video_hash))
@@ -31,129 +108,806 @@ class ReelEditor:
     def create_single_reel(self, src_path: str, start: float = 0.0, duration: float = 15.0,
                            target_w: int = 1080, target_h: int = 1920,
                            overlay_text: Optional[str] = None, bg_music: Optional[str] = None,
-                           video_hash: Optional[str] = None) -> Dict[str, Any]:
+                           video_hash: Optional[str] = None, reel_index: Optional[int] = None,
+                           threads: Optional[int] = None,
+                           cancel_event: Optional[threading.Event] = None,
+                           on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                           thumbnail: bool = True, track_subject: bool = False,
+                           normalize_audio: bool = False, music_offset: float = 0.0,
+                           quality: str = "draft") -> Dict[str, Any]:
         """
         Create a single vertical reel and place it in a per-video temp folder. Returns metadata dict.
+        reel_index keeps file names unique when several reels of a video render at the same time.
+        on_progress receives ffmpeg progress events (see FFmpegWrapper.run_streaming).
+        With thumbnail=False no thumbnail is made (split_into_reels makes them in one pass).
+        track_subject pans the crop window to follow the subject (see CropTracker) instead of
+        cropping the centre. normalize_audio brings source and music to Loudness.TARGET using
+        their cached measurements (see Loudness). bg_music is read from its decoded asset (see
+        MusicCache) starting music_offset seconds into the track, looping at its end.
+        quality picks the render profile (see PROFILES).
         """
         if not video_hash:
-            video_hash = os.path.splitext(os.path.basename(src_path))[0]
+            video_hash = self.video_hash(src_path)
 
         temp_folder = self._make_video_temp_folder(video_hash)
-        base_out = timestamped_filename(video_hash + "_reel", "mp4")
-        out_path = os.path.join(temp_folder, base_out)
+        name = video_hash + "_reel" if reel_index is None else f"{video_hash}_reel{reel_index:03d}"
+        render_key = self._render_key(src_path, start, duration, target_w, target_h, overlay_text, bg_music,
+                                      track_subject, normalize_audio, music_offset, quality)
+        cached = self._from_render_cache(render_key, temp_folder, name, video_hash)
+        if cached:
+            return cached
+        with self._hold(src_path, temp_folder):
+            base_out = timestamped_filename(name, "mp4")
+            out_path = os.path.join(temp_folder, base_out)
 
-        # Build filter to scale then center-crop to target
-        vf = f"scale='if(gt(a,{target_w}/{target_h}),{target_w},-2)':'if(gt(a,{target_w}/{target_h}),-2,{target_h})',crop={target_w}:{target_h}"
-        # Add drawtext if required (font path auto-detected)
-        if overlay_text:
-            fontfile = self._get_default_font()
-            # escape colon and single quotes in text
-            text = overlay_text.replace(":", "\\:").replace("'", "\\'")
-            draw = f"drawtext=fontfile='{fontfile}':text='{text}':fontsize=48:fontcolor=white:x=(w-text_w)/2:y=h-180:box=1:boxcolor=black@0.5"
-            vf = vf + "," + draw
+            out_w, out_h, encoder = self._profile(quality, target_w, target_h)
+            crop_x = self._track_crop(src_path, start, duration, out_w, out_h, cancel_event) if track_subject else None
+            vf = self._build_video_filter(out_w, out_h, overlay_text, crop_x)
+            if not overlay_text and not bg_music and self._matches_target(src_path, out_w, out_h):
+                # source already has the reel geometry: let extract_clip stream-copy the cut
+                vf = None
 
-        # If bg_music provided, mix audios
-        try:
-            if bg_music:
-                # Use filter_complex to mix original audio + bg (bg lower volume)
-                audio_mix = "[0:a]volume=1.0[a0];[1:a]volume=0.4[a1];[a0][a1]amix=inputs=2:duration=first:dropout_transition=2[aout]"
-                args = [
-                    "-y",
-                    "-ss", str(start),
-                    "-i", src_path,
-                    "-i", bg_music,
-                    "-t", str(duration),
-                    "-filter_complex", audio_mix,
-                    "-map", "0:v",
-                    "-map", "[aout]",
-                    "-vf", vf,
-                    "-c:v", "libx264",
-                    "-preset", "fast",
-                    "-crf", "18",
-                    "-c:a", "aac",
-                    "-b:a", "192k",
-                    "-pix_fmt", "yuv420p",
-                    "-movflags", "+faststart",
-                    out_path
-                ]
-                FFmpegWrapper.run(args, capture_output=True)
-            else:
-                # simple single input
-                FFmpegWrapper.extract_clip(src_path, out_path, start=start, duration=duration, video_filter=vf)
-        except FFmpegError as e:
-            raise
+            src_af = self._loudness_filter(src_path, cancel_event) if normalize_audio else None
 
-        # generate thumbnail for the reel
-        thumb_path = out_path + ".thumb.jpg"
-        try:
-            FFmpegWrapper.create_thumbnail(out_path, thumb_path, time=0.5, width=360)
-        except Exception:
-            # ignore thumbnail errors
-            thumb_path = ""
+            # If bg_music provided, mix audios
+            try:
+                if bg_music:
+                    asset = self.music_cache.prepare(bg_music, normalize=normalize_audio, cancel_event=cancel_event)
+                    # Use filter_complex to mix original audio + bg (bg lower volume); amix must not
+                    # normalize, or it halves both inputs and the reel ends up 6 dB below the source
+                    audio_mix = (f"[0:a]{src_af or 'volume=1.0'}[a0];[1:a]volume=0.4[a1];"
+                                 "[a0][a1]amix=inputs=2:duration=first:dropout_transition=2:normalize=0[aout]")
+                    args = [
+                        "-y",
+                        "-ss", str(start),
+                        "-i", src_path,
+                    ] + self.music_cache.input_args(asset, music_offset, duration) + [
+                        "-t", str(duration),
+                        "-filter_complex", audio_mix,
+                        "-map", "0:v",
+                        "-map", "[aout]",
+                        "-vf", vf
+                    ] + self._encoder_args(encoder) + [
+                        "-movflags", "+faststart",
+                        out_path
+                    ]
+                    FFmpegWrapper.run(args, capture_output=True, threads=threads, cancel_event=cancel_event,
+                                      on_progress=on_progress, duration=duration)
+                else:
+                    # simple single input
+                    FFmpegWrapper.extract_clip(src_path, out_path, start=start, duration=duration, video_filter=vf,
+                                               threads=threads, cancel_event=cancel_event, on_progress=on_progress,
+                                               audio_filter=src_af, encoder_args=self._encoder_args(encoder))
+            except FFmpegError as e:
+                raise
 
-        meta = {
-            "path": out_path,
-            "thumb": thumb_path,
-            "start": start,
-            "duration": duration,
-            "video_hash": video_hash
-        }
-        return meta
+            thumb_path = self._make_thumbnail(out_path) if thumbnail else ""
+
+            meta = {
+                "path": out_path,
+                "name": os.path.basename(out_path),
+                "thumb": thumb_path,
+                "start": start,
+                "duration": duration,
+                "video_hash": video_hash,
+                "render_key": render_key,
+                "params": self._render_params(src_path, target_w, target_h, overlay_text, bg_music, track_subject,
+                                              normalize_audio, music_offset, quality)
+            }
+            self.render_cache.put(render_key, out_path, meta)
+            self.index.add(meta)
+            self.touch(out_path)
+            return meta
 
     def split_into_reels(self, src_path: str, reel_duration: int = 15, overlap: float = 0.0,
                          max_reels: Optional[int] = None, video_hash: Optional[str] = None,
+                         single_pass: bool = False, snap_to_scenes: bool = False, snap_tolerance: float = 2.0,
+                         rank_highlights: bool = False, continue_music: bool = True,
+                         section: Optional[Tuple[float, float]] = None,
+                         on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
                          **kwargs) -> List[Dict[str, Any]]:
         """
         Split a source video into multiple reels (drafts) saved into temp/video_hash/.
+        If single_pass is True the source is decoded once per batch of adjacent segments and
+        every segment of the batch is written from that one decode (split/trim filter graph);
+        segments far from any other (sparse highlights, gaps left by render cache hits) are
+        rendered on their own.
+        With snap_to_scenes, reel boundaries move to the nearest scene cut within
+        snap_tolerance seconds (see detect_scenes). With rank_highlights and max_reels, the
+        max_reels best non-overlapping parts by audio are rendered instead of the first ones.
+        With bg_music and continue_music, each reel picks the track up where the previous
+        reel left it (looping at its end) instead of restarting it.
+        section (start, end) limits the reels to that part of the source, e.g. the requested
+        range of a file from VideoDownloader.download_sections.
+        Segments (or batches) are rendered concurrently on self.scheduler. on_progress receives
+        the ffmpeg progress events of every job, tagged with the job's "reel" index.
         Returns list of metadata dictionaries for each created reel.
         """
         if not video_hash:
-            video_hash = os.path.splitext(os.path.basename(src_path))[0]
+            video_hash = self.video_hash(src_path)
         temp_folder = self._make_video_temp_folder(video_hash)
 
-        info = FFmpegWrapper.probe(src_path)
-        duration = float(info.get("format", {}).get("duration") or 0.0)
-        if duration <= 0:
-            raise RuntimeError("Could not obtain duration of source video")
+        with self._hold(src_path, temp_folder):
+            info = FFmpegWrapper.probe(src_path)
+            duration = float(info.get("format", {}).get("duration") or 0.0)
+            if duration <= 0:
+                raise RuntimeError("Could not obtain duration of source video")
+
+            lo, hi = (max(0.0, section[0]), min(duration, section[1])) if section else (0.0, duration)
+            if hi <= lo:
+                raise ValueError(f"section {section} is outside the source ({duration:.1f}s)")
+
+            has_audio = any(s.get("codec_type") == "audio" for s in info.get("streams", []))
+            cuts = self.detect_scenes(src_path) if snap_to_scenes else None
+            if rank_highlights and max_reels and has_audio:
+                segments = self._highlight_segments(src_path, duration, reel_duration, max_reels, cuts,
+                                                    snap_tolerance, span=(lo, hi) if section else None)
+            else:
+                # plan over the section as if it were the whole source, then shift back
+                section_cuts = [c - lo for c in cuts if lo < c < hi] if cuts else cuts
+                segments = [(round(start + lo, 3), seg_duration) for start, seg_duration in
+                            self._plan_segments(hi - lo, reel_duration, overlap, max_reels, section_cuts,
+                                                snap_tolerance)]
+            with self.scheduler.cancellable() as cancel_event:
+                if kwargs.get("track_subject"):
+                    # analyse each run of adjacent segments once here rather than in every
+                    # concurrent render job, skipping the source between runs
+                    for run in self._adjacent_runs(segments, self.SINGLE_PASS_GAP):
+                        CropTracker.analyse_range(src_path, segments[run[0]][0],
+                                                  max(start + dur for start, dur in (segments[i] for i in run)),
+                                                  cache=self.analysis_cache, cancel_event=cancel_event,
+                                                  decode_path=self.proxies.get(src_path))
+                if kwargs.get("normalize_audio"):
+                    # measure once up front; the render jobs then read the cached values
+                    self._loudness_filter(src_path, cancel_event)
+                if kwargs.get("bg_music"):
+                    # decode the track once; every job reads the asset
+                    self.music_cache.prepare(kwargs["bg_music"], normalize=bool(kwargs.get("normalize_audio")),
+                                             cancel_event=cancel_event)
+            music_offsets = [0.0] * len(segments)
+            if kwargs.get("bg_music") and continue_music:
+                elapsed = 0.0
+                for i, (_, seg_duration) in enumerate(segments):
+                    music_offsets[i] = round(elapsed, 3)
+                    elapsed += seg_duration
+
+            if single_pass:
+                results: List[Optional[Dict[str, Any]]] = [None] * len(segments)
+                pending = []
+                for i, (start, seg_duration) in enumerate(segments):
+                    key = self._render_key(src_path, start, seg_duration, music_offset=music_offsets[i], **kwargs)
+                    results[i] = self._from_render_cache(key, temp_folder, f"{video_hash}_reel{i:03d}", video_hash)
+                    if results[i] is None:
+                        pending.append((i, start, seg_duration, key))
+                runs = self._adjacent_runs([(start, dur) for _, start, dur, _ in pending], self.SINGLE_PASS_GAP,
+                                           self.SINGLE_PASS_BATCH)
+                batches = [[pending[j] for j in run] for run in runs]
+
+                def render_batch(batch, **job):
+                    if len(batch) == 1:
+                        i, start, seg_duration, _ = batch[0]
+                        return [self.create_single_reel(src_path, start=start, duration=seg_duration,
+                                                        video_hash=video_hash, reel_index=i, thumbnail=False,
+                                                        music_offset=music_offsets[i],
+                                                        on_progress=self._tag_progress(on_progress, i),
+                                                        **job, **kwargs)]
+                    return self._render_segments_single_pass(src_path, batch, temp_folder, video_hash,
+                                                             has_audio=has_audio,
+                                                             music_offsets=[music_offsets[i] for i, _, _, _ in batch],
+                                                             on_progress=self._tag_progress(on_progress, batch[0][0]),
+                                                             **job, **kwargs)
+
+                for batch, metas in zip(batches, self.scheduler.map_jobs(render_batch, batches)):
+                    for (i, _, _, _), meta in zip(batch, metas):
+                        results[i] = meta
+                self._thumbnails_from_source(src_path, results, **kwargs)
+                return results
+
+            def render_segment(item, **job):
+                i, (start, seg_duration) = item
+                return self.create_single_reel(src_path, start=start, duration=seg_duration,
+                                               video_hash=video_hash, reel_index=i, thumbnail=False,
+                                               music_offset=music_offsets[i],
+                                               on_progress=self._tag_progress(on_progress, i), **job, **kwargs)
+
+            results = self.scheduler.map_jobs(render_segment, list(enumerate(segments)))
+            self._thumbnails_from_source(src_path, results, **kwargs)
+            return results
+
+    def attach_storage(self, storage: StorageManager, quotas: Dict[str, int]) -> None:
+        """
+        Put the editor's folders under storage quotas: "drafts" (the draft folders under
+        temp_root; pinned drafts are kept), "proxies" and "music". The render cache keeps its
+        own LRU limit (RenderCache.max_bytes), but a draft evicted for space takes the cache
+        entry it is hard-linked to along, or nothing would be freed. Running renders hold their
+        source and folder. Areas holding sources should protect them with keep_source.
+        """
+        self.storage = storage
+        storage.add_area("drafts", self.temp_root, quotas["drafts"], protect=self._keep_draft_file,
+                         evict=self._evict_draft_file,
+                         exclude=[self.render_cache.root, self.proxies.root, self.music_cache.root])
+        storage.add_area("proxies", self.proxies.root, quotas["proxies"])
+        storage.add_area("music", self.music_cache.root, quotas["music"])
+
+    def pin_draft(self, reel_meta: Dict[str, Any], pinned: bool = True) -> None:
+        """
+        Pinned drafts are never evicted to free disk space.
+        """
+        self.index.set_pinned(reel_meta["path"], pinned)
+        reel_meta["pinned"] = pinned
+
+    def touch(self, path: str) -> None:
+        # mark a file as just used, for LRU eviction
+        if self.storage and path:
+            self.storage.touch(path)
+
+    def _hold(self, *paths: Optional[str]):
+        # keep the files of a running render from being evicted
+        return self.storage.hold(*paths) if self.storage else contextlib.nullcontext()
 
+    def _keep_draft_file(self, path: str) -> bool:
+        # thumbnails and filmstrips go with their draft; pinned drafts stay
+        return not path.endswith(".mp4") or self.index.is_pinned(path)
+
+    def keep_source(self, path: str) -> bool:
+        """
+        True while a pinned or unexported draft still needs the source at path (exporting a
+        draft renders it again from its source).
+        """
+        return self.index.source_needed(path)
+
+    def _evict_draft_file(self, path: str) -> List[str]:
+        meta = self.index.get(path) or {"path": path, "thumb": path + ".thumb.jpg"}
+        key = meta.get("render_key")
+        if key:
+            cached = self.render_cache.file_for(key)
+            try:
+                linked = os.path.samefile(cached, path)
+            except OSError:
+                linked = False
+            if linked:
+                self.render_cache.remove(key)
+        self.delete_draft(meta)
+        return [path, meta.get("thumb") or path + ".thumb.jpg"]
+
+    def prepare_proxy(self, src_path: str) -> Future:
+        """
+        Create the low-res proxy of a source in the background (see ProxyManager). Analysis
+        and thumbnails read the proxy once it is done; renders always read the original.
+        """
+        return self.scheduler.submit_job(self.proxies.ensure, src_path)
+
+    def detect_scenes(self, src_path: str, threshold: float = 0.3, min_scene: float = 1.0,
+                      cancel_event: Optional[threading.Event] = None) -> List[float]:
+        """
+        Scene-cut times of a source (seconds), cached per source fingerprint.
+        """
+        return SceneDetector.detect(src_path, threshold=threshold, min_scene=min_scene,
+                                    cache=self.analysis_cache, cancel_event=cancel_event,
+                                    decode_path=self.proxies.get(src_path))
+
+    def _plan_segments(self, duration: float, reel_duration: float, overlap: float = 0.0,
+                       max_reels: Optional[int] = None, cuts: Optional[List[float]] = None,
+                       tolerance: float = 2.0) -> List[Tuple[float, float]]:
+        """
+        Compute (start, duration) pairs covering a source of the given duration.
+        With cuts (sorted scene-cut times), every reel end and every overlapped start is
+        moved to the nearest cut within tolerance seconds, if there is one.
+        """
         step = reel_duration - overlap if reel_duration > overlap else reel_duration
+        if cuts:
+            return self._plan_snapped_segments(duration, reel_duration, step, max_reels, cuts, tolerance)
         count = math.ceil(duration / step)
         if max_reels:
             count = min(count, max_reels)
 
-        results = []
+        segments = []
         start = 0.0
         for i in range(count):
             if start >= duration:
                 break
-            meta = self.create_single_reel(src_path, start=start, duration=min(reel_duration, duration - start),
-                                          video_hash=video_hash, **kwargs)
-            results.append(meta)
+            segments.append((start, min(reel_duration, duration - start)))
             start += step
+        return segments
+
+    def _plan_snapped_segments(self, duration: float, reel_duration: float, step: float,
+                               max_reels: Optional[int], cuts: List[float],
+                               tolerance: float) -> List[Tuple[float, float]]:
+        def snap(t: float, lo: float) -> float:
+            return self._snap_to_cut(cuts, t, tolerance, lo)
+
+        segments = []
+        start = 0.0
+        while start < duration and (not max_reels or len(segments) < max_reels):
+            end = start + reel_duration
+            # a reel that would leave less than the tolerance behind runs to the end instead
+            end = duration if end >= duration - tolerance * 0.5 else snap(end, start + step * 0.5)
+            segments.append((start, round(min(end, duration) - start, 3)))
+            if end >= duration:
+                break
+            start = end if step >= reel_duration else snap(start + step, start)
+        return segments
+
+    @staticmethod
+    def _adjacent_runs(spans: List[Tuple[float, float]], gap: float,
+                       max_size: Optional[int] = None) -> List[List[int]]:
+        # indexes of (start, duration) spans, in start order, grouped into runs in which every
+        # span starts at most gap seconds after the previous ones end (at most max_size per run)
+        runs = []
+        end = 0.0
+        for i, (start, duration) in enumerate(spans):
+            if runs and start - end <= gap and (not max_size or len(runs[-1]) < max_size):
+                runs[-1].append(i)
+                end = max(end, start + duration)
+            else:
+                runs.append([i])
+                end = start + duration
+        return runs
+
+    @staticmethod
+    def _snap_to_cut(cuts: List[float], t: float, tolerance: float, lo: float) -> float:
+        # nearest cut to t within tolerance and after lo, else t
+        i = bisect.bisect_left(cuts, t)
+        near = [c for c in cuts[max(0, i - 1):i + 1] if abs(c - t) <= tolerance and c > lo]
+        return min(near, key=lambda c: abs(c - t)) if near else t
 
+    def _highlight_segments(self, src_path: str, duration: float, reel_duration: float, count: int,
+                            cuts: Optional[List[float]] = None,
+                            tolerance: float = 2.0,
+                            span: Optional[Tuple[float, float]] = None) -> List[Tuple[float, float]]:
+        """
+        The `count` best non-overlapping reel_duration windows by audio (see HighlightScorer),
+        within span (start, end) if given, in time order, snapped to scene cuts when cuts are given.
+        """
+        picks = HighlightScorer.rank(src_path, reel_duration, count, cache=self.analysis_cache,
+                                     decode_path=self.proxies.get(src_path), span=span)
+        if span:
+            duration = span[1]
+        segments = []
+        prev_end = span[0] if span else -1.0
+        for pick in picks:
+            start, end = pick["start"], min(pick["start"] + reel_duration, duration)
+            if cuts:
+                start = self._snap_to_cut(cuts, start, tolerance, prev_end - 1e-6)
+                end = min(self._snap_to_cut(cuts, end, tolerance, start + reel_duration * 0.5), duration)
+            start = max(start, prev_end)
+            if end - start > 0.5:
+                segments.append((start, round(end - start, 3)))
+                prev_end = end
+        return segments
+
+    def _render_segments_single_pass(self, src_path: str, segments: List[Tuple[int, float, float, str]],
+                                     temp_folder: str, video_hash: str, has_audio: bool = True, target_w: int = 1080, target_h: int = 1920,
+                                     overlay_text: Optional[str] = None,
+                                     bg_music: Optional[str] = None, track_subject: bool = False,
+                                     normalize_audio: bool = False, music_offsets: Optional[List[float]] = None,
+                                     quality: str = "draft", threads: Optional[int] = None,
+                                     cancel_event: Optional[threading.Event] = None,
+                                     on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Render several (index, start, duration, render_key) segments with a single ffmpeg process.
+        The source is seeked once to the first segment, scaled/cropped once, then split and
+        trimmed into one output per segment. music_offsets (one per segment) are where each
+        reel's music starts in the track.
+        """
+        n = len(segments)
+        batch_start = min(start for _, start, _, _ in segments)
+        batch_end = max(start + dur for _, start, dur, _ in segments)
+        out_w, out_h, encoder = self._profile(quality, target_w, target_h)
+        crop_x = None
+        if track_subject:
+            crop_x = self._track_crop(src_path, batch_start, batch_end - batch_start, out_w, out_h, cancel_event)
+        vf = self._build_video_filter(out_w, out_h, overlay_text, crop_x)
+
+        # one extra branch of the split feeds the thumbnails of all reels in the batch
+        graph = [f"[0:v]{vf},split={n + 1}" + "".join(f"[v{i}]" for i in range(n + 1))]
+        thumb_times = [start - batch_start + self._thumb_offset(dur) for _, start, dur, _ in segments]
+        graph.append(f"[v{n}]{ThumbnailEngine.thumbnail_branch(thumb_times)}[th]")
+        for i, (_, start, dur, _) in enumerate(segments):
+            rel = start - batch_start
+            graph.append(f"[v{i}]trim=start={rel:.3f}:end={rel + dur:.3f},setpts=PTS-STARTPTS[vo{i}]")
+        if has_audio:
+            src_af = self._loudness_filter(src_path, cancel_event) if normalize_audio else None
+            graph.append(f"[0:a]{src_af + ',' if src_af else ''}asplit={n}" + "".join(f"[a{i}]" for i in range(n)))
+            for i, (_, start, dur, _) in enumerate(segments):
+                rel = start - batch_start
+                graph.append(f"[a{i}]atrim=start={rel:.3f}:end={rel + dur:.3f},asetpts=PTS-STARTPTS[ao{i}]")
+        music_args = []
+        if has_audio and bg_music:
+            # the batch reads one span of the track; each reel trims its part, mixed under the original
+            # audio (unnormalized, as in create_single_reel)
+            offsets = music_offsets or [0.0] * n
+            music_start = min(offsets)
+            music_end = max(off + dur for off, (_, _, dur, _) in zip(offsets, segments))
+            asset = self.music_cache.prepare(bg_music, normalize=normalize_audio, cancel_event=cancel_event)
+            music_args = self.music_cache.input_args(asset, music_start, music_end - music_start)
+            graph.append(f"[1:a]volume=0.4,asplit={n}" + "".join(f"[m{i}]" for i in range(n)))
+            for i, (off, (_, start, dur, _)) in enumerate(zip(offsets, segments)):
+                rel = off - music_start
+                graph.append(f"[m{i}]atrim=start={rel:.3f}:end={rel + dur:.3f},asetpts=PTS-STARTPTS[mt{i}]")
+                graph.append(f"[ao{i}][mt{i}]amix=inputs=2:duration=first:dropout_transition=2:normalize=0[ax{i}]")
+
+        args = ["-y", "-ss", str(batch_start), "-t", str(batch_end - batch_start), "-i", src_path] + music_args
+        args += ["-filter_complex", ";".join(graph)]
+
+        out_paths = []
+        for i, (index, _, _, _) in enumerate(segments):
+            base_out = timestamped_filename(f"{video_hash}_reel{index:03d}", "mp4")
+            out_path = os.path.join(temp_folder, base_out)
+            out_paths.append(out_path)
+            args += ["-map", f"[vo{i}]"]
+            if has_audio:
+                args += ["-map", f"[ax{i}]" if bg_music else f"[ao{i}]"]
+            args += self._encoder_args(encoder) + ["-movflags", "+faststart"]
+            if threads:
+                args += ["-threads", str(threads)]
+            args.append(out_path)
+        frame_dir = tempfile.mkdtemp(prefix="thumbs_", dir=temp_folder)
+        args += ["-map", "[th]", "-vsync", "vfr", "-q:v", "3"]
+        if threads:
+            args += ["-threads", str(threads)]
+        args.append(os.path.join(frame_dir, "frame_%04d.jpg"))
+        try:
+            FFmpegWrapper.run(args, capture_output=True, threads=threads, cancel_event=cancel_event,
+                              on_progress=on_progress, duration=batch_end - batch_start)
+            thumbs = ThumbnailEngine.collect_frames(frame_dir, [p + ".thumb.jpg" for p in out_paths])
+        finally:
+            shutil.rmtree(frame_dir, ignore_errors=True)
+
+        results = []
+        for (_, start, dur, key), music_offset, out_path, thumb in zip(segments, music_offsets or [0.0] * n,
+                                                                       out_paths, thumbs):
+            meta = {
+                "path": out_path,
+                "name": os.path.basename(out_path),
+                "thumb": thumb or self._make_thumbnail(out_path),
+                "start": start,
+                "duration": dur,
+                "video_hash": video_hash,
+                "render_key": key,
+                "params": self._render_params(src_path, target_w, target_h, overlay_text, bg_music, track_subject,
+                                              normalize_audio, music_offset, quality)
+            }
+            self.render_cache.put(key, out_path, meta)
+            self.index.add(meta)
+            self.touch(out_path)
+            results.append(meta)
+        return results
+
+    @staticmethod
+    def _tag_progress(on_progress: Optional[Callable[[Dict[str, Any]], None]],
+                      reel: int) -> Optional[Callable[[Dict[str, Any]], None]]:
+        if on_progress is None:
+            return None
+        return lambda event: on_progress(dict(event, reel=reel))
+
+    def _encoder_args(self, encoder: Optional[Dict[str, str]] = None) -> List[str]:
+        args = []
+        for opt, value in (encoder or self.ENCODER).items():
+            args += [f"-{opt}", str(value)]
+        return args
+
+    def _profile(self, quality: str, target_w: int, target_h: int) -> Tuple[int, int, Dict[str, str]]:
+        # output size and encoder settings of a render profile
+        profile = self.PROFILES.get(quality)
+        if profile is None:
+            raise ValueError(f"unknown render quality {quality!r} (expected one of {', '.join(self.PROFILES)})")
+        scale = profile["scale"]
+        return int(target_w * scale) // 2 * 2, int(target_h * scale) // 2 * 2, profile["encoder"]
+
+    def _fingerprint(self, path: str) -> str:
+        return fast_fingerprint(path)
+
+    def _render_key(self, src_path: str, start: float, duration: float, target_w: int = 1080,
+                    target_h: int = 1920, overlay_text: Optional[str] = None,
+                    bg_music: Optional[str] = None, track_subject: bool = False,
+                    normalize_audio: bool = False, music_offset: float = 0.0, quality: str = "draft") -> str:
+        parts = {
+            "source": self._fingerprint(src_path),
+            "start": round(start, 3),
+            "duration": round(duration, 3),
+            "size": [target_w, target_h],
+            "overlay_text": overlay_text,
+            "font": self._get_default_font() if overlay_text else None,
+            "bg_music": self._fingerprint(bg_music) if bg_music else None,
+            "encoder": self._profile(quality, target_w, target_h)[2],
+        }
+        if track_subject:
+            parts["crop"] = "tracked"
+        if normalize_audio:
+            parts["loudness"] = Loudness.TARGET
+        if bg_music and music_offset:
+            parts["music_offset"] = round(music_offset, 3)
+        if quality != "final":
+            parts["quality"] = quality
+        return RenderCache.make_key(parts)
+
+    def _from_render_cache(self, key: str, temp_folder: str, name: str,
+                           video_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the draft for an already rendered key. If the draft was deleted but the cached
+        render is still there, it is linked back into temp_folder as a new draft.
+        """
+        entry = self.render_cache.get(key)
+        if not entry:
+            return None
+        meta = dict(entry["meta"])
+        if os.path.exists(meta.get("path") or "") and os.path.dirname(meta["path"]) == temp_folder:
+            self.index.add(meta)
+            self.touch(meta["path"])
+            return meta
+        out_path = os.path.join(temp_folder, timestamped_filename(name, "mp4"))
+        link_or_copy(entry["file"], out_path)
+        meta.update(path=out_path, name=os.path.basename(out_path), thumb=self._make_thumbnail(out_path),
+                    video_hash=video_hash)
+        self.render_cache.update_meta(key, meta)
+        self.index.add(meta)
+        self.touch(out_path)
+        return meta
+
+    def _build_video_filter(self, target_w: int, target_h: int, overlay_text: Optional[str] = None,
+                            crop_x: Optional[str] = None) -> str:
+        # Build filter to scale then crop to target (centered unless a crop x expression is given)
+        vf = f"scale='if(gt(a,{target_w}/{target_h}),{target_w},-2)':'if(gt(a,{target_w}/{target_h}),-2,{target_h})',crop={target_w}:{target_h}"
+        if crop_x:
+            vf += f":x='{crop_x}'"
+        # Add drawtext if required (font path auto-detected)
+        if overlay_text:
+            fontfile = self._get_default_font()
+            # escape colon and single quotes in text
+            text = overlay_text.replace(":", "\\:").replace("'", "\\'")
+            # sized for 1920 px tall reels, scaled with the output height
+            size, margin = round(48 * target_h / 1920), round(180 * target_h / 1920)
+            draw = f"drawtext=fontfile='{fontfile}':text='{text}':fontsize={size}:fontcolor=white:x=(w-text_w)/2:y=h-{margin}:box=1:boxcolor=black@0.5"
+            vf = vf + "," + draw
+        return vf
+
+    def _matches_target(self, src_path: str, target_w: int, target_h: int) -> bool:
+        # True when scale/crop to target would be a no-op on the source
+        try:
+            video = FFmpegWrapper.get_stream(FFmpegWrapper.probe(src_path), "video")
+        except FFmpegError:
+            return False
+        rotation = video.get("tags", {}).get("rotate") or any(
+            sd.get("rotation") for sd in video.get("side_data_list", []))
+        return (not rotation and video.get("width") == target_w and video.get("height") == target_h
+                and video.get("sample_aspect_ratio", "1:1") in ("1:1", "0:1"))
+
+    def _track_crop(self, src_path: str, start: float, duration: float, target_w: int, target_h: int,
+                    cancel_event: Optional[threading.Event] = None) -> Optional[str]:
+        # crop x expression following the subject, with t counted from start (the input seek)
+        return CropTracker.crop_expression(src_path, start, duration, target_w, target_h,
+                                           cache=self.analysis_cache, cancel_event=cancel_event,
+                                           decode_path=self.proxies.get(src_path))
+
+    def _loudness_filter(self, path: str, cancel_event: Optional[threading.Event] = None) -> Optional[str]:
+        # single-pass normalization filter from the cached measurement; None for files without audio
+        if not FFmpegWrapper.get_stream(FFmpegWrapper.probe(path), "audio"):
+            return None
+        return Loudness.filter(Loudness.measure(path, cache=self.analysis_cache, cancel_event=cancel_event))
+
+    @staticmethod
+    def _thumb_offset(duration: float) -> float:
+        # thumbnails are taken half a second into the reel (or mid-reel for very short ones)
+        return min(0.5, duration / 2)
+
+    def _thumbnails_from_source(self, src_path: str, metas: List[Dict[str, Any]], target_w: int = 1080,
+                                target_h: int = 1920, overlay_text: Optional[str] = None,
+                                track_subject: bool = False, **_) -> None:
+        """
+        Fill in missing reel thumbnails from one decode of the source, or of its proxy when
+        there is one (instead of one ffmpeg process per reel output).
+        """
+        todo = [m for m in metas if not m.get("thumb")]
+        if not todo:
+            return
+        if track_subject:
+            # the crop window moves, so only the reels themselves show the right framing
+            thumbs = [self._make_thumbnail(m["path"]) for m in todo]
+        else:
+            vf = self._build_video_filter(target_w, target_h, overlay_text)
+            try:
+                res = ThumbnailEngine.extract(self.proxies.get(src_path) or src_path,
+                                              [m["start"] + self._thumb_offset(m["duration"]) for m in todo],
+                                              [m["path"] + ".thumb.jpg" for m in todo], video_filter=vf)
+                thumbs = res["thumbs"]
+            except Exception:
+                # ignore thumbnail errors
+                return
+        for meta, thumb in zip(todo, thumbs):
+            meta["thumb"] = thumb
+            if thumb:
+                self.index.update(meta["path"], thumb=thumb)
+                if meta.get("render_key"):
+                    self.render_cache.update_meta(meta["render_key"], meta)
+
+    def create_filmstrip(self, src_path: str, video_hash: Optional[str] = None, count: int = 20) -> Dict[str, Any]:
+        """
+        Evenly spaced sprite sheet of the source for scrubbing, stored in its draft folder.
+        """
+        folder = self._make_video_temp_folder(video_hash or self.video_hash(src_path))
+        return ThumbnailEngine.filmstrip(self.proxies.get(src_path) or src_path, os.path.join(folder, "filmstrip.jpg"),
+                                         count=count)
+
+    def fill_missing_thumbnails(self, video_hash: str) -> List[str]:
+        created = ThumbnailEngine.fill_missing(self._make_video_temp_folder(video_hash))
+        for thumb in created:
+            self.index.update(thumb[:-len(".thumb.jpg")], thumb=thumb)
+        return created
+
+    def list_drafts(self, video_hash: str) -> List[Dict[str, Any]]:
+        """
+        Drafts of one source from the draft index; the folder is rescanned only if it changed.
+        """
+        folder = os.path.join(self.temp_root, safe_filename(video_hash))
+        self.index.reconcile(folder, video_hash)
+        return self.index.list_drafts(video_hash)
+
+    def draft_changes(self, video_hash: str, since: int = -1) -> Tuple[int, List[Dict[str, Any]], List[str]]:
+        """
+        Drafts of one source added or modified, and paths removed, since change counter
+        `since` (see DraftIndex.changes). Returns (counter, drafts, removed paths).
+        """
+        folder = os.path.join(self.temp_root, safe_filename(video_hash))
+        self.index.reconcile(folder, video_hash)
+        return self.index.changes(video_hash, since)
+
+    def delete_draft(self, reel_meta: Dict[str, Any]) -> None:
+        path = reel_meta["path"]
+        if os.path.exists(path):
+            os.remove(path)
+        thumb = reel_meta.get("thumb")
+        if thumb and os.path.exists(thumb):
+            os.remove(thumb)
+        self.index.remove(path)
+
+    def _render_params(self, src_path: str, target_w: int, target_h: int, overlay_text: Optional[str],
+                       bg_music: Optional[str], track_subject: bool = False,
+                       normalize_audio: bool = False, music_offset: float = 0.0,
+                       quality: str = "draft") -> Dict[str, Any]:
+        # everything needed to render the same reel again
+        return {
+            "src_path": os.path.abspath(src_path),
+            "target_w": target_w,
+            "target_h": target_h,
+            "overlay_text": overlay_text,
+            "bg_music": os.path.abspath(bg_music) if bg_music else None,
+            "track_subject": track_subject,
+            "normalize_audio": normalize_audio,
+            "music_offset": music_offset,
+            "quality": quality,
+        }
+
+    def _make_thumbnail(self, reel_path: str) -> str:
+        # generate thumbnail for the reel
+        thumb_path = reel_path + ".thumb.jpg"
+        try:
+            FFmpegWrapper.create_thumbnail(reel_path, thumb_path, time=0.5, width=360)
+        except Exception:
+            # ignore thumbnail errors
+            thumb_path = ""
+        return thumb_path
+
+    def finalize_draft(self, reel_meta: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Render a draft-quality reel again with the "final" profile from its stored parameters.
+        The final render replaces the draft in its folder and in the draft index; its metadata
+        is returned. Reels that are already final are returned unchanged.
+        """
+        return self.finalize_drafts([reel_meta])[0]
+
+    def finalize_drafts(self, metas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        finalize_draft for many reels; the final renders run concurrently on self.scheduler.
+        Every source is checked before anything is rendered. If some renders fail, the others
+        still replace their drafts before the error is raised.
+        """
+        # reels from before render profiles have no "quality" and were rendered at final quality
+        pending = [i for i, meta in enumerate(metas) if (meta.get("params") or {}).get("quality", "final") != "final"]
+        for i in pending:
+            src_path = metas[i]["params"].get("src_path")
+            if not os.path.exists(src_path or ""):
+                raise FileNotFoundError(f"Source of the draft not found: {src_path}")
+        futures: List[Optional[Future]] = [None] * len(metas)
+        for i in pending:
+            meta, params = metas[i], metas[i]["params"]
+            match = re.search(r"_reel(\d+)_", meta.get("name") or os.path.basename(meta["path"]))
+            futures[i] = self.scheduler.submit_job(
+                self.create_single_reel, params["src_path"], start=meta["start"], duration=meta["duration"],
+                target_w=params["target_w"], target_h=params["target_h"], overlay_text=params.get("overlay_text"),
+                bg_music=params.get("bg_music"), video_hash=meta.get("video_hash"),
+                reel_index=int(match.group(1)) if match else None, track_subject=bool(params.get("track_subject")),
+                normalize_audio=bool(params.get("normalize_audio")), music_offset=params.get("music_offset") or 0.0,
+                quality="final")
+        results, errors = list(metas), []
+        for i in pending:
+            try:
+                results[i] = futures[i].result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            self.delete_draft(metas[i])
+        if errors:
+            if len(errors) == 1 or all(isinstance(e, FFmpegCancelled) for e in errors):
+                raise errors[0]
+            # an FFmpegError when only renders failed, so callers (the job server) can retry
+            error = FFmpegError if all(isinstance(e, FFmpegError) for e in errors) else RuntimeError
+            raise error(f"{len(errors)} of {len(pending)} drafts could not be finalized: "
+                        + "; ".join(str(e) for e in errors)) from errors[0]
         return results
 
     def export_reel(self, reel_meta: Dict[str, Any], dest_folder: Optional[str] = None) -> str:
         """
-        Move a reel from temp folder to final output folder (base_output) or to dest_folder.
+        Copy a reel from temp folder to final output folder (base_output) or to dest_folder.
+        Draft-quality reels are rendered at final quality first (see finalize_draft).
         Returns path of exported file.
         """
-        src = reel_meta.get("path")
-        if not src or not os.path.exists(src):
-            raise FileNotFoundError("Reel file not found")
+        return self.export_reels([reel_meta], dest_folder, manifest=False)[0]["path"]
 
+    def export_reels(self, metas: List[Dict[str, Any]], dest_folder: Optional[str] = None, mode: str = "auto",
+                     workers: int = 4, manifest: bool = True) -> List[Dict[str, Any]]:
+        """
+        Export many reels to base_output or dest_folder. Drafts are finalized first (see
+        finalize_drafts). mode picks how files get there (see utils.file_utils.transfer):
+        "auto" reflinks or hard-links on the same filesystem and copies otherwise, "move"
+        takes the reels out of the temp folder, "link", "reflink" and "copy" force a method.
+        Files are transferred by `workers` threads. With manifest, the sha256 of every file
+        (hashed while it is copied) is recorded in EXPORT_MANIFEST of the destination.
+        Returns [{"path", "name", "size", "sha256", "method", "source", "start", "duration"}].
+        """
+        if mode not in self.EXPORT_MODES:
+            raise ValueError(f"unknown export mode {mode!r} (expected one of {', '.join(self.EXPORT_MODES)})")
+        for meta in metas:
+            if not meta.get("path") or not os.path.exists(meta["path"]):
+                raise FileNotFoundError(f"Reel file not found: {meta.get('path')}")
+        metas = self.finalize_drafts(metas)
         dest_folder = dest_folder or self.base_output
         ensure_folder(dest_folder)
-        dst = os.path.join(dest_folder, os.path.basename(src))
-        shutil.copy2(src, dst)
-        # copy thumbnail too
-        thumb = reel_meta.get("thumb")
-        if thumb and os.path.exists(thumb):
+
+        def export_one(meta: Dict[str, Any]) -> Dict[str, Any]:
+            src = meta["path"]
+            dst = os.path.join(dest_folder, os.path.basename(src))
+            method, digest = transfer(src, dst, mode=mode, checksum=manifest)
+            # copy thumbnail too
+            thumb = meta.get("thumb")
+            if thumb and os.path.exists(thumb):
+                try:
+                    transfer(thumb, dst + ".thumb.jpg", mode=mode)
+                except Exception:
+                    pass
+            if mode == "move":
+                self.index.remove(src)
+            else:
+                self.index.update(src, exported_to=dst)
+                self.touch(src)
+            return {"path": dst, "name": os.path.basename(dst), "size": os.path.getsize(dst), "sha256": digest,
+                    "method": method, "source": (meta.get("params") or {}).get("src_path"),
+                    "start": meta.get("start"), "duration": meta.get("duration")}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(metas) or 1)),
+                                thread_name_prefix="export") as pool:
+            results = list(pool.map(export_one, metas))
+        if manifest and results:
+            self._write_export_manifest(dest_folder, results)
+        return results
+
+    def _write_export_manifest(self, dest_folder: str, results: List[Dict[str, Any]]) -> None:
+        # entries of earlier exports to the folder are kept unless the same file was exported again
+        path = os.path.join(dest_folder, self.EXPORT_MANIFEST)
+        with self._export_lock:
             try:
-                shutil.copy2(thumb, dst + ".thumb.jpg")
-            except Exception:
-                pass
-        return dst
+                with open(path, "r", encoding="utf-8") as fh:
+                    files = {f["name"]: f for f in json.load(fh).get("files", [])}
+            except (OSError, ValueError):
+                files = {}
+            exported = time.time()
+            for r in results:
+                files[r["name"]] = {key: value for key, value in r.items() if key != "path"}
+                files[r["name"]]["exported"] = exported
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"files": sorted(files.values(), key=lambda f: f["name"])}, fh, indent=2)
+            os.replace(tmp, path)
 
     def _get_default_font(self) -> str:
         # Try common font paths, fallback to none (ffmpeg may use default)
@@ -0,0 +1,147 @@
+# Content-addressed cache of rendered reels
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+from utils.file_utils import ensure_folder, link_or_copy
+
+
+class RenderCache:
+    """
+    Stores rendered reels under <root>/<key>.mp4, where key is a hash of everything that
+    determines the output (see ReelEditor._render_key). A manifest.json records size,
+    last use and the draft that was created from each entry. When the total size goes
+    over max_bytes the least recently used entries are evicted. Cache hits only update
+    last_use in memory; the manifest is rewritten at most every SAVE_INTERVAL seconds for
+    them (and by flush(), put() and the other changes).
+    """
+
+    MANIFEST = "manifest.json"
+    SAVE_INTERVAL = 30.0
+
+    def __init__(self, root: str, max_bytes: int = 5 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        ensure_folder(self.root)
+        self._lock = threading.Lock()
+        self._manifest_path = os.path.join(self.root, self.MANIFEST)
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    @staticmethod
+    def make_key(parts: Dict[str, Any]) -> str:
+        blob = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the manifest entry for key (with "file" pointing at the cached render), or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                self.misses += 1
+                return None
+            if not os.path.exists(entry["file"]):
+                del self._entries[key]
+                self._save()
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry["last_used"] = time.time()
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.SAVE_INTERVAL:
+                self._save()
+            return dict(entry)
+
+    def file_for(self, key: str) -> str:
+        return os.path.join(self.root, key + ".mp4")
+
+    def put(self, key: str, rendered_path: str, meta: Dict[str, Any]) -> None:
+        """
+        Add a finished render to the cache. The file is hard-linked when possible so the
+        draft and its cache entry share storage.
+        """
+        cached = self.file_for(key)
+        if not os.path.exists(cached):
+            tmp = cached + ".part"
+            link_or_copy(rendered_path, tmp)
+            os.replace(tmp, cached)
+        with self._lock:
+            self._entries[key] = {
+                "file": cached,
+                "size": os.path.getsize(cached),
+                "last_used": time.time(),
+                "meta": meta,
+            }
+            self._evict()
+            self._save()
+
+    def update_meta(self, key: str, meta: Dict[str, Any]) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._entries[key]["meta"] = meta
+                self._save()
+
+    def remove(self, key: str) -> None:
+        """
+        Drop an entry and its file.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            try:
+                os.remove(entry["file"])
+            except OSError:
+                pass
+            self._save()
+
+    def flush(self) -> None:
+        """
+        Write last-use times of cache hits that are only held in memory.
+        """
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "bytes": sum(e.get("size", 0) for e in self._entries.values())}
+
+    def total_size(self) -> int:
+        with self._lock:
+            return sum(e.get("size", 0) for e in self._entries.values())
+
+    def _evict(self) -> None:
+        total = sum(e.get("size", 0) for e in self._entries.values())
+        for key in sorted(self._entries, key=lambda k: self._entries[k].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries.pop(key)
+            total -= entry.get("size", 0)
+            try:
+                os.remove(entry["file"])
+            except OSError:
+                pass
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self._entries, fh)
+        os.replace(tmp, self._manifest_path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
@@ -0,0 +1,109 @@
+# Bounded worker pool for ffmpeg render jobs
+import os
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, Future, CancelledError
+from typing import Callable, Iterable, List, Any, Optional, Set
+from .ffmpeg_wrapper import FFmpegCancelled
+
+
+class RenderScheduler:
+    """
+    Runs render jobs on a bounded pool of worker threads. Every worker drives one ffmpeg
+    process at a time, so max_workers bounds the number of concurrent ffmpeg processes.
+    The machine core budget is split evenly between workers and handed to each job as
+    its `threads` value, together with a `cancel_event` the job must pass to ffmpeg.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, core_budget: Optional[int] = None):
+        self.core_budget = core_budget or os.cpu_count() or 1
+        # x264 does not scale linearly past a few threads, so prefer more jobs over more threads
+        self.max_workers = max_workers or max(1, min(self.core_budget // 4, 8))
+        self.threads_per_job = max(1, self.core_budget // self.max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="render")
+        self._lock = threading.Lock()
+        self._active: Set[threading.Event] = set()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Run a plain callable on the pool (no threads / cancel_event injected).
+        """
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def submit_job(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Run a single render job; fn receives threads= and cancel_event= keyword arguments.
+        """
+        cancel_event = self._register()
+
+        def job():
+            try:
+                return self._run_job(fn, cancel_event, *args, **kwargs)
+            finally:
+                self._unregister(cancel_event)
+
+        return self._pool.submit(job)
+
+    def map_jobs(self, fn: Callable, items: Iterable[Any]) -> List[Any]:
+        """
+        Run fn(item, threads=..., cancel_event=...) for every item and return the results in
+        input order. The first failure cancels the remaining jobs of the batch and is re-raised.
+        """
+        cancel_event = self._register()
+        futures = []
+        try:
+            futures = [self._pool.submit(self._run_job, fn, cancel_event, item) for item in items]
+            results = []
+            for f in futures:
+                try:
+                    results.append(f.result())
+                except CancelledError:
+                    raise FFmpegCancelled("render cancelled")
+            return results
+        except BaseException:
+            cancel_event.set()
+            for f in futures:
+                f.cancel()
+            raise
+        finally:
+            self._unregister(cancel_event)
+
+    @contextmanager
+    def cancellable(self):
+        """
+        A cancel_event for work a caller runs itself rather than on the pool (analysis before
+        a batch, ...); cancel() sets it like the events of the jobs.
+        """
+        cancel_event = self._register()
+        try:
+            yield cancel_event
+        finally:
+            self._unregister(cancel_event)
+
+    def cancel(self) -> None:
+        """
+        Cancel every running batch/job: pending jobs are skipped, running ffmpeg processes killed.
+        """
+        with self._lock:
+            for ev in self._active:
+                ev.set()
+
+    def shutdown(self, cancel: bool = True) -> None:
+        if cancel:
+            self.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run_job(self, fn: Callable, cancel_event: threading.Event, *args, **kwargs) -> Any:
+        if cancel_event.is_set():
+            raise FFmpegCancelled("render cancelled")
+        return fn(*args, threads=self.threads_per_job, cancel_event=cancel_event, **kwargs)
+
+    def _register(self) -> threading.Event:
+        ev = threading.Event()
+        with self._lock:
+            self._active.add(ev)
+        return ev
+
+    def _unregister(self, ev: threading.Event) -> None:
+        with self._lock:
+            self._active.discard(ev)
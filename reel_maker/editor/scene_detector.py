@@ -0,0 +1,104 @@
+# Scene-cut detection on a low-res decode
+import threading
+from typing import Dict, Any, List, Optional
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .ffmpeg_wrapper import FFmpegWrapper
+from .analysis_cache import AnalysisCache
+
+
+class SceneDetector:
+    """
+    Finds hard cuts in a video. ffmpeg decodes the source at a low frame rate, scaled down
+    to a small grayscale frame, and streams it as rawvideo; every batch of frames is scored
+    with NumPy array operations (mean absolute pixel difference and histogram distance to
+    the previous frame), so nothing is looped over per pixel or per frame in Python.
+    """
+
+    WIDTH = 96
+    HEIGHT = 54
+    FPS = 10.0
+    BINS = 16
+    BATCH = 512
+
+    @classmethod
+    def frame_scores(cls, src_path: str, fps: float = FPS, threads: Optional[int] = None,
+                     cancel_event: Optional[threading.Event] = None) -> np.ndarray:
+        """
+        Cut score (0..1) of every analysed frame against the frame before it; frame i is at
+        i / fps seconds. The first frame scores 0.
+        """
+        w, h = cls.WIDTH, cls.HEIGHT
+        args = ["-skip_loop_filter", "all"]  # deblocking is invisible at this size; skip it
+        if threads:
+            args += ["-threads", str(threads)]
+        args += ["-i", src_path, "-an", "-sn", "-dn",
+                 "-vf", f"fps={fps},scale={w}:{h}:flags=fast_bilinear,format=gray",
+                 "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1"]
+        frame_size = w * h
+        scores = [np.zeros(1, dtype=np.float32)]
+        prev = None
+        for chunk in FFmpegWrapper.read_raw(args, frame_size * cls.BATCH, cancel_event=cancel_event):
+            usable = len(chunk) - len(chunk) % frame_size
+            if not usable:
+                continue
+            frames = np.frombuffer(chunk[:usable], dtype=np.uint8).reshape(-1, h, w)
+            stack = frames if prev is None else np.concatenate([prev, frames])
+            if len(stack) > 1:
+                scores.append(cls._score_batch(stack))
+            prev = frames[-1:]
+        return np.concatenate(scores) if prev is not None else np.zeros(0, dtype=np.float32)
+
+    @classmethod
+    def _score_batch(cls, stack: np.ndarray) -> np.ndarray:
+        # scores of stack[1:] against stack[:-1]
+        n = len(stack)
+        pixel = np.abs(np.diff(stack.astype(np.int16), axis=0)).mean(axis=(1, 2)) / 255.0
+        bins = (stack // (256 // cls.BINS)).reshape(n, -1).astype(np.int64)
+        bins += (np.arange(n) * cls.BINS)[:, None]
+        hist = np.bincount(bins.ravel(), minlength=n * cls.BINS).reshape(n, cls.BINS) / stack[0].size
+        hist_dist = 0.5 * np.abs(np.diff(hist, axis=0)).sum(axis=1)
+        return (0.5 * (np.minimum(pixel * 2.0, 1.0) + hist_dist)).astype(np.float32)
+
+    @staticmethod
+    def find_cuts(scores: np.ndarray, fps: float, threshold: float = 0.3, ratio: float = 3.0,
+                  min_scene: float = 1.0) -> List[float]:
+        """
+        Times of frames whose score is above threshold and ratio times the median score of the
+        surrounding second (so fast motion does not register as cuts). Cuts closer than
+        min_scene seconds keep only the strongest one.
+        """
+        if len(scores) < 2:
+            return []
+        half = max(1, int(round(fps / 2)))
+        padded = np.pad(scores, half, mode="edge")
+        local = np.median(sliding_window_view(padded, 2 * half + 1), axis=1)
+        candidates = np.flatnonzero((scores >= threshold) & (scores >= ratio * local))
+        cuts: List[int] = []
+        min_gap = min_scene * fps
+        for i in candidates:
+            if cuts and i - cuts[-1] < min_gap:
+                if scores[i] > scores[cuts[-1]]:
+                    cuts[-1] = int(i)
+                continue
+            cuts.append(int(i))
+        return [round(i / fps, 3) for i in cuts]
+
+    @classmethod
+    def detect(cls, src_path: str, threshold: float = 0.3, min_scene: float = 1.0, fps: float = FPS,
+               cache: Optional[AnalysisCache] = None, threads: Optional[int] = None,
+               cancel_event: Optional[threading.Event] = None, decode_path: Optional[str] = None) -> List[float]:
+        """
+        Scene-cut times (seconds) of src_path. Frame scores are cached per source fingerprint,
+        so detecting again with another threshold does not decode the video again.
+        decode_path (a proxy of src_path, see ProxyManager) is decoded instead of src_path.
+        """
+        params: Dict[str, Any] = {"fps": fps, "width": cls.WIDTH, "height": cls.HEIGHT, "bins": cls.BINS}
+        cached = cache.get(src_path, "scene_scores", params) if cache else None
+        if cached is not None:
+            scores = np.asarray(cached, dtype=np.float32)
+        else:
+            scores = cls.frame_scores(decode_path or src_path, fps=fps, threads=threads, cancel_event=cancel_event)
+            if cache:
+                cache.put(src_path, "scene_scores", params, [round(float(s), 4) for s in scores])
+        return cls.find_cuts(scores, fps, threshold=threshold, min_scene=min_scene)
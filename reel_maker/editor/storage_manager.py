@@ -0,0 +1,263 @@
+# Disk quotas and LRU eviction for the app folders
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Callable, Iterable
+from utils.file_utils import ensure_folder
+
+
+class StorageManager:
+    """
+    Keeps the app's disk areas (drafts, downloads, proxies, music assets...) under their
+    quotas. Usage is tracked per file in SQLite: the app records files it creates or reads
+    with touch(), and scan_step() picks up everything else incrementally, listing only the
+    folders whose mtime changed since they were last seen. When an area is over quota its
+    least recently used files are evicted, skipping files the area protects (pinned drafts),
+    files under a hold() (sources and folders of running renders) and files modified in the
+    last GRACE seconds (still being written).
+    """
+
+    # files modified this recently are never evicted
+    GRACE = 300.0
+    # folders stat'ed per scan_step
+    SCAN_BATCH = 256
+    # suffixes of files that are never tracked (partial writes, databases, manifests)
+    IGNORED = (".part", ".tmp", ".sqlite3", ".sqlite3-journal", ".sqlite3-wal", ".json")
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        ensure_folder(os.path.dirname(os.path.abspath(db_path)))
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, area TEXT, size INTEGER, accessed REAL);"
+            "CREATE INDEX IF NOT EXISTS files_area ON files (area, accessed);"
+            "CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, area TEXT, mtime_ns INTEGER);"
+        )
+        self._db.commit()
+        self._areas: Dict[str, Dict[str, Any]] = {}
+        self._held: Dict[str, int] = {}
+        self._cursor = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_area(self, name: str, root: str, quota: int, protect: Optional[Callable[[str], bool]] = None,
+                 evict: Optional[Callable[[str], Iterable[str]]] = None, exclude: Iterable[str] = ()) -> None:
+        """
+        Track the files under root as area `name`, limited to quota bytes. protect(path) returns
+        True for files that must stay; evict(path) deletes a file (and whatever belongs to it)
+        and returns the removed paths (default: os.remove). Folders in exclude are not scanned.
+        """
+        root = os.path.abspath(root)
+        ensure_folder(root)
+        with self._lock:
+            self._areas[name] = {"root": root, "quota": quota, "protect": protect, "evict": evict,
+                                 "exclude": tuple(os.path.abspath(p) for p in exclude)}
+            self._db.execute("INSERT OR IGNORE INTO dirs (path, area, mtime_ns) VALUES (?, ?, NULL)", (root, name))
+            self._db.commit()
+
+    def set_quota(self, name: str, quota: int) -> None:
+        with self._lock:
+            self._areas[name]["quota"] = quota
+
+    def touch(self, path: str, area: Optional[str] = None) -> None:
+        """
+        Record a use (or the creation) of a file, making it the most recently used of its area.
+        """
+        path = os.path.abspath(path)
+        area = area or self._area_of(path)
+        if not area or not os.path.isfile(path):
+            return
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO files (path, area, size, accessed) VALUES (?, ?, ?, ?)",
+                             (path, area, os.path.getsize(path), time.time()))
+            self._db.commit()
+
+    @contextmanager
+    def hold(self, *paths: Optional[str]):
+        """
+        Protect files (or whole folders) from eviction while the block runs.
+        """
+        held = [os.path.abspath(p) for p in paths if p]
+        with self._lock:
+            for p in held:
+                self._held[p] = self._held.get(p, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                for p in held:
+                    self._held[p] -= 1
+                    if not self._held[p]:
+                        del self._held[p]
+
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        """
+        {area: {"bytes", "files", "quota"}} of the tracked files.
+        """
+        with self._lock:
+            rows = dict((area, (size, count)) for area, size, count in self._db.execute(
+                "SELECT area, COALESCE(SUM(size), 0), COUNT(*) FROM files GROUP BY area"))
+            return {name: {"bytes": rows.get(name, (0, 0))[0], "files": rows.get(name, (0, 0))[1],
+                           "quota": area["quota"]} for name, area in self._areas.items()}
+
+    def scan_step(self, budget: int = SCAN_BATCH) -> int:
+        """
+        Stat up to `budget` known folders (round robin) and list the ones that changed since
+        the last look. Returns the number of folders listed.
+        """
+        with self._lock:
+            dirs = self._db.execute("SELECT path, area, mtime_ns FROM dirs ORDER BY path").fetchall()
+        if not dirs:
+            return 0
+        start = self._cursor % len(dirs)
+        batch = (dirs[start:] + dirs[:start])[:budget]
+        self._cursor = start + len(batch)
+        listed = 0
+        for path, area, mtime_ns in batch:
+            if area not in self._areas:
+                continue
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                if path != self._areas[area]["root"]:
+                    self._forget_dir(path)
+                continue
+            if current != mtime_ns:
+                self._list_dir(path, area, current)
+                listed += 1
+        return listed
+
+    def enforce(self, area: Optional[str] = None) -> List[str]:
+        """
+        Evict least recently used files of every area over its quota (or of one area).
+        Returns the removed paths.
+        """
+        removed: List[str] = []
+        for name in ([area] if area else list(self._areas)):
+            conf = self._areas[name]
+            with self._lock:
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM files WHERE area = ?",
+                                         (name,)).fetchone()[0]
+                if total <= conf["quota"]:
+                    continue
+                candidates = self._db.execute("SELECT path, size FROM files WHERE area = ? ORDER BY accessed",
+                                              (name,)).fetchall()
+            now = time.time()
+            for path, _ in candidates:
+                if total <= conf["quota"]:
+                    break
+                if not self._evictable(path, conf, now):
+                    continue
+                try:
+                    gone = list(conf["evict"](path)) if conf["evict"] else self._remove(path)
+                except OSError:
+                    continue
+                with self._lock:
+                    for p in gone:
+                        row = self._db.execute("SELECT size FROM files WHERE path = ?", (p,)).fetchone()
+                        if row:
+                            total -= row[0] or 0
+                        self._db.execute("DELETE FROM files WHERE path = ?", (p,))
+                    self._db.commit()
+                removed += gone
+        return removed
+
+    def start(self, interval: float = 60.0) -> None:
+        """
+        Scan and enforce quotas every interval seconds on a daemon thread.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.scan_step()
+                    self.enforce()
+                except Exception:
+                    # storage upkeep must never take the app down; try again next tick
+                    pass
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name="storage", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _evictable(self, path: str, conf: Dict[str, Any], now: float) -> bool:
+        with self._lock:
+            if any(path == p or path.startswith(p + os.sep) for p in self._held):
+                return False
+        try:
+            if now - os.path.getmtime(path) < self.GRACE:
+                return False
+        except OSError:
+            # already gone: let the eviction drop its row
+            return True
+        return not (conf["protect"] and conf["protect"](path))
+
+    @staticmethod
+    def _remove(path: str) -> List[str]:
+        if os.path.exists(path):
+            os.remove(path)
+        return [path]
+
+    def _area_of(self, path: str) -> Optional[str]:
+        # the area with the deepest root containing path
+        best, depth = None, -1
+        for name, conf in self._areas.items():
+            root = conf["root"]
+            if (path.startswith(root + os.sep) and len(root) > depth
+                    and not any(path.startswith(ex + os.sep) for ex in conf["exclude"])):
+                best, depth = name, len(root)
+        return best
+
+    def _list_dir(self, folder: str, area: str, mtime_ns: int) -> None:
+        conf = self._areas[area]
+        files, subdirs = {}, []
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in conf["exclude"]:
+                            subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and not entry.name.endswith(self.IGNORED):
+                        st = entry.stat(follow_symlinks=False)
+                        files[entry.path] = (st.st_size, st.st_mtime)
+        except OSError:
+            return
+        prefix = folder + os.sep
+        with self._lock:
+            known = {p: size for p, size in self._db.execute(
+                "SELECT path, size FROM files WHERE area = ? AND path > ? AND path < ?",
+                (area, prefix, prefix + "\uffff")) if os.path.dirname(p) == folder}
+            for path in set(known) - set(files):
+                self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+            for path, (size, mtime) in files.items():
+                if path not in known:
+                    # first seen: its modification time stands in for the last access
+                    self._db.execute("INSERT INTO files (path, area, size, accessed) VALUES (?, ?, ?, ?)",
+                                     (path, area, size, mtime))
+                elif known[path] != size:
+                    self._db.execute("UPDATE files SET size = ? WHERE path = ?", (size, path))
+            for path in subdirs:
+                self._db.execute("INSERT OR IGNORE INTO dirs (path, area, mtime_ns) VALUES (?, ?, NULL)",
+                                 (path, area))
+            self._db.execute("UPDATE dirs SET mtime_ns = ? WHERE path = ?", (mtime_ns, folder))
+            self._db.commit()
+
+    def _forget_dir(self, folder: str) -> None:
+        prefix = folder + os.sep
+        with self._lock:
+            self._db.execute("DELETE FROM dirs WHERE path = ? OR (path > ? AND path < ?)",
+                             (folder, prefix, prefix + "\uffff"))
+            self._db.execute("DELETE FROM files WHERE path > ? AND path < ?", (prefix, prefix + "\uffff"))
+            self._db.commit()
@@ -0,0 +1,166 @@
+# Batch thumbnail / filmstrip extraction
+import os
+import glob
+import shutil
+import tempfile
+import threading
+from typing import List, Optional, Dict, Any
+from .ffmpeg_wrapper import FFmpegWrapper, FFmpegError
+
+
+class ThumbnailEngine:
+    """
+    Pulls many thumbnails (and optionally a filmstrip sprite sheet) out of one decode of a
+    source, instead of one ffmpeg process per image.
+    """
+
+    # max inputs opened by one ffmpeg process in fill_missing
+    MAX_INPUTS = 32
+
+    @staticmethod
+    def select_expr(times: List[float]) -> str:
+        """
+        select filter expression that keeps the first frame at or after each of times.
+        """
+        terms = [f"gte(t,{t:.3f})*(isnan(prev_selected_t)+lt(prev_selected_t,{t:.3f}))" for t in times]
+        return "+".join(terms) or "0"
+
+    @classmethod
+    def thumbnail_branch(cls, times: List[float], width: int = 360, video_filter: Optional[str] = None) -> str:
+        """
+        Filter chain (without pads) producing one frame per time, for use inside larger graphs.
+        """
+        chain = f"select='{cls.select_expr(times)}'"
+        if video_filter:
+            chain += "," + video_filter
+        return chain + f",scale={width}:-2"
+
+    @staticmethod
+    def filmstrip_chain(interval: float, tile_width: int, columns: int, rows: int) -> str:
+        return (f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{interval:.3f})',"
+                f"scale={tile_width}:-2,tile={columns}x{rows}")
+
+    @classmethod
+    def collect_frames(cls, frame_dir: str, out_paths: List[str]) -> List[str]:
+        """
+        Move frame_%04d.jpg files written by an image2 output to out_paths (in order).
+        Returns the paths that were actually produced ("" for missing frames).
+        """
+        frames = sorted(glob.glob(os.path.join(frame_dir, "frame_*.jpg")))
+        produced = []
+        for i, out in enumerate(out_paths):
+            if i < len(frames):
+                os.replace(frames[i], out)
+                produced.append(out)
+            else:
+                produced.append("")
+        return produced
+
+    @classmethod
+    def extract(cls, src_path: str, times: List[float], out_paths: List[str], width: int = 360,
+                video_filter: Optional[str] = None, filmstrip_path: Optional[str] = None,
+                filmstrip_count: int = 20, filmstrip_columns: int = 10, filmstrip_width: int = 160,
+                cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Write a thumbnail for every time in times (seconds into the source) to out_paths, and
+        optionally an evenly spaced filmstrip (tile of filmstrip_count frames), all from one
+        decode of the source. video_filter (e.g. the reel scale/crop) is applied to thumbnails
+        only, after frame selection. Without a filmstrip only the span covering times is decoded.
+        Missing frames fall back to create_thumbnail.
+        Returns {"thumbs": [...], "filmstrip": {...} or None}.
+        """
+        order = sorted(range(len(times)), key=lambda i: times[i])
+        sorted_times = [times[i] for i in order]
+        seek = max(0.0, sorted_times[0] - 1.0) if sorted_times and not filmstrip_path else 0.0
+        branches = []
+        if sorted_times:
+            branches.append(("t", cls.thumbnail_branch([t - seek for t in sorted_times], width, video_filter)))
+        strip = None
+        if filmstrip_path:
+            duration = FFmpegWrapper.get_duration(src_path)
+            interval = max(duration / max(filmstrip_count, 1), 0.04)
+            rows = -(-filmstrip_count // filmstrip_columns)
+            branches.append(("f", cls.filmstrip_chain(interval, filmstrip_width, filmstrip_columns, rows)))
+            strip = {"path": filmstrip_path, "interval": interval, "count": filmstrip_count,
+                     "columns": filmstrip_columns, "rows": rows, "tile_width": filmstrip_width}
+        if not branches:
+            return {"thumbs": [], "filmstrip": None}
+
+        anchor = out_paths[0] if out_paths else filmstrip_path
+        work = tempfile.mkdtemp(prefix="thumbs_", dir=os.path.dirname(os.path.abspath(anchor)))
+        try:
+            if len(branches) == 1:
+                graph = f"[0:v]{branches[0][1]}[{branches[0][0]}]"
+            else:
+                graph = "[0:v]split=2[vt][vf];" + f"[vt]{branches[0][1]}[t];[vf]{branches[1][1]}[f]"
+            args = ["-y"]
+            if seek:
+                args += ["-ss", str(seek), "-t", str(sorted_times[-1] - seek + 1.0)]
+            args += ["-i", src_path, "-filter_complex", graph]
+            for name, _ in branches:
+                if name == "t":
+                    args += ["-map", "[t]", "-vsync", "vfr", "-q:v", "3", os.path.join(work, "frame_%04d.jpg")]
+                else:
+                    args += ["-map", "[f]", "-frames:v", "1", "-q:v", "4", filmstrip_path]
+            FFmpegWrapper.run(args, capture_output=True, cancel_event=cancel_event)
+            produced = cls.collect_frames(work, [out_paths[i] for i in order])
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+        thumbs = [""] * len(times)
+        for rank, i in enumerate(order):
+            thumbs[i] = produced[rank]
+            if not thumbs[i]:
+                try:
+                    FFmpegWrapper.create_thumbnail(src_path, out_paths[i], time=times[i], width=width)
+                    thumbs[i] = out_paths[i]
+                except FFmpegError:
+                    pass
+        return {"thumbs": thumbs, "filmstrip": strip}
+
+    @classmethod
+    def filmstrip(cls, src_path: str, out_image: str, count: int = 20, columns: int = 10,
+                  tile_width: int = 160) -> Dict[str, Any]:
+        """
+        Sprite sheet of count evenly spaced frames for scrubbing. Only keyframes are decoded,
+        so frame times are approximate (nearest keyframe after each step).
+        """
+        duration = FFmpegWrapper.get_duration(src_path)
+        interval = max(duration / max(count, 1), 0.04)
+        rows = -(-count // columns)
+        FFmpegWrapper.run([
+            "-y", "-skip_frame", "nokey", "-i", src_path,
+            "-vf", cls.filmstrip_chain(interval, tile_width, columns, rows),
+            "-frames:v", "1", "-vsync", "vfr", "-q:v", "4", out_image
+        ], capture_output=True)
+        return {"path": out_image, "interval": interval, "count": count, "columns": columns,
+                "rows": rows, "tile_width": tile_width}
+
+    @classmethod
+    def fill_missing(cls, folder: str, time: float = 0.5, width: int = 360) -> List[str]:
+        """
+        Create <reel>.mp4.thumb.jpg for every reel in folder that has none. Reels are opened
+        as inputs of a few ffmpeg processes (MAX_INPUTS each) instead of one process per reel.
+        Returns the thumbnails created.
+        """
+        missing = [p for p in sorted(glob.glob(os.path.join(folder, "*.mp4")))
+                   if not os.path.exists(p + ".thumb.jpg")]
+        created = []
+        for i in range(0, len(missing), cls.MAX_INPUTS):
+            chunk = missing[i:i + cls.MAX_INPUTS]
+            args = ["-y"]
+            for path in chunk:
+                args += ["-ss", str(time), "-i", path]
+            for n, path in enumerate(chunk):
+                args += ["-map", f"{n}:v:0", "-frames:v", "1", "-vf", f"scale={width}:-2", path + ".thumb.jpg"]
+            try:
+                FFmpegWrapper.run(args, capture_output=True)
+            except FFmpegError:
+                # one broken reel fails the whole process; retry the chunk one by one
+                for path in chunk:
+                    try:
+                        FFmpegWrapper.create_thumbnail(path, path + ".thumb.jpg", time=time, width=width)
+                    except FFmpegError:
+                        pass
+            created += [p + ".thumb.jpg" for p in chunk if os.path.exists(p + ".thumb.jpg")]
+        return created
@@ -0,0 +1,141 @@
+# Persistent job queue
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional
+from utils.file_utils import ensure_folder
+
+
+class JobQueue:
+    """
+    SQLite-backed priority queue of server jobs. Jobs survive restarts: anything still
+    marked running when the queue is opened (the process died mid-job) is queued again.
+    Higher priority runs first, then oldest first. Failed attempts can be requeued with a
+    delay (not_before).
+    """
+
+    STATUSES = ("queued", "running", "done", "failed", "cancelled")
+    COLUMNS = ("id", "kind", "payload", "priority", "status", "attempts", "max_attempts", "result",
+               "error", "created", "started", "finished", "not_before")
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        ensure_folder(os.path.dirname(os.path.abspath(db_path)))
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, payload TEXT, priority INTEGER,"
+            " status TEXT, attempts INTEGER, max_attempts INTEGER, result TEXT, error TEXT,"
+            " created REAL, started REAL, finished REAL, not_before REAL);"
+            "CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority, id);"
+        )
+        self._db.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running'")
+        self._db.commit()
+
+    def submit(self, kind: str, payload: Dict[str, Any], priority: int = 0, max_attempts: int = 3) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO jobs (kind, payload, priority, status, attempts, max_attempts, created, not_before)"
+                " VALUES (?, ?, ?, 'queued', 0, ?, ?, ?)",
+                (kind, json.dumps(payload), int(priority), max(1, int(max_attempts)), now, now)
+            )
+            self._db.commit()
+            return cur.lastrowid
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take the next runnable job and mark it running (attempts + 1).
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND not_before <= ?"
+                " ORDER BY priority DESC, id LIMIT 1", (now,)
+            ).fetchone()
+            if not row:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, started = ? WHERE id = ?",
+                (now, row[0])
+            )
+            self._db.commit()
+        return self.get(row[0])
+
+    def complete(self, job_id: int, result: Dict[str, Any]) -> None:
+        self._finish(job_id, "done", result=json.dumps(result))
+
+    def fail(self, job_id: int, error: str) -> None:
+        self._finish(job_id, "failed", error=error)
+
+    def retry(self, job_id: int, error: str, delay: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, not_before = ? WHERE id = ?",
+                (error, time.time() + delay, job_id)
+            )
+            self._db.commit()
+
+    def requeue(self, job_id: int, reason: str) -> None:
+        """
+        Put a running job back in the queue without using up an attempt (it was interrupted,
+        e.g. by a shutdown, rather than failing).
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(0, attempts - 1), started = NULL,"
+                " error = ? WHERE id = ?", (reason, job_id)
+            )
+            self._db.commit()
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancel a job that has not started yet. Returns False if it is running or finished.
+        """
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            self._db.commit()
+            return cur.rowcount > 0
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM jobs"
+        params: tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(query, params + (int(limit),)).fetchall()
+        return [self._to_job(r) for r in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = dict.fromkeys(self.STATUSES, 0)
+        counts.update(rows)
+        return counts
+
+    def _finish(self, job_id: int, status: str, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id)
+            )
+            self._db.commit()
+
+    def _to_job(self, row) -> Dict[str, Any]:
+        job = dict(zip(self.COLUMNS, row))
+        job["payload"] = json.loads(job["payload"] or "{}")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
@@ -0,0 +1,256 @@
+# Local HTTP job server
+"""
+Long-running render node: clients submit download / split / render jobs over HTTP and poll
+their status. Jobs are kept in a SQLite queue (survives restarts) and run by a fixed pool
+of worker threads; ffmpeg failures are retried with exponential backoff.
+
+Run from the reel_maker folder:
+    python -m server.job_server --port 8765 --workers 2
+
+API (JSON in and out):
+    POST   /jobs          {"kind": "split", "payload": {"src": "..."}, "priority": 0, "max_attempts": 3}
+    GET    /jobs          ?status=queued&limit=100
+    GET    /jobs/<id>
+    DELETE /jobs/<id>     cancel a queued job
+    GET    /metrics       queue depth, throughput, retries...
+
+Payloads: download {"url", "title"}; split and render take the per-source settings of
+cli.py ("src" path or URL, reel_duration / start, duration, overlay_text, bg_music, export...).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, Any, List, Optional
+
+from cli import BatchRunner, DEFAULTS, check_source, log
+from editor.ffmpeg_wrapper import FFmpegWrapper, FFmpegError, FFmpegCancelled
+from server.job_queue import JobQueue
+
+# job kind -> payload field it cannot run without
+KINDS = {"download": "url", "split": "src", "render": "src"}
+
+
+class JobServer:
+    """
+    Worker pool on top of a JobQueue. `workers` jobs run at the same time; their ffmpeg
+    renders share the BatchRunner's RenderScheduler (render_workers processes at most).
+    """
+
+    METRICS_WINDOW = 300.0
+
+    def __init__(self, base_folder: str, workers: int = 2, render_workers: Optional[int] = None,
+                 retry_delay: float = 5.0, poll_interval: float = 1.0):
+        self.runner = BatchRunner(base_folder, sources=workers, render_workers=render_workers)
+        self.queue = JobQueue(os.path.join(self.runner.base_folder, "jobs.sqlite3"))
+        self.workers = max(1, workers)
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stats_lock = threading.Lock()
+        self._started_at = time.time()
+        self._finished = deque(maxlen=1000)  # (finish time, seconds, status)
+        self.retries = 0
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        # running jobs are interrupted and go back to the queue
+        self._stopping.set()
+        self._wake.set()
+        self.runner.editor.scheduler.cancel()
+        for t in self._threads:
+            t.join(timeout=10)
+        self.runner.close()
+
+    def submit(self, kind: str, payload: Dict[str, Any], priority: int = 0, max_attempts: int = 3) -> int:
+        if kind not in KINDS:
+            raise ValueError(f"unknown job kind {kind!r} (expected one of {', '.join(KINDS)})")
+        if not isinstance(payload, dict) or not payload.get(KINDS[kind]):
+            raise ValueError(f"{kind} job needs payload.{KINDS[kind]}")
+        if kind != "download":
+            # reject what the worker would fail on, as cli.load_spec does for spec files
+            check_source(self._source(kind, payload), label="payload")
+        job_id = self.queue.submit(kind, payload, priority=priority, max_attempts=max_attempts)
+        self._wake.set()
+        return job_id
+
+    def metrics(self) -> Dict[str, Any]:
+        counts = self.queue.counts()
+        now = time.time()
+        with self._stats_lock:
+            recent = [f for f in self._finished if now - f[0] <= self.METRICS_WINDOW]
+            retries = self.retries
+        done = [f for f in recent if f[2] == "done"]
+        window = min(self.METRICS_WINDOW, now - self._started_at) or 1.0
+        cache = FFmpegWrapper.probe_cache
+        return {
+            "uptime_s": round(now - self._started_at, 1),
+            "workers": self.workers,
+            "render_workers": self.runner.editor.scheduler.max_workers,
+            "queue_depth": counts["queued"],
+            "running": counts["running"],
+            "jobs": counts,
+            "retries": retries,
+            "window_s": round(window, 1),
+            "throughput_per_min": round(len(done) * 60.0 / window, 3),
+            "failed_in_window": len(recent) - len(done),
+            "avg_job_s": round(sum(f[1] for f in done) / len(done), 3) if done else None,
+            "probe_cache": cache.stats() if cache else None,
+            "render_cache": self.runner.editor.render_cache.stats(),
+        }
+
+    def _work(self) -> None:
+        while not self._stopping.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        t0 = time.perf_counter()
+        log(f"job {job['id']} ({job['kind']}) attempt {job['attempts']}/{job['max_attempts']}")
+        status = "done"
+        try:
+            self.queue.complete(job["id"], self._execute(job["kind"], job["payload"]))
+        except FFmpegCancelled as e:
+            if self._stopping.is_set():
+                self.queue.requeue(job["id"], "interrupted by shutdown")
+                return
+            status = "failed"
+            self.queue.fail(job["id"], f"{type(e).__name__}: {e}")
+        except FFmpegError as e:
+            if job["attempts"] < job["max_attempts"]:
+                delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+                log(f"job {job['id']} failed ({e}), retrying in {delay:.0f}s")
+                self.queue.retry(job["id"], f"{type(e).__name__}: {e}", delay)
+                with self._stats_lock:
+                    self.retries += 1
+                return
+            status = "failed"
+            self.queue.fail(job["id"], f"{type(e).__name__}: {e}")
+        except Exception as e:
+            status = "failed"
+            self.queue.fail(job["id"], f"{type(e).__name__}: {e}")
+        log(f"job {job['id']} {status}")
+        with self._stats_lock:
+            self._finished.append((time.time(), time.perf_counter() - t0, status))
+
+    def _execute(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if kind == "download":
+            return {"path": self.runner.download(payload["url"], payload.get("title"))}
+        return self.runner.process({**DEFAULTS, **self._source(kind, payload)})
+
+    @staticmethod
+    def _source(kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # the job kind sets the mode of split / render payloads
+        return {**payload, "mode": "split" if kind == "split" else "single"}
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    server_version = "ReelShortMakerJobs/1.0"
+
+    @property
+    def app(self) -> JobServer:
+        return self.server.app
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["metrics"]:
+            return self._send(200, self.app.metrics())
+        if parts == ["jobs"]:
+            query = parse_qs(url.query)
+            status = query.get("status", [None])[0]
+            try:
+                limit = int(query.get("limit", ["100"])[0])
+            except ValueError:
+                return self._send(400, {"error": "limit must be an integer"})
+            return self._send(200, {"jobs": self.app.queue.list_jobs(status, limit)})
+        job_id = self._job_id(parts)
+        if job_id is None:
+            return self._send(404, {"error": "not found"})
+        job = self.app.queue.get(job_id)
+        return self._send(200, job) if job else self._send(404, {"error": f"no job {job_id}"})
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            return self._send(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            job_id = self.app.submit(body.get("kind"), body.get("payload"),
+                                     priority=int(body.get("priority", 0)),
+                                     max_attempts=int(body.get("max_attempts", 3)))
+        except (ValueError, TypeError, AttributeError) as e:
+            return self._send(400, {"error": str(e)})
+        return self._send(201, {"id": job_id})
+
+    def do_DELETE(self):
+        job_id = self._job_id([p for p in urlparse(self.path).path.split("/") if p])
+        if job_id is None or not self.app.queue.get(job_id):
+            return self._send(404, {"error": "not found"})
+        if not self.app.queue.cancel(job_id):
+            return self._send(409, {"error": "only queued jobs can be cancelled"})
+        return self._send(200, self.app.queue.get(job_id))
+
+    def log_message(self, format, *args):
+        # requests are polled a lot; keep the console for job events
+        pass
+
+    @staticmethod
+    def _job_id(parts: List[str]) -> Optional[int]:
+        if len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            return int(parts[1])
+        return None
+
+    def _send(self, code: int, data: Dict[str, Any]) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="ReelShortMaker job server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--base-folder", default=os.path.join("~", "ReelShortMaker"))
+    parser.add_argument("--workers", type=int, default=2, help="jobs run at the same time")
+    parser.add_argument("--render-workers", type=int, help="concurrent ffmpeg renders (default: from core count)")
+    parser.add_argument("--retry-delay", type=float, default=5.0, help="first retry delay for ffmpeg failures")
+    args = parser.parse_args(argv)
+
+    app = JobServer(args.base_folder, workers=args.workers, render_workers=args.render_workers,
+                    retry_delay=args.retry_delay)
+    httpd = ThreadingHTTPServer((args.host, args.port), JobRequestHandler)
+    httpd.app = app
+    app.start()
+    log(f"job server on http://{args.host}:{args.port} ({app.queue.counts()['queued']} queued)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        app.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
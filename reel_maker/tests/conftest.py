@@ -0,0 +1,5 @@
+# The app modules are imported from the reel_maker folder (see app.py)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+# CropTracker keyframes and crop x expressions (evaluated in Python, as ffmpeg would)
+import numpy as np
+import pytest
+
+from editor.crop_tracker import CropTracker
+
+IN_W, OUT_W = 1000, 200
+
+
+def crop_x(expr, t):
+    functions = {
+        "gte": lambda a, b: float(a >= b),
+        "lt": lambda a, b: float(a < b),
+        "clip": lambda x, lo, hi: min(max(x, lo), hi),
+    }
+    return eval(expr, {"__builtins__": {}}, dict(functions, t=t, in_w=IN_W, out_w=OUT_W))
+
+
+def test_expression_counts_time_from_origin():
+    keys = [(10.0, 0.3), (12.0, 0.7)]
+    expr = CropTracker.crop_x_expr(keys, origin=10.0)
+    # centre * in_w - out_w / 2, with t = 0 at the origin
+    assert crop_x(expr, 0.0) == pytest.approx(200.0)
+    assert crop_x(expr, 1.0) == pytest.approx(400.0)
+    assert crop_x(expr, 5.0) == pytest.approx(600.0)
+    # a render seeked to 11 s starts halfway along the pan
+    assert crop_x(CropTracker.crop_x_expr(keys, origin=11.0), 0.0) == pytest.approx(400.0)
+
+
+def test_expression_is_clipped_to_the_frame():
+    expr = CropTracker.crop_x_expr([(0.0, 0.02), (1.0, 0.98)])
+    assert crop_x(expr, 0.0) == 0.0
+    assert crop_x(expr, 1.0) == IN_W - OUT_W
+    assert CropTracker.crop_x_expr([]) == "(in_w-out_w)/2"
+    assert crop_x(CropTracker.crop_x_expr([(3.0, 0.5)], origin=3.0), 7.0) == pytest.approx(400.0)
+
+
+def test_keyframes_hold_position_until_a_cut():
+    times = np.arange(0, 4, 0.5)
+    path = np.array([0.3] * 4 + [0.7] * 4)
+    keys = CropTracker.keyframes(times, path, shots=[0, 4])
+    assert keys == [(0.0, 0.3), (1.5, 0.3), (pytest.approx(1.999), 0.3), (2.0, 0.7), (3.5, 0.7)]
+
+
+def test_limit_keys_caps_the_expression():
+    times = np.arange(0, 100, 0.2)
+    path = 0.5 + 0.3 * np.sin(times)
+    keys = CropTracker.limit_keys(times, path, [0], start=10.0, end=60.0, max_keys=8)
+    assert len(keys) <= 8
+    # the keys still span the rendered range
+    assert keys[0][0] <= 10.0 and keys[-1][0] >= 60.0
+    expr = CropTracker.crop_x_expr(keys, origin=10.0)
+    assert 0.0 <= crop_x(expr, 25.0) <= IN_W - OUT_W
@@ -0,0 +1,97 @@
+# VideoDownloader.download_batch with yt-dlp replaced by a recording fake
+import os
+import threading
+import pytest
+
+pytest.importorskip("yt_dlp")
+from downloader import video_downloader
+from downloader.video_downloader import VideoDownloader
+
+
+class FakeYoutubeDL:
+    """
+    Records extract_info / process_ie_result calls; "downloads" write a small file named
+    after the video id into the output folder.
+    """
+
+    lock = threading.Lock()
+    extracted = []
+    processed = []
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=True, process=True):
+        if "broken" in url:
+            raise RuntimeError("unsupported URL")
+        with self.lock:
+            self.extracted.append((url, download, process))
+        vid = url.rsplit("/", 1)[-1]
+        return {"id": vid, "extractor_key": "Fake", "title": f"video {vid}", "ext": "mp4"}
+
+    def process_ie_result(self, info, download=True):
+        with self.lock:
+            self.processed.append(info["id"])
+        path = os.path.join(os.path.dirname(self.opts["outtmpl"]), info["id"] + ".mp4")
+        with open(path, "wb") as fh:
+            fh.write(info["id"].encode() * 1000)
+        return dict(info, _filename=path)
+
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch):
+    FakeYoutubeDL.extracted, FakeYoutubeDL.processed = [], []
+    monkeypatch.setattr(video_downloader, "YoutubeDL", FakeYoutubeDL)
+    return VideoDownloader(out_folder=str(tmp_path / "downloads"))
+
+
+def test_metadata_is_extracted_once_per_url(downloader):
+    urls = ["https://example.com/v/a", "https://example.com/v/b", "https://example.com/v/c"]
+    results = downloader.download_batch(urls, max_concurrent=2)
+
+    assert [r["url"] for r in results] == urls
+    assert all(r["error"] is None and not r["skipped"] for r in results)
+    assert all(os.path.exists(r["path"]) for r in results)
+    assert sorted(url for url, _, _ in FakeYoutubeDL.extracted) == sorted(urls)
+    # unprocessed extraction, then processing of that same result: no second extraction
+    assert all(not download and not process for _, download, process in FakeYoutubeDL.extracted)
+    assert sorted(FakeYoutubeDL.processed) == ["a", "b", "c"]
+
+
+def test_known_video_ids_are_skipped(downloader):
+    first = downloader.download_batch(["https://example.com/v/a"])[0]
+    FakeYoutubeDL.processed.clear()
+
+    again = downloader.download_batch(["https://example.com/v/a", "https://example.com/v/b"])
+    assert again[0]["skipped"] and again[0]["path"] == first["path"]
+    assert not again[1]["skipped"]
+    assert FakeYoutubeDL.processed == ["b"]
+    assert again[0]["id"] == "Fake:a"
+
+
+def test_errors_are_reported_per_url(downloader):
+    seen = []
+    results = downloader.download_batch(["https://example.com/broken", "https://example.com/v/a"],
+                                        on_result=seen.append)
+    assert "unsupported URL" in results[0]["error"] and results[0]["path"] is None
+    assert results[1]["error"] is None and results[1]["path"]
+    assert len(seen) == 2
+
+
+def test_fragments_are_passed_to_yt_dlp(downloader, monkeypatch):
+    opts = []
+
+    class Recording(FakeYoutubeDL):
+        def __init__(self, o):
+            super().__init__(o)
+            opts.append(o)
+
+    monkeypatch.setattr(video_downloader, "YoutubeDL", Recording)
+    downloader.download_batch(["https://example.com/v/a"], fragments=6)
+    assert opts[0]["concurrent_fragment_downloads"] == 6
@@ -0,0 +1,119 @@
+# VideoDownloader.download_sections against a local HTTP server
+"""
+The source's brightness encodes its timeline (luma = 20 * t), so reading a frame of a
+downloaded section tells which source time it shows. Needs yt-dlp, ffmpeg and ffprobe.
+"""
+import io
+import os
+import re
+import shutil
+import threading
+import functools
+import subprocess
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import numpy as np
+import pytest
+
+pytest.importorskip("yt_dlp")
+if not (shutil.which("ffmpeg") and shutil.which("ffprobe")):
+    pytest.skip("ffmpeg and ffprobe are required", allow_module_level=True)
+
+from downloader.video_downloader import VideoDownloader
+from editor.ffmpeg_wrapper import FFmpegWrapper
+
+W, H, FPS, LENGTH, GOP = 160, 120, 10, 12, 20  # keyframes every 2 s
+LUMA_PER_SECOND = 20.0
+TOLERANCE = 0.15  # seconds
+
+
+# codecs of the served files; mp4 hides the lead-in of a stream-copied section, webm does not
+CODECS = {
+    "mp4": ["-c:v", "libx264", "-c:a", "aac", "-movflags", "+faststart"],
+    "webm": ["-c:v", "libvpx", "-b:v", "200k", "-c:a", "libopus"],
+}
+
+
+@pytest.fixture(scope="module")
+def served(tmp_path_factory):
+    root = tmp_path_factory.mktemp("www")
+    for ext, codecs in CODECS.items():
+        subprocess.run([FFmpegWrapper.FFMPEG, "-v", "error", "-y",
+                        "-f", "lavfi", "-i", f"color=c=black:s={W}x{H}:r={FPS}:d={LENGTH},format=yuv420p,"
+                                             f"geq=lum='{LUMA_PER_SECOND}*T':cb=128:cr=128",
+                        "-f", "lavfi", "-i", f"sine=frequency=440:duration={LENGTH}",
+                        "-g", str(GOP), "-keyint_min", str(GOP), "-sc_threshold", "0",
+                        *codecs, "-shortest", str(root / f"clip.{ext}")], check=True)
+    handler = functools.partial(QuietHandler, directory=str(root))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/clip."
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    # answers single byte ranges, which ffmpeg needs to seek in webm over HTTP
+    # (SimpleHTTPRequestHandler ignores the Range header)
+    def send_head(self):
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if not match:
+            return super().send_head()
+        path = self.translate_path(self.path)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self.send_error(404)
+            return None
+        first, last = int(match[1]), min(int(match[2] or len(data) - 1), len(data) - 1)
+        if first >= len(data):
+            self.send_error(416)
+            return None
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {first}-{last}/{len(data)}")
+        self.send_header("Content-Length", str(last - first + 1))
+        self.end_headers()
+        return io.BytesIO(data[first:last + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+def source_time_at(path, t):
+    # the source time shown by the frame of `path` at time t, read from the Y plane as is
+    # (converting to gray would rescale the limited range)
+    size = W * H * 3 // 2
+    args = ["-ss", f"{t:.3f}", "-i", path, "-frames:v", "1", "-f", "rawvideo", "-pix_fmt", "yuv420p", "pipe:1"]
+    frame = b"".join(FFmpegWrapper.read_raw(args, size))
+    assert len(frame) == size, f"no frame at {t}s of {path}"
+    return float(np.frombuffer(frame[:W * H], dtype=np.uint8).mean()) / LUMA_PER_SECOND
+
+
+@pytest.mark.parametrize("ext", sorted(CODECS))
+@pytest.mark.parametrize("exact", [False, True])
+def test_sections_map_to_source_times(tmp_path, served, ext, exact):
+    downloader = VideoDownloader(out_folder=str(tmp_path), force_mp4=ext == "mp4")
+    # padded starts 4.5 s and 8.0 s: between keyframes, and on one
+    ranges = [(5.5, 7.0), (9.0, 10.0)]
+    results = downloader.download_sections(served + ext, ranges, pad=1.0, exact=exact)
+
+    assert len(results) == len(ranges)
+    for (start, end), result in zip(ranges, results):
+        section_start, section_end = result["section"]
+        assert os.path.exists(result["path"])
+        assert result["source_start"] + section_start == pytest.approx(start, abs=1e-3)
+        assert section_end - section_start == pytest.approx(end - start, abs=1e-3)
+        # the frames at the section bounds show the requested source times
+        assert source_time_at(result["path"], section_start) == pytest.approx(start, abs=TOLERANCE)
+        last = section_end - 1.0 / FPS
+        assert source_time_at(result["path"], last) == pytest.approx(end - 1.0 / FPS, abs=TOLERANCE)
+        # the requested range is inside the file
+        assert FFmpegWrapper.get_duration(result["path"]) >= section_end - 1e-3
+
+
+def test_invalid_ranges_are_rejected(tmp_path, served):
+    downloader = VideoDownloader(out_folder=str(tmp_path))
+    with pytest.raises(ValueError):
+        downloader.download_sections(served + "mp4", [(4.0, 3.0)])
@@ -0,0 +1,55 @@
+# Highlight picking and the single-pass grouping of picked segments
+import numpy as np
+
+from editor.highlight_scorer import HighlightScorer
+from editor.reel_editor import ReelEditor
+
+HOP = HighlightScorer.HOP
+
+
+class FakeCache:
+    # hands out precomputed audio features instead of decoding a source
+    def __init__(self, feats):
+        self.feats = feats
+
+    def get(self, path, kind, params):
+        return self.feats.tolist() if kind == "audio_features" else None
+
+    def put(self, *args):
+        pass
+
+
+def test_picks_do_not_overlap():
+    window = 5 * HOP
+    scores = np.zeros(100)
+    scores[10], scores[12], scores[15], scores[50] = 5.0, 4.8, 4.5, 3.0
+    picks = HighlightScorer.pick(scores, window, count=3)
+    # 12 overlaps the better window at 10; 15 starts where that one ends
+    assert picks == [(10 * HOP, 5.0), (15 * HOP, 4.5), (50 * HOP, 3.0)]
+    starts = [start for start, _ in picks]
+    assert all(b - a >= window for a, b in zip(starts, starts[1:]))
+
+
+def test_pick_returns_fewer_when_windows_run_out():
+    scores = np.array([1.0, 2.0, 3.0, 2.0])
+    assert HighlightScorer.pick(scores, window=4 * HOP, count=3) == [(2 * HOP, 3.0)]
+
+
+def test_rank_within_a_span():
+    feats = np.zeros((120, 3), dtype=np.float32)  # 60 s of quiet
+    feats[20:30] = [0.5, 1.0, 1.0]   # loud speech at 10-15 s
+    feats[80:90] = [0.3, 0.5, 1.0]   # quieter speech at 40-45 s
+    cache = FakeCache(feats)
+    picks = HighlightScorer.rank("src.mp4", window=5.0, count=1, cache=cache)
+    assert [p["start"] for p in picks] == [10.0]
+    # only windows inside the span count, reported in source time
+    picks = HighlightScorer.rank("src.mp4", window=5.0, count=1, cache=cache, span=(30.0, 60.0))
+    assert [p["start"] for p in picks] == [40.0]
+
+
+def test_sparse_picks_are_not_batched_together():
+    spans = [(0, 10), (10, 10), (21, 10), (40, 5), (45, 5)]
+    assert ReelEditor._adjacent_runs(spans, gap=2.0) == [[0, 1, 2], [3, 4]]
+    assert ReelEditor._adjacent_runs(spans, gap=2.0, max_size=2) == [[0, 1], [2], [3, 4]]
+    # overlapping spans always join
+    assert ReelEditor._adjacent_runs([(0, 15), (10, 15)], gap=0.0) == [[0, 1]]
@@ -0,0 +1,93 @@
+# JobQueue claim / retry / requeue and the job server's retry policy
+import pytest
+
+from server.job_queue import JobQueue
+from editor.ffmpeg_wrapper import FFmpegError, FFmpegCancelled
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_claims_by_priority_then_age(queue):
+    low = queue.submit("split", {"src": "a"})
+    high = queue.submit("split", {"src": "b"}, priority=5)
+    later = queue.submit("split", {"src": "c"})
+    assert [queue.claim()["id"] for _ in range(3)] == [high, low, later]
+    assert queue.claim() is None
+
+
+def test_retry_waits_and_requeue_keeps_the_attempt(queue):
+    job_id = queue.submit("render", {"src": "a"}, max_attempts=3)
+    assert queue.claim()["attempts"] == 1
+    queue.retry(job_id, "FFmpegError: boom", delay=60)
+    assert queue.get(job_id)["status"] == "queued"
+    assert queue.claim() is None  # not before the delay
+    queue.retry(job_id, "FFmpegError: boom", delay=0)
+    assert queue.claim()["attempts"] == 2
+
+    # interrupted by a shutdown: back in the queue, the attempt not counted
+    queue.requeue(job_id, "interrupted by shutdown")
+    job = queue.get(job_id)
+    assert (job["status"], job["attempts"], job["error"]) == ("queued", 1, "interrupted by shutdown")
+    assert queue.claim()["attempts"] == 2
+
+
+def test_running_jobs_are_queued_again_on_open(queue):
+    job_id = queue.submit("split", {"src": "a"})
+    queue.claim()
+    reopened = JobQueue(queue.db_path)
+    assert reopened.get(job_id)["status"] == "queued"
+    assert reopened.counts()["queued"] == 1
+
+
+@pytest.fixture
+def server(tmp_path):
+    pytest.importorskip("yt_dlp")
+    from server.job_server import JobServer
+    app = JobServer(str(tmp_path / "node"), workers=1, retry_delay=0.0)
+    yield app
+    app.stop()
+
+
+def test_server_retries_then_requeues_on_shutdown(server, monkeypatch):
+    job_id = server.submit("render", {"src": "talk.mp4"}, max_attempts=3)
+
+    def fail(kind, payload):
+        raise FFmpegError("2 of 2 drafts could not be finalized")
+    monkeypatch.setattr(server, "_execute", fail)
+    server._run(server.queue.claim())
+    job = server.queue.get(job_id)
+    assert (job["status"], job["attempts"], server.retries) == ("queued", 1, 1)
+
+    def interrupted(kind, payload):
+        server._stopping.set()
+        raise FFmpegCancelled("render cancelled")
+    monkeypatch.setattr(server, "_execute", interrupted)
+    server._run(server.queue.claim())
+    job = server.queue.get(job_id)
+    assert (job["status"], job["attempts"], job["error"]) == ("queued", 1, "interrupted by shutdown")
+
+
+def test_server_fails_after_the_last_attempt(server, monkeypatch):
+    job_id = server.submit("split", {"src": "talk.mp4"}, max_attempts=1)
+
+    def fail(kind, payload):
+        raise FFmpegError("boom")
+    monkeypatch.setattr(server, "_execute", fail)
+    server._run(server.queue.claim())
+    assert server.queue.get(job_id)["status"] == "failed"
+
+
+@pytest.mark.parametrize("kind, payload", [
+    ("render", {"src": "a.mp4", "sections": [[1, 2]]}),
+    ("split", {"src": "a.mp4", "sections": [[3, 2]]}),
+    ("split", {"src": "a.mp4", "sections": [5]}),
+    ("split", {}),
+    ("encode", {"src": "a.mp4"}),
+])
+def test_server_rejects_bad_payloads(server, kind, payload):
+    with pytest.raises(ValueError):
+        server.submit(kind, payload)
+    assert server.queue.counts()["queued"] == 0
@@ -0,0 +1,64 @@
+# RenderCache LRU eviction, hit / miss counts and lazy manifest writes
+import os
+import json
+import itertools
+import pytest
+
+from editor import render_cache
+from editor.render_cache import RenderCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # every time.time() call is one second later, so last-use order is deterministic
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(render_cache.time, "time", lambda: float(next(ticks)))
+
+
+def render(folder, name, size):
+    path = os.path.join(folder, name)
+    with open(path, "wb") as fh:
+        fh.write(b"x" * size)
+    return path
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=250)
+    for key in ("a", "b"):
+        cache.put(key, render(str(tmp_path), key + ".mp4", 100), {"name": key})
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", render(str(tmp_path), "c.mp4", 100), {"name": "c"})
+
+    assert cache.get("b") is None and not os.path.exists(cache.file_for("b"))
+    assert cache.get("a")["meta"] == {"name": "a"}
+    assert cache.total_size() == 200
+    # the rendered drafts themselves are left alone
+    assert os.path.exists(tmp_path / "b.mp4")
+
+
+def test_counts_hits_and_misses(tmp_path, clock):
+    cache = RenderCache(str(tmp_path / "cache"))
+    cache.put("a", render(str(tmp_path), "a.mp4", 10), {})
+    assert cache.get("a") and cache.get("a")
+    assert cache.get("missing") is None
+    # an entry whose file is gone is a miss and is dropped
+    os.remove(cache.file_for("a"))
+    assert cache.get("a") is None
+    assert cache.stats() == {"hits": 2, "misses": 2, "entries": 0, "bytes": 0}
+
+
+def test_hits_are_written_lazily(tmp_path, clock):
+    cache = RenderCache(str(tmp_path / "cache"))
+    cache.put("a", render(str(tmp_path), "a.mp4", 10), {})
+
+    def saved_last_use():
+        with open(os.path.join(cache.root, RenderCache.MANIFEST), encoding="utf-8") as fh:
+            return json.load(fh)["a"]["last_used"]
+
+    before = saved_last_use()
+    used = cache.get("a")["last_used"]
+    assert used > before and saved_last_use() == before
+    cache.flush()
+    assert saved_last_use() == used
+    # a reopened cache sees the flushed time
+    assert RenderCache(cache.root)._entries["a"]["last_used"] == used
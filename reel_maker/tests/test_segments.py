@@ -0,0 +1,45 @@
+# Reel segment planning: fixed steps, overlap, scene-cut snapping and max_reels
+import pytest
+
+from editor.reel_editor import ReelEditor
+
+CUTS = [9.0, 14.0, 24.5, 31.0, 50.0]
+
+
+@pytest.fixture
+def editor(tmp_path):
+    return ReelEditor(base_output=str(tmp_path / "output"), temp_root=str(tmp_path / "temp"))
+
+
+def test_plain_segments_cover_the_source(editor):
+    assert editor._plan_segments(40, 15, overlap=5) == [(0.0, 15), (10.0, 15), (20.0, 15), (30.0, 10)]
+    assert editor._plan_segments(40, 15, max_reels=2) == [(0.0, 15), (15.0, 15)]
+
+
+def test_snapped_segments_with_overlap(editor):
+    segments = editor._plan_segments(60, 15, overlap=5, cuts=CUTS, tolerance=2.0)
+    assert segments == [(0.0, 14.0), (9.0, 15.5), (19.0, 15.0), (31.0, 15.0), (41.0, 15.0), (50.0, 10.0)]
+    # every start after the first and every end except the last lies on a cut when one is near
+    assert segments[1][0] == 9.0 and segments[3][0] == 31.0
+    assert segments[0][0] + segments[0][1] == 14.0 and segments[1][0] + segments[1][1] == 24.5
+    # the last reel runs to the end of the source
+    assert sum(segments[-1]) == 60.0
+
+
+def test_snapped_segments_stop_at_max_reels(editor):
+    full = editor._plan_segments(60, 15, overlap=5, cuts=CUTS, tolerance=2.0)
+    assert editor._plan_segments(60, 15, overlap=5, max_reels=3, cuts=CUTS, tolerance=2.0) == full[:3]
+
+
+def test_snapped_segments_without_overlap_are_contiguous(editor):
+    segments = editor._plan_segments(60, 15, cuts=CUTS, tolerance=2.0)
+    for (start, duration), (next_start, _) in zip(segments, segments[1:]):
+        assert start + duration == pytest.approx(next_start)
+    assert segments[0] == (0.0, 14.0)
+
+
+def test_snap_to_cut_picks_the_nearest_cut_after_lo():
+    assert ReelEditor._snap_to_cut(CUTS, 15.0, 2.0, lo=0.0) == 14.0
+    assert ReelEditor._snap_to_cut(CUTS, 15.0, 2.0, lo=14.0) == 15.0  # the cut must be after lo
+    assert ReelEditor._snap_to_cut(CUTS, 40.0, 2.0, lo=0.0) == 40.0  # none within tolerance
+
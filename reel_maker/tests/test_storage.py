@@ -0,0 +1,164 @@
+# StorageManager quotas / eviction and the DraftIndex
+import os
+import time
+import pytest
+
+from editor.storage_manager import StorageManager
+from editor.draft_index import DraftIndex
+from editor.reel_editor import ReelEditor
+
+
+def write(path, size, age=0.0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(b"x" * size)
+    if age:
+        t = time.time() - age
+        os.utime(path, (t, t))
+    return str(path)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    manager = StorageManager(str(tmp_path / "storage.sqlite3"))
+    yield manager
+    manager.stop()
+
+
+def test_scan_finds_files_incrementally(tmp_path, storage):
+    root = tmp_path / "area"
+    write(root / "a.mp4", 100, age=1000)
+    write(root / "sub" / "b.mp4", 50, age=1000)
+    write(root / "c.part", 999)  # partial downloads are not tracked
+    storage.add_area("area", str(root), quota=10 ** 6)
+
+    while storage.scan_step():
+        pass
+    assert storage.usage()["area"] == {"bytes": 150, "files": 2, "quota": 10 ** 6}
+    # unchanged folders are not listed again
+    assert storage.scan_step() == 0
+
+    os.remove(root / "sub" / "b.mp4")
+    while storage.scan_step():
+        pass
+    assert storage.usage()["area"]["files"] == 1
+
+
+def test_enforce_evicts_least_recently_used(tmp_path, storage):
+    root = tmp_path / "area"
+    old = write(root / "old.mp4", 100, age=3000)
+    mid = write(root / "mid.mp4", 100, age=2000)
+    new = write(root / "new.mp4", 100, age=1000)
+    storage.add_area("area", str(root), quota=250)
+    while storage.scan_step():
+        pass
+    storage.touch(old)  # used just now: becomes the most recent
+
+    assert storage.enforce() == [os.path.abspath(mid)]
+    assert os.path.exists(old) and os.path.exists(new)
+    assert storage.usage()["area"]["bytes"] == 200
+
+
+def test_protected_held_and_recent_files_stay(tmp_path, storage):
+    root = tmp_path / "area"
+    pinned = write(root / "pinned.mp4", 100, age=5000)
+    held = write(root / "held.mp4", 100, age=4000)
+    recent = write(root / "recent.mp4", 100)
+    other = write(root / "other.mp4", 100, age=3000)
+    storage.add_area("area", str(root), quota=0, protect=lambda p: p.endswith("pinned.mp4"))
+    while storage.scan_step():
+        pass
+
+    with storage.hold(held):
+        assert storage.enforce() == [os.path.abspath(other)]
+    assert os.path.exists(pinned) and os.path.exists(held) and os.path.exists(recent)
+    # once released, the held file can go
+    assert storage.enforce() == [os.path.abspath(held)]
+
+
+def test_evict_callback_removes_related_files(tmp_path, storage):
+    root = tmp_path / "area"
+    video = write(root / "a.mp4", 100, age=1000)
+    thumb = write(root / "a.mp4.thumb.jpg", 10, age=1000)
+
+    def evict(path):
+        os.remove(path)
+        os.remove(path + ".thumb.jpg")
+        return [path, path + ".thumb.jpg"]
+
+    storage.add_area("area", str(root), quota=0, evict=evict, protect=lambda p: not p.endswith(".mp4"))
+    while storage.scan_step():
+        pass
+    assert storage.enforce() == [os.path.abspath(video), os.path.abspath(thumb)]
+    assert storage.usage()["area"] == {"bytes": 0, "files": 0, "quota": 0}
+
+
+def test_draft_index_pins_and_sources(tmp_path):
+    index = DraftIndex(str(tmp_path / "drafts.sqlite3"))
+    src = str(tmp_path / "downloads" / "v.mp4")
+    meta = {"path": "/t/v/a.mp4", "video_hash": "v", "params": {"src_path": src, "quality": "draft"}}
+    index.add(meta)
+    assert index.get("/t/v/a.mp4")["pinned"] is False
+    assert index.source_needed(src)
+
+    # pins survive updates of the draft; exported, unpinned drafts no longer need their source
+    index.set_pinned("/t/v/a.mp4")
+    index.add(dict(meta, exported_to="/out/a.mp4"))
+    assert index.is_pinned("/t/v/a.mp4") and index.source_needed(src)
+    index.set_pinned("/t/v/a.mp4", False)
+    assert not index.source_needed(src)
+
+
+def test_draft_index_changes_and_tombstones(tmp_path):
+    index = DraftIndex(str(tmp_path / "drafts.sqlite3"))
+    for name in ("a", "b", "c"):
+        index.add({"path": f"/t/v/{name}.mp4", "video_hash": "v"})
+    index.add({"path": "/t/w/x.mp4", "video_hash": "w"})
+    seq, metas, removed = index.changes("v")
+    assert sorted(m["name"] for m in metas) == ["a.mp4", "b.mp4", "c.mp4"] and removed == []
+
+    index.remove("/t/v/b.mp4")
+    index.update("/t/v/c.mp4", thumb="/t/v/c.mp4.thumb.jpg")
+    seq, metas, removed = index.changes("v", seq)
+    assert [m["name"] for m in metas] == ["c.mp4"] and removed == ["/t/v/b.mp4"]
+
+    # the tombstone was read; the next call drops it
+    assert index.changes("v", seq) == (seq, [], [])
+    tombstones = index._db.execute("SELECT COUNT(*) FROM removed").fetchone()[0]
+    assert tombstones == 0
+
+
+def test_editor_eviction_keeps_sources_and_frees_cache_links(tmp_path, storage):
+    editor = ReelEditor(base_output=str(tmp_path / "output"), temp_root=str(tmp_path / "temp"))
+    editor.attach_storage(storage, {"drafts": 0, "proxies": 10 ** 9, "music": 10 ** 9})
+    downloads = tmp_path / "downloads"
+    storage.add_area("downloads", str(downloads), 0, protect=editor.keep_source)
+    src = write(downloads / "v.mp4", 100, age=1000)
+    draft = write(tmp_path / "temp" / "v" / "v_reel000.mp4", 100, age=1000)
+    editor.render_cache.put("key", draft, {})
+    editor.index.add({"path": draft, "video_hash": "v", "render_key": "key",
+                      "params": {"src_path": src, "quality": "draft"}})
+    while storage.scan_step():
+        pass
+
+    assert storage.enforce("downloads") == []
+    assert os.path.abspath(draft) in storage.enforce("drafts")
+    assert not os.path.exists(editor.render_cache.file_for("key"))
+    assert storage.enforce("downloads") == [os.path.abspath(src)]
+
+
+def test_relative_temp_root_keeps_pinned_drafts(tmp_path, storage, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    editor = ReelEditor(base_output="output", temp_root="temp")
+    editor.attach_storage(storage, {"drafts": 0, "proxies": 10 ** 9, "music": 10 ** 9})
+    folder = editor._make_video_temp_folder("v")
+    pinned = write(os.path.join(folder, "v_reel000.mp4"), 100, age=2000)
+    other = write(os.path.join(folder, "v_reel001.mp4"), 100, age=1000)
+    for path in (pinned, other):
+        editor.index.add({"path": path, "video_hash": "v", "params": {"quality": "draft"}})
+    editor.pin_draft(editor.index.get(pinned))
+    while storage.scan_step():
+        pass
+
+    assert other in storage.enforce("drafts")
+    assert os.path.exists(pinned)
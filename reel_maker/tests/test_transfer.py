@@ -0,0 +1,86 @@
+# utils.file_utils.transfer and ReelEditor.export_reels manifests
+import os
+import json
+import hashlib
+import pytest
+
+from utils.file_utils import transfer, copy_with_checksum, file_checksum
+from editor.reel_editor import ReelEditor
+
+DATA = os.urandom(3 * 1024 * 1024 + 17)
+SHA = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "reel.mp4"
+    path.write_bytes(DATA)
+    return str(path)
+
+
+@pytest.mark.parametrize("mode", ["copy", "link", "auto", "reflink"])
+def test_transfer_keeps_source_and_writes_same_bytes(tmp_path, src, mode):
+    dst = str(tmp_path / "out" / "reel.mp4")
+    os.makedirs(os.path.dirname(dst))
+    method, digest = transfer(src, dst, mode=mode, checksum=True)
+
+    assert open(dst, "rb").read() == DATA
+    assert digest == SHA
+    assert os.path.exists(src)
+    assert not os.path.exists(dst + ".part")
+    # reflink / auto fall back to a link or a copy where the filesystem cannot clone
+    assert method in {"copy": {"copy"}, "link": {"link"}}.get(mode, {"reflink", "link", "copy"})
+    if method == "link":
+        assert os.path.samefile(src, dst)
+
+
+def test_transfer_move(tmp_path, src):
+    dst = str(tmp_path / "moved.mp4")
+    method, digest = transfer(src, dst, mode="move", checksum=True)
+    assert method == "move" and digest == SHA
+    assert not os.path.exists(src)
+
+
+def test_transfer_without_checksum_replaces_existing_file(tmp_path, src):
+    dst = tmp_path / "reel_out.mp4"
+    dst.write_bytes(b"old")
+    (tmp_path / "reel_out.mp4.part").write_bytes(b"leftover of an interrupted export")
+    method, digest = transfer(src, str(dst), mode="copy")
+    assert (method, digest) == ("copy", None)
+    assert dst.read_bytes() == DATA
+    assert not (tmp_path / "reel_out.mp4.part").exists()
+
+
+def test_copy_with_checksum_matches_file_checksum(tmp_path, src):
+    dst = str(tmp_path / "copy.mp4")
+    assert copy_with_checksum(src, dst, chunk_size=64 * 1024) == SHA == file_checksum(dst)
+
+
+def test_export_reels_writes_manifest(tmp_path):
+    editor = ReelEditor(base_output=str(tmp_path / "output"), temp_root=str(tmp_path / "temp"))
+    metas = []
+    for i in range(3):
+        path = tmp_path / "temp" / "v" / f"v_reel{i:03d}.mp4"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(DATA[i:])
+        # final-quality reels are exported as they are (no render)
+        meta = {"path": str(path), "video_hash": "v", "start": i * 15.0, "duration": 15.0,
+                "params": {"quality": "final", "src_path": "/videos/v.mp4"}}
+        editor.index.add(meta)
+        metas.append(meta)
+
+    dest = str(tmp_path / "export")
+    results = editor.export_reels(metas, dest, mode="copy", workers=2)
+    manifest = json.load(open(os.path.join(dest, ReelEditor.EXPORT_MANIFEST)))
+
+    assert [r["name"] for r in results] == [f"v_reel{i:03d}.mp4" for i in range(3)]
+    by_name = {f["name"]: f for f in manifest["files"]}
+    for i, r in enumerate(results):
+        assert r["sha256"] == hashlib.sha256(DATA[i:]).hexdigest() == by_name[r["name"]]["sha256"]
+        assert by_name[r["name"]]["source"] == "/videos/v.mp4"
+        assert editor.index.get(metas[i]["path"])["exported_to"] == r["path"]
+
+    # a later export to the same folder keeps the earlier entries
+    editor.export_reels(metas[:1], dest, mode="copy")
+    manifest = json.load(open(os.path.join(dest, ReelEditor.EXPORT_MANIFEST)))
+    assert len(manifest["files"]) == 3
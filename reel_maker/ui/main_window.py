@@ -1,19 +1,22 @@
 # Full Tkinter + ttkbootstrap GUI
 import os
-import threading
 import webbrowser
-import tempfile
 import subprocess
 import time
-from pathlib import Path
+import bisect
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 from downloader.video_downloader import VideoDownloader
 from editor.reel_editor import ReelEditor
+from editor.render_scheduler import RenderScheduler
+from editor.ffmpeg_wrapper import FFmpegWrapper, FFmpegCancelled
+from editor.probe_cache import ProbeCache
+from editor.storage_manager import StorageManager
+from utils.config import STORAGE_QUOTAS
 from utils.file_utils import ensure_folder
-from PIL import Image, ImageTk
+from ui.preview_loader import PreviewLoader
 
 
 class AppUI:
@@ -32,16 +35,31 @@ class AppUI:
         ensure_folder(self.download_folder)
         ensure_folder(self.output_folder)
         ensure_folder(self.temp_root)
+        self.cache_folder = os.path.join(self.base_folder, "cache")
+        FFmpegWrapper.probe_cache = ProbeCache(os.path.join(self.cache_folder, "probe.sqlite3"))
 
         # components
         self.current_src = None
         self.current_video_hash = None
         self.last_downloaded = None
         self.reel_drafts = []  # list of metadata dicts for current video
+        self._draft_keys = []  # (name, path) of reel_drafts, the listbox order
+        self._drafts_video = None
+        self._drafts_seq = -1  # draft index change counter the listbox is at
 
         # services
         self.downloader = VideoDownloader(out_folder=self.download_folder, force_mp4=True)
         self.editor = ReelEditor(base_output=self.output_folder, temp_root=self.temp_root)
+        # keeps temp folders and downloads under STORAGE_QUOTAS, evicting least recently used files
+        self.storage = StorageManager(os.path.join(self.cache_folder, "storage.sqlite3"))
+        self.editor.attach_storage(self.storage, STORAGE_QUOTAS)
+        self.storage.add_area("downloads", self.download_folder, STORAGE_QUOTAS["downloads"],
+                              protect=self._keep_source)
+        self.storage.start()
+        # bounded pool for button actions; the ffmpeg renders themselves run on self.editor.scheduler
+        self.tasks = RenderScheduler(max_workers=2)
+        self.preview_loader = PreviewLoader(root)
+        root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # UI vars
         self.url_var = tk.StringVar()
@@ -49,9 +67,16 @@ class AppUI:
         self.end_var = tk.StringVar(value="00:00:15")
         self.duration_var = tk.IntVar(value=15)
         self.overlap_var = tk.DoubleVar(value=0.0)
+        self.snap_scenes_var = tk.BooleanVar(value=False)
+        self.track_subject_var = tk.BooleanVar(value=False)
+        self.max_reels_var = tk.IntVar(value=0)
+        self.rank_highlights_var = tk.BooleanVar(value=False)
+        self.normalize_audio_var = tk.BooleanVar(value=False)
         self.overlay_text_var = tk.StringVar(value="")
         self.bg_music_var = tk.StringVar(value="")
-        self.quality_var = tk.StringVar(value="high")
+        # render profile of drafts (see ReelEditor.PROFILES); exports always render "final"
+        self.quality_var = tk.StringVar(value="draft")
+        self.status_var = tk.StringVar(value="")
 
         self._build_ui()
 
@@ -76,7 +101,7 @@ class AppUI:
         tb.Label(src_frame, text="Local file:").grid(row=0, column=0, sticky='w')
         tb.Button(src_frame, text="Browse", bootstyle="secondary", command=self.browse_local).grid(row=0, column=1, sticky='e')
 
-        tb.Label(src_frame, text="OR Paste URL:").grid(row=1, column=0, sticky='w', pady=(6,0))
+        tb.Label(src_frame, text="OR Paste URL(s):").grid(row=1, column=0, sticky='w', pady=(6,0))
         tb.Entry(src_frame, textvariable=self.url_var, width=40).grid(row=1, column=1, sticky='we', padx=4)
         tb.Button(src_frame, text="Download", bootstyle="primary", command=self.download_url).grid(row=2, column=1, sticky='e', pady=6)
 
@@ -89,7 +114,7 @@ class AppUI:
         # Reels from current video list
         list_frame = tb.Labelframe(left, text="Reels (from current video)")
         list_frame.pack(fill='both', expand=True, pady=6)
-        self.reel_listbox = tk.Listbox(list_frame, width=40, height=18)
+        self.reel_listbox = tk.Listbox(list_frame, width=40, height=18, selectmode='extended')
         self.reel_listbox.pack(side='left', fill='both', expand=True, padx=(6,0), pady=6)
         self.reel_listbox.bind("<<ListboxSelect>>", self.on_reel_select)
 
@@ -97,6 +122,7 @@ class AppUI:
         list_btn_frame.pack(side='right', fill='y', padx=6)
         tb.Button(list_btn_frame, text="Refresh", bootstyle="secondary", command=self.refresh_drafts).pack(fill='x', pady=4)
         tb.Button(list_btn_frame, text="Export Selected", bootstyle="success", command=self.export_selected).pack(fill='x', pady=4)
+        tb.Button(list_btn_frame, text="Pin / Unpin", bootstyle="secondary", command=self.pin_selected).pack(fill='x', pady=4)
         tb.Button(list_btn_frame, text="Delete Selected", bootstyle="danger", command=self.delete_selected).pack(fill='x', pady=4)
         tb.Button(list_btn_frame, text="Open Folder", bootstyle="secondary", command=self.open_temp_folder).pack(fill='x', pady=4)
 
@@ -113,6 +139,14 @@ class AppUI:
         tb.Label(row1, text="Overlap (s):").pack(side='left', padx=(6,0))
         tb.Entry(row1, width=6, textvariable=self.overlap_var).pack(side='left', padx=6)
 
+        row_split = tb.Frame(editor_frame)
+        row_split.pack(fill='x', pady=4, padx=6)
+        tb.Label(row_split, text="Max reels (0 = all):").pack(side='left')
+        tb.Spinbox(row_split, from_=0, to=100, increment=1, textvariable=self.max_reels_var, width=5).pack(side='left', padx=6)
+        tb.Checkbutton(row_split, text="Best by audio", variable=self.rank_highlights_var).pack(side='left', padx=6)
+        tb.Checkbutton(row_split, text="Snap to scene cuts", variable=self.snap_scenes_var).pack(side='left', padx=6)
+        tb.Checkbutton(row_split, text="Track subject", variable=self.track_subject_var).pack(side='left', padx=6)
+
         row2 = tb.Frame(editor_frame)
         row2.pack(fill='x', pady=4, padx=6)
         tb.Label(row2, text="Overlay Text:").pack(side='left')
@@ -123,11 +157,16 @@ class AppUI:
         tb.Label(row3, text="Background Music:").pack(side='left')
         tb.Entry(row3, textvariable=self.bg_music_var).pack(side='left', fill='x', expand=True, padx=6)
         tb.Button(row3, text="Browse", bootstyle="secondary", command=self.browse_music).pack(side='left', padx=6)
+        tb.Checkbutton(row3, text="Normalize loudness", variable=self.normalize_audio_var).pack(side='left', padx=6)
 
         op_row = tb.Frame(editor_frame)
         op_row.pack(fill='x', pady=6, padx=6)
         tb.Button(op_row, text="Create Single Reel (draft)", bootstyle="info", command=self.create_single_reel).pack(side='left', padx=4)
         tb.Button(op_row, text="Auto Split -> Drafts", bootstyle="warning", command=self.split_into_reels).pack(side='left', padx=4)
+        tb.Button(op_row, text="Cancel", bootstyle="danger", command=self.cancel_renders).pack(side='left', padx=4)
+        tb.Label(op_row, text="Draft quality:").pack(side='left', padx=(12,0))
+        tb.Combobox(op_row, textvariable=self.quality_var, values=list(ReelEditor.PROFILES), width=7,
+                    state='readonly').pack(side='left', padx=6)
 
         # ------------------ Right: Preview & Export ------------------
         preview_frame = tb.Labelframe(right, text="Preview")
@@ -147,6 +186,7 @@ class AppUI:
         # bottom: log
         log_frame = tb.Labelframe(self.root, text="Log")
         log_frame.pack(fill='x', padx=8, pady=(0,8))
+        tk.Label(log_frame, textvariable=self.status_var, anchor='w').pack(fill='x', padx=6)
         self.log_box = tk.Text(log_frame, height=6, state='disabled')
         self.log_box.pack(fill='both', padx=6, pady=6)
 
@@ -157,21 +197,41 @@ class AppUI:
         self.log_box.see('end')
         self.log_box.config(state='disabled')
 
+    def on_render_progress(self, event):
+        # called from render threads; hand the text to Tk on the main loop
+        parts = [f"Reel {event['reel'] + 1}:" if "reel" in event else "Render:"]
+        if event.get("percent") is not None:
+            parts.append(f"{event['percent']:.0f}%")
+        if event.get("fps"):
+            parts.append(f"{event['fps']:.0f} fps")
+        if event.get("speed"):
+            parts.append(f"{event['speed']:.2f}x")
+        if event.get("eta") is not None:
+            parts.append(f"ETA {event['eta']:.0f}s")
+        if event.get("progress") == "end":
+            parts.append("done")
+        self.root.after(0, self.status_var.set, " ".join(parts))
+
     def browse_local(self):
         f = filedialog.askopenfilename(title="Select video", filetypes=[("Video files", "*.mp4 *.mov *.mkv *.avi *.webm"), ("All files", "*.*")])
         if f:
             self.current_src = f
-            self.current_video_hash = os.path.splitext(os.path.basename(f))[0]
+            self.current_video_hash = self.editor.video_hash(f)
             self.last_downloaded = f
             self.log("Loaded local file:", f)
             self.info_label.config(text=f"Loaded: {f}")
             self.refresh_drafts()
+            self.prepare_proxy(f)
 
     def download_url(self):
         url = self.url_var.get().strip()
         if not url:
             messagebox.showwarning("Input required", "Paste a video URL first.")
             return
+        urls = url.split()
+        if len(urls) > 1:
+            self.download_many(urls)
+            return
 
         def worker():
             try:
@@ -179,18 +239,64 @@ class AppUI:
                 info = self.downloader.fetch_info(url)
                 title = info.get("title", "video")
                 self.log(f"Downloading: {title}")
-                path = self.downloader.download_best(url, title_hint=title)
+                path = self.downloader.download_best(url, title_hint=title, info=info)
                 self.current_src = path
-                self.current_video_hash = os.path.splitext(os.path.basename(path))[0]
+                self.current_video_hash = self.editor.video_hash(path)
                 self.last_downloaded = path
                 self.info_label.config(text=f"Downloaded: {path}")
                 self.log("Downloaded to:", path)
-                self.refresh_drafts()
+                self.root.after(0, self.refresh_drafts)
+                self.prepare_proxy(path)
             except Exception as e:
                 self.log("Download error:", e)
                 messagebox.showerror("Download error", str(e))
 
-        threading.Thread(target=worker, daemon=True).start()
+        self.tasks.submit(worker)
+
+    def download_many(self, urls):
+        def worker():
+            self.log(f"Downloading {len(urls)} URLs...")
+            results = self.downloader.download_batch(urls, on_result=lambda r: self.log(
+                "Download error:" if r["error"] else ("Already downloaded:" if r["skipped"] else "Downloaded to:"),
+                r["error"] or r["path"]))
+            done = [r for r in results if r["path"]]
+            if done:
+                self.current_src = done[-1]["path"]
+                self.current_video_hash = self.editor.video_hash(self.current_src)
+                self.last_downloaded = self.current_src
+                self.info_label.config(text=f"Downloaded: {self.current_src}")
+                self.root.after(0, self.refresh_drafts)
+                self.prepare_proxy(self.current_src)
+
+        self.tasks.submit(worker)
+
+    def _keep_source(self, path):
+        # the loaded source, and sources that drafts still need for their final render
+        if self.current_src and os.path.abspath(self.current_src) == path:
+            return True
+        return self.editor.keep_source(path)
+
+    def prepare_proxy(self, path):
+        # low-res copy for analysis and thumbnails, built in the background
+        self.storage.touch(path)
+
+        def done(future):
+            if not future.cancelled() and future.exception():
+                self.log("Proxy error:", future.exception())
+
+        self.editor.prepare_proxy(path).add_done_callback(done)
+
+    def cancel_renders(self):
+        self.editor.scheduler.cancel()
+        self.log("Cancelling running renders...")
+
+    def on_close(self):
+        self.editor.scheduler.shutdown(cancel=True)
+        self.tasks.shutdown(cancel=True)
+        self.editor.render_cache.flush()
+        self.storage.stop()
+        self.preview_loader.close()
+        self.root.destroy()
 
     def browse_music(self):
         f = filedialog.askopenfilename(title="Select music", filetypes=[("Audio", "*.mp3 *.m4a *.wav"), ("All files", "*.*")])
@@ -208,21 +314,28 @@ class AppUI:
         duration = int(self.duration_var.get())
         overlay = self.overlay_text_var.get().strip() or None
         bg = self.bg_music_var.get().strip() or None
+        track = bool(self.track_subject_var.get())
+        normalize = bool(self.normalize_audio_var.get())
+        quality = self.quality_var.get()
         video_hash = self.current_video_hash
 
         def worker():
             try:
                 self.log("Creating reel...")
-                meta = self.editor.create_single_reel(self.current_src, start=start, duration=duration,
-                                                      overlay_text=overlay, bg_music=bg, video_hash=video_hash)
-                self.reel_drafts.append(meta)
+                meta = self.editor.scheduler.submit_job(self.editor.create_single_reel, self.current_src,
+                                                        start=start, duration=duration, overlay_text=overlay,
+                                                        bg_music=bg, video_hash=video_hash, track_subject=track,
+                                                        normalize_audio=normalize, quality=quality,
+                                                        on_progress=self.on_render_progress).result()
                 self.log("Draft created:", meta["path"])
-                self.refresh_drafts()
+                self.root.after(0, self.refresh_drafts)
+            except FFmpegCancelled:
+                self.log("Create reel cancelled")
             except Exception as e:
                 self.log("Create reel error:", e)
                 messagebox.showerror("Error", str(e))
 
-        threading.Thread(target=worker, daemon=True).start()
+        self.tasks.submit(worker)
 
     def split_into_reels(self):
         if not self.current_src:
@@ -230,86 +343,99 @@ class AppUI:
             return
         dur = int(self.duration_var.get())
         overlap = float(self.overlap_var.get() or 0.0)
+        snap = bool(self.snap_scenes_var.get())
+        track = bool(self.track_subject_var.get())
+        max_reels = int(self.max_reels_var.get() or 0) or None
+        rank = bool(self.rank_highlights_var.get())
+        normalize = bool(self.normalize_audio_var.get())
+        quality = self.quality_var.get()
         video_hash = self.current_video_hash
 
         def worker():
             try:
                 self.log("Splitting into drafts...")
                 metas = self.editor.split_into_reels(self.current_src, reel_duration=dur, overlap=overlap, video_hash=video_hash,
+                                                     max_reels=max_reels, rank_highlights=rank,
+                                                     single_pass=True, snap_to_scenes=snap,
+                                                     on_progress=self.on_render_progress,
                                                      overlay_text=self.overlay_text_var.get().strip() or None,
-                                                     bg_music=self.bg_music_var.get().strip() or None)
-                self.reel_drafts.extend(metas)
+                                                     bg_music=self.bg_music_var.get().strip() or None,
+                                                     track_subject=track, normalize_audio=normalize,
+                                                     quality=quality)
                 self.log(f"Created {len(metas)} drafts")
-                self.refresh_drafts()
+                self.root.after(0, self.refresh_drafts)
+            except FFmpegCancelled:
+                self.log("Split cancelled")
             except Exception as e:
                 self.log("Split error:", e)
                 messagebox.showerror("Error", str(e))
 
-        threading.Thread(target=worker, daemon=True).start()
+        self.tasks.submit(worker)
 
     def refresh_drafts(self):
-        # load drafts from temp folder for current video
-        self.reel_listbox.delete(0, 'end')
-        self.reel_drafts = []
-        if not self.current_src:
+        # apply the draft index changes since the last refresh; only changed rows are touched.
+        # Tk thread only: workers hand off with root.after
+        video_hash = self.current_video_hash if self.current_src else None
+        if video_hash != self._drafts_video:
+            self.reel_listbox.delete(0, 'end')
+            self.reel_drafts, self._draft_keys = [], []
+            self._drafts_video, self._drafts_seq = video_hash, -1
+        if not video_hash:
             return
-        temp_folder = os.path.join(self.temp_root, self.current_video_hash)
-        if not os.path.exists(temp_folder):
+        self._drafts_seq, changed, removed = self.editor.draft_changes(video_hash, self._drafts_seq)
+        for path in removed:
+            self._remove_draft_row(path)
+        for meta in changed:
+            self._remove_draft_row(meta["path"])
+            key = (meta["name"], meta["path"])
+            idx = bisect.bisect_left(self._draft_keys, key)
+            self._draft_keys.insert(idx, key)
+            self.reel_drafts.insert(idx, meta)
+            self.reel_listbox.insert(idx, ("[pinned] " if meta["pinned"] else "") + meta["name"])
+        if any(not m["thumb"] for m in changed):
+            self.tasks.submit(self._fill_missing_thumbs, video_hash)
+
+    def _remove_draft_row(self, path):
+        key = (os.path.basename(path), path)
+        idx = bisect.bisect_left(self._draft_keys, key)
+        if idx < len(self._draft_keys) and self._draft_keys[idx] == key:
+            del self._draft_keys[idx]
+            del self.reel_drafts[idx]
+            self.reel_listbox.delete(idx)
+
+    def _fill_missing_thumbs(self, video_hash):
+        # one batched ffmpeg pass for every draft of the folder that has no thumbnail yet
+        try:
+            created = self.editor.fill_missing_thumbnails(video_hash)
+        except Exception as e:
+            self.log("Thumbnail error:", e)
             return
-        # find mp4 files in folder
-        files = sorted(Path(temp_folder).glob("*.mp4"))
-        for f in files:
-            thumb = str(f) + ".thumb.jpg"
-            meta = {"path": str(f), "thumb": thumb if os.path.exists(thumb) else "", "name": os.path.basename(f)}
-            self.reel_drafts.append(meta)
-            self.reel_listbox.insert('end', meta["name"])
+        if created and video_hash == self.current_video_hash:
+            self.root.after(0, self.refresh_drafts)
 
     def on_reel_select(self, event):
         sel = self.reel_listbox.curselection()
         if not sel:
             return
         idx = sel[0]
-        meta = self.reel_drafts[idx]
-        self.show_preview(meta)
+        self.editor.touch(self.reel_drafts[idx]["path"])
+        self.show_preview(idx)
 
-    def show_preview(self, meta):
+    def show_preview(self, idx):
+        # decoding happens on the preview loader thread; _draw_preview runs once it is ready
+        self.preview_loader.request(self.reel_drafts, idx, self._draw_preview)
+
+    def _draw_preview(self, meta, photo, info):
         self.preview_canvas.delete('all')
-        thumb = meta.get("thumb")
-        if thumb and os.path.exists(thumb):
-            try:
-                img = Image.open(thumb)
-                img.thumbnail((300, 540))
-                self.preview_img = ImageTk.PhotoImage(img)
-                self.preview_canvas.create_image(150, 270, image=self.preview_img)
-            except Exception as e:
-                self.log("Thumb load error:", e)
+        if photo is not None:
+            self.preview_img = photo
+            self.preview_canvas.create_image(150, 270, image=self.preview_img)
         else:
-            # generate a quick thumb using ffmpeg (blocking but quick)
-            try:
-                tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-                tmp.close()
-                FFmpegWrapper = __import__("editor.ffmpeg_wrapper", fromlist=["FFmpegWrapper"]).FFmpegWrapper
-                try:
-                    FFmpegWrapper.create_thumbnail(meta["path"], tmp.name, time=0.5, width=360)
-                    img = Image.open(tmp.name)
-                    img.thumbnail((300, 540))
-                    self.preview_img = ImageTk.PhotoImage(img)
-                    self.preview_canvas.create_image(150, 270, image=self.preview_img)
-                finally:
-                    try:
-                        os.unlink(tmp.name)
-                    except Exception:
-                        pass
-            except Exception as e:
-                self.preview_canvas.create_text(150, 270, text="No preview", fill="white")
+            self.preview_canvas.create_text(150, 270, text="No preview", fill="white")
 
         # metadata
-        size = os.path.getsize(meta["path"])
-        dur = 0
-        try:
-            dur = FFmpegWrapper.get_duration(meta["path"])
-        except Exception:
-            pass
+        size = info.get("size", 0)
+        dur = info.get("duration", 0.0)
         text = f"Name: {meta.get('name')}\nSize: {round(size/1024/1024,2)} MB\nDuration: {dur:.1f}s\nPath: {meta.get('path')}"
         self.meta_label.config(text=text)
 
@@ -318,22 +444,37 @@ class AppUI:
         if not sel:
             messagebox.showwarning("Select", "Select a draft to export")
             return
-        idx = sel[0]
-        meta = self.reel_drafts[idx]
+        metas = [self.reel_drafts[idx] for idx in sel]
         dest = filedialog.askdirectory(initialdir=self.output_folder, title="Select export folder")
         if not dest:
             return
 
         def worker():
             try:
-                out = self.editor.export_reel(meta, dest)
-                self.log("Exported to:", out)
-                messagebox.showinfo("Exported", f"Exported: {out}")
+                self.log(f"Exporting {len(metas)} reel(s)...")
+                results = self.editor.export_reels(metas, dest)
+                for r in results:
+                    self.log("Exported to:", r["path"], f"({r['method']})")
+                # draft-quality reels were replaced by their final renders
+                self.root.after(0, self.refresh_drafts)
+                messagebox.showinfo("Exported", f"Exported {len(results)} reel(s) to {dest}")
             except Exception as e:
                 self.log("Export error:", e)
                 messagebox.showerror("Error", str(e))
 
-        threading.Thread(target=worker, daemon=True).start()
+        self.tasks.submit(worker)
+
+    def pin_selected(self):
+        # pinned drafts are never evicted by the storage manager
+        sel = self.reel_listbox.curselection()
+        if not sel:
+            return
+        metas = [self.reel_drafts[idx] for idx in sel]
+        pin = not all(m["pinned"] for m in metas)
+        for meta in metas:
+            self.editor.pin_draft(meta, pin)
+        self.log(("Pinned" if pin else "Unpinned"), f"{len(metas)} draft(s)")
+        self.refresh_drafts()
 
     def delete_selected(self):
         sel = self.reel_listbox.curselection()
@@ -342,9 +483,8 @@ class AppUI:
         idx = sel[0]
         meta = self.reel_drafts[idx]
         try:
-            os.remove(meta["path"])
-            if meta.get("thumb") and os.path.exists(meta.get("thumb")):
-                os.remove(meta.get("thumb"))
+            self.editor.delete_draft(meta)
+            self.preview_loader.invalidate(meta["path"])
             self.log("Deleted:", meta["path"])
             self.refresh_drafts()
         except Exception as e:
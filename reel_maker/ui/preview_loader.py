@@ -0,0 +1,137 @@
+# Background loading of draft previews
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from PIL import Image, ImageTk
+from editor.ffmpeg_wrapper import FFmpegWrapper
+
+
+class PreviewLoader:
+    """
+    Loads draft previews off the Tk thread. A worker thread decodes and resizes thumbnails
+    (creating them with ffmpeg when missing) and reads size/duration; results go to the UI
+    through root.after(). Ready images and metadata are kept in a size-limited LRU, and the
+    neighbours of every requested entry are prefetched so stepping through the list is instant.
+    """
+
+    def __init__(self, root, size: Tuple[int, int] = (300, 540), max_items: int = 64, prefetch: int = 2):
+        self.root = root
+        self.size = size
+        self.max_items = max_items
+        self.prefetch = prefetch
+        # key -> {"image": PIL image, "photo": PhotoImage or None, "info": {...}}
+        self._cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._jobs: deque = deque()
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._closed = False
+        threading.Thread(target=self._work, name="preview-loader", daemon=True).start()
+
+    def request(self, metas: List[Dict[str, Any]], index: int,
+                callback: Callable[[Dict[str, Any], Optional[Any], Dict[str, Any]], None]) -> None:
+        """
+        Show metas[index]: callback(meta, photo_or_None, info) runs on the Tk thread as soon as
+        the preview is ready (immediately on a cache hit). Neighbouring entries are prefetched.
+        Older pending requests are dropped.
+        """
+        meta = metas[index]
+        neighbours = []
+        for step in range(1, self.prefetch + 1):
+            for i in (index + step, index - step):
+                if 0 <= i < len(metas):
+                    neighbours.append(metas[i])
+        with self._cond:
+            self._generation += 1
+            generation = self._generation
+            self._jobs.clear()
+            entry = self._cached(meta)
+            if entry is None:
+                self._jobs.append((generation, meta, callback))
+            self._jobs.extend((generation, m, None) for m in neighbours)
+            self._cond.notify()
+        if entry is not None:
+            self._deliver(generation, meta, callback)
+
+    def invalidate(self, path: str) -> None:
+        with self._cond:
+            for key in [k for k in self._cache if k[0] == path]:
+                del self._cache[key]
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._jobs.clear()
+            self._cond.notify()
+
+    def _key(self, meta: Dict[str, Any]) -> Optional[tuple]:
+        try:
+            return meta["path"], os.stat(meta["path"]).st_mtime_ns
+        except OSError:
+            return None
+
+    def _cached(self, meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = self._key(meta)
+        entry = self._cache.get(key) if key else None
+        if entry is not None:
+            self._cache.move_to_end(key)
+        return entry
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._jobs and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                generation, meta, callback = self._jobs.popleft()
+                cached = self._cached(meta) is not None
+            if not cached:
+                key = self._key(meta)
+                entry = self._load(meta)
+                with self._cond:
+                    if key:
+                        self._cache[key] = entry
+                        while len(self._cache) > self.max_items:
+                            self._cache.popitem(last=False)
+            if callback is not None:
+                self.root.after(0, self._deliver, generation, meta, callback)
+
+    def _load(self, meta: Dict[str, Any]) -> Dict[str, Any]:
+        path = meta["path"]
+        thumb = meta.get("thumb")
+        image = None
+        if not thumb or not os.path.exists(thumb):
+            thumb = path + ".thumb.jpg"
+            try:
+                FFmpegWrapper.create_thumbnail(path, thumb, time=0.5, width=360)
+                meta["thumb"] = thumb
+            except Exception:
+                thumb = None
+        if thumb:
+            try:
+                image = Image.open(thumb)
+                image.thumbnail(self.size)
+                image.load()
+            except Exception:
+                image = None
+        info = {"size": 0, "duration": 0.0}
+        try:
+            info["size"] = os.path.getsize(path)
+            info["duration"] = FFmpegWrapper.get_duration(path)
+        except Exception:
+            pass
+        return {"image": image, "photo": None, "info": info}
+
+    def _deliver(self, generation: int, meta: Dict[str, Any], callback: Callable) -> None:
+        # Tk thread: only the newest request is shown
+        if generation != self._generation:
+            return
+        with self._cond:
+            entry = self._cached(meta)
+        if entry is None:
+            callback(meta, None, {"size": 0, "duration": 0.0})
+            return
+        if entry["photo"] is None and entry["image"] is not None:
+            entry["photo"] = ImageTk.PhotoImage(entry["image"])
+        callback(meta, entry["photo"], entry["info"])
@@ -1 +1,18 @@
 # App configuration
+
+# x264 settings for full transcodes when normalizing sources to mp4, fastest first
+TRANSCODE_TIERS = {
+    "fast": {"preset": "veryfast", "crf": "20"},
+    "balanced": {"preset": "medium", "crf": "19"},
+    "quality": {"preset": "slow", "crf": "18"},
+}
+DEFAULT_TRANSCODE_TIER = "fast"
+
+# disk quotas (bytes) of the areas kept by StorageManager; the render cache has its own
+# limit (RenderCache.max_bytes)
+STORAGE_QUOTAS = {
+    "drafts": 20 * 1024 ** 3,
+    "downloads": 50 * 1024 ** 3,
+    "proxies": 5 * 1024 ** 3,
+    "music": 2 * 1024 ** 3,
+}
@@ -1,8 +1,19 @@
 # Helper utilities for file paths
 import os
+import shutil
+import hashlib
 from datetime import datetime
 import re
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl request of Linux's FICLONE (copy-on-write clone of a whole file)
+FICLONE = 0x40049409
+COPY_CHUNK = 8 * 1024 * 1024
+
 
 def ensure_folder(path: str):
     os.makedirs(path, exist_ok=True)
@@ -41,3 +52,123 @@ def human_size(num: int, suffix='B') -> str:
             return "%3.1f%s%s" % (num, unit, suffix)
         num /= 1024.0
     return "%.1f%s%s" % (num, 'P', suffix)
+
+
+def file_stat_key(path: str) -> tuple:
+    """
+    (absolute path, size, mtime_ns) of a file; changes whenever the file is rewritten.
+    """
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+def link_or_copy(src: str, dst: str):
+    # hard link when src and dst share a filesystem, plain copy otherwise
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def same_filesystem(path_a: str, path_b: str) -> bool:
+    try:
+        return os.stat(path_a).st_dev == os.stat(path_b).st_dev
+    except OSError:
+        return False
+
+
+def reflink(src: str, dst: str):
+    # copy-on-write clone (btrfs, xfs, ...); raises OSError where unsupported
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        try:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+        except OSError:
+            fout.close()
+            os.remove(dst)
+            raise
+
+
+def copy_with_checksum(src: str, dst: str, chunk_size: int = COPY_CHUNK) -> str:
+    """
+    Copy src to dst and return the sha256 of the data, hashed while it is copied (one
+    read of src). Without a checksum to compute, copy_file() is cheaper.
+    """
+    h = hashlib.sha256()
+    buf = memoryview(bytearray(chunk_size))
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        while True:
+            n = fin.readinto(buf)
+            if not n:
+                break
+            h.update(buf[:n])
+            fout.write(buf[:n])
+    shutil.copystat(src, dst)
+    return h.hexdigest()
+
+
+def copy_file(src: str, dst: str):
+    # in-kernel copy (copy_file_range) where available, plain copy otherwise
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fin, open(dst, "wb") as fout:
+                remaining = os.fstat(fin.fileno()).st_size
+                while remaining > 0:
+                    n = os.copy_file_range(fin.fileno(), fout.fileno(), min(remaining, 1 << 30))
+                    if n == 0:
+                        break
+                    remaining -= n
+            if remaining <= 0:
+                shutil.copystat(src, dst)
+                return
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+
+
+def file_checksum(path: str, chunk_size: int = COPY_CHUNK) -> str:
+    h = hashlib.sha256()
+    buf = memoryview(bytearray(chunk_size))
+    with open(path, "rb") as fh:
+        while True:
+            n = fh.readinto(buf)
+            if not n:
+                break
+            h.update(buf[:n])
+    return h.hexdigest()
+
+
+def transfer(src: str, dst: str, mode: str = "auto", checksum: bool = False) -> tuple:
+    """
+    Put src at dst and return (method, sha256 or None). mode is "move", "link", "reflink",
+    "copy" or "auto" (reflink, else hard link on the same filesystem, else copy). dst is
+    replaced atomically; if the requested method is not possible the file is copied.
+    """
+    tmp = dst + ".part"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    digest = None
+    method = "copy"
+    if mode == "move" and same_filesystem(src, os.path.dirname(os.path.abspath(dst))):
+        os.replace(src, dst)
+        return "move", file_checksum(dst) if checksum else None
+    if mode in ("auto", "reflink", "link") and same_filesystem(src, os.path.dirname(os.path.abspath(dst))):
+        for candidate in (("reflink", "link") if mode == "auto" else (mode,)):
+            try:
+                (reflink if candidate == "reflink" else os.link)(src, tmp)
+                method = candidate
+                break
+            except OSError:
+                continue
+    if method == "copy":
+        if checksum:
+            digest = copy_with_checksum(src, tmp)
+        else:
+            copy_file(src, tmp)
+    elif checksum:
+        digest = file_checksum(tmp)
+    os.replace(tmp, dst)
+    if mode == "move":
+        os.remove(src)
+    return method, digest
@@ -0,0 +1,68 @@
+# Content fingerprints for media files
+import mmap
+import hashlib
+import threading
+from collections import OrderedDict
+from utils.file_utils import file_stat_key
+
+# sampled fingerprint layout: head block, tail block and SAMPLES evenly spaced middle blocks
+BLOCK_SIZE = 64 * 1024
+SAMPLES = 8
+
+_memo: "OrderedDict[tuple, str]" = OrderedDict()
+_memo_lock = threading.Lock()
+_MEMO_MAX = 1024
+
+
+def fast_fingerprint(path: str, block_size: int = BLOCK_SIZE, samples: int = SAMPLES) -> str:
+    """
+    Hash the file size plus a few memory-mapped sampled blocks (head, tail and evenly spaced
+    middle blocks). Reads at most (samples + 2) * block_size bytes, so multi-GB files hash in
+    milliseconds. Results are memoized per (path, size, mtime_ns).
+    """
+    key = file_stat_key(path) + (block_size, samples)
+    with _memo_lock:
+        fp = _memo.get(key)
+        if fp is not None:
+            _memo.move_to_end(key)
+            return fp
+
+    size = key[1]
+    h = hashlib.blake2b(digest_size=16)
+    h.update(size.to_bytes(8, "little"))
+    if size <= (samples + 2) * block_size:
+        with open(path, "rb") as fh:
+            h.update(fh.read())
+    else:
+        with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            h.update(mm[:block_size])
+            stride = (size - 2 * block_size) // (samples + 1)
+            for i in range(1, samples + 1):
+                offset = block_size + i * stride - block_size // 2
+                h.update(mm[offset:offset + block_size])
+            h.update(mm[size - block_size:])
+    fp = h.hexdigest()
+
+    with _memo_lock:
+        _memo[key] = fp
+        while len(_memo) > _MEMO_MAX:
+            _memo.popitem(last=False)
+    return fp
+
+
+def full_fingerprint(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Hash of the whole file content; slow, meant for verification.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def video_hash_for(path: str) -> str:
+    """
+    Short content id of a source video; names its draft folder and keys per-source caches.
+    """
+    return fast_fingerprint(path)[:16]